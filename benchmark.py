@@ -0,0 +1,386 @@
+"""Control-loop and camera-pipeline benchmarks against the simulated Go2.
+
+Runs without the robot, on top of ``fake_go2.FakeGo2Connection``:
+
+- ``control``: replays a joystick trace (recorded with ``python
+  joystick_input.py trace.jsonl``, or a synthetic one) through move2.py's own
+  control loop, scheduler, velocity filter, publisher and mode manager, and
+  reports input-to-publish latency (joystick event to the next Move handed to
+  the datachannel), target-to-publish latency (a changed velocity target to
+  its Move, which the scheduler must send at once and never suppress), Moves
+  per second, request round trips and how long connecting took, motion mode
+  switch included.
+- ``camera``: runs camera.py's own receiver (``camera.receive_frames``) on the
+  fake robot's video track, with one MJPEG viewer attached to the FrameHub,
+  and reports frame rates and capture-to-JPEG latency.
+
+The report is printed as JSON; ``--save`` writes it and ``--baseline`` compares
+against a saved report, exiting with status 1 if a metric got worse by more
+than ``--tolerance``. Every run also checks the hard limits in ``assertions()``
+and exits with status 1 if one fails::
+
+    python benchmark.py --save baseline.json
+    python benchmark.py --baseline baseline.json --latency 0.05 --jitter 0.02
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from go2_webrtc_driver.constants import SPORT_CMD
+
+from connection_supervisor import ConnectionSupervisor
+from fake_go2 import FakeGo2Connection
+from frame_hub import FrameHub
+from joystick_input import AXIS, BUTTON, JoystickInput
+from macro_engine import MacroRunner
+from motion_mode import MotionModeManager
+from pipeline_metrics import PipelineMetrics
+from sport_publisher import SportPublisher
+
+import camera
+import move2
+
+# Metrics compared against a baseline: (scenario, metric) -> True if higher is better
+CHECKS = {
+    ('control', 'input_to_publish_p50_ms'): False,
+    ('control', 'input_to_publish_p95_ms'): False,
+    ('control', 'target_to_publish_p95_ms'): False,
+    ('control', 'moves_per_s'): False,
+    ('control', 'round_trip_p95_ms'): False,
+    ('camera', 'receive_fps'): True,
+    ('camera', 'encode_fps'): True,
+    ('camera', 'capture_to_jpeg_p50_ms'): False,
+    ('camera', 'capture_to_jpeg_p95_ms'): False,
+}
+# Differences below this are noise whatever the tolerance says
+ABSOLUTE_SLACK = {'ms': 2.0, 'fps': 1.0, 'per_s': 1.0}
+
+# An event with no Move within this window counts as unanswered
+MATCH_WINDOW = 0.5
+# Hard limit, whatever the baseline says: new velocity targets must reach the
+# datachannel within this long (p95; the simulated robot shares the event
+# loop, so the maximum is noisy), and none may go unsent
+TARGET_TO_PUBLISH_LIMIT = 0.010
+
+
+def synthetic_trace(path, duration=10.0, rate_hz=60):
+    """Write a joystick trace: ramps forward, turns, strafes, releases, presses A."""
+    lines = [json.dumps({'name': 'synthetic', 'axes': 6, 'buttons': 11})]
+    t = 0.0
+    previous = [0.0] * 6
+    while t < duration:
+        phase = t / duration
+        axes = [0.0] * 6
+        if phase < 0.3:
+            axes[1] = -min(1.0, t / 1.0) * 0.8  # forward
+            axes[3] = 0.3 * math.sin(2 * math.pi * t / 2.0)  # gentle turns
+        elif phase < 0.5:
+            axes[0] = -0.5  # strafe
+        elif phase < 0.6:
+            pass  # released
+        else:
+            axes[1] = -0.6 + 0.02 * math.sin(40 * t)  # forward with stick noise
+        for index, value in enumerate(axes):
+            if value != previous[index]:
+                lines.append(json.dumps([round(t, 4), AXIS, index, round(value, 4)]))
+        previous = axes
+        t += 1.0 / rate_hz
+    lines.append(json.dumps([round(duration * 0.55, 4), BUTTON, 0, True]))
+    lines.append(json.dumps([round(duration * 0.55 + 0.1, 4), BUTTON, 0, False]))
+    lines = [lines[0]] + sorted(lines[1:], key=lambda line: json.loads(line)[0])
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def percentiles(values, prefix):
+    if not values:
+        return {f'{prefix}_p50_ms': None, f'{prefix}_p95_ms': None, f'{prefix}_max_ms': None}
+    p50, p95, top = np.percentile(values, (50, 95, 100)) * 1000
+    return {f'{prefix}_p50_ms': round(p50, 2), f'{prefix}_p95_ms': round(p95, 2),
+            f'{prefix}_max_ms': round(top, 2)}
+
+
+class _RecordingJoystick:
+    """Wraps a joystick and keeps the wall-clock time of every event it yields."""
+
+    def __init__(self, joystick):
+        self.joystick = joystick
+        self.axes = joystick.axes
+        self.buttons = joystick.buttons
+        self.events_at = []
+
+    async def events(self):
+        async for event in self.joystick.events():
+            self.events_at.append((event.timestamp, event.kind))
+            yield event
+
+
+async def bench_control(trace, robot):
+    """Replay ``trace`` through move2.control_loop against ``robot``."""
+    conn = ConnectionSupervisor(robot)
+    publisher = SportPublisher(conn, window=move2.MOVE_WINDOW)
+    modes = MotionModeManager(publisher, required='normal')
+    conn.on_connect(modes.on_connect)
+    start = time.monotonic()
+    await conn.start()
+    connect_s = time.monotonic() - start
+
+    # Moves are timed when handed to the datachannel, before the simulated network
+    published = []
+    pub_sub = robot.datachannel.pub_sub
+    publish_request_new = pub_sub.publish_request_new
+
+    def timed_publish(topic, options=None):
+        if options and options.get('api_id') == SPORT_CMD['Move']:
+            published.append(time.time())
+        return publish_request_new(topic, options)
+    pub_sub.publish_request_new = timed_publish
+
+    scheduler = move2.make_scheduler(publisher)
+    # Times of the set() calls that changed the target, which must never be suppressed
+    target_changes = []
+    scheduler_set = scheduler.set
+
+    def timed_set(x, y, z):
+        if (x, y, z) != scheduler._target:
+            target_changes.append(time.time())
+        scheduler_set(x, y, z)
+    scheduler.set = timed_set
+    scheduler.start()
+    joystick = _RecordingJoystick(JoystickInput.replay(trace))
+    macro_runner = MacroRunner(scheduler, publisher)
+    run_start = time.monotonic()
+    try:
+        await move2.control_loop(joystick, publisher, scheduler, macro_runner, {})
+        # Let the filter settle and the last responses arrive
+        await asyncio.sleep(1.0)
+    finally:
+        await scheduler.stop()
+        duration = time.monotonic() - run_start
+        await conn.close()
+
+    latencies = []
+    unanswered = 0
+    axis_events = [t for t, kind in joystick.events_at if kind == AXIS]
+    for t in axis_events:
+        i = np.searchsorted(published, t)
+        if i < len(published) and published[i] - t <= MATCH_WINDOW:
+            latencies.append(published[i] - t)
+        else:
+            unanswered += 1
+    target_latencies = []
+    unsent_targets = 0
+    for t in target_changes:
+        i = np.searchsorted(published, t)
+        if i < len(published) and published[i] - t <= MATCH_WINDOW:
+            target_latencies.append(published[i] - t)
+        else:
+            unsent_targets += 1
+    stats = publisher.stats()
+    return {
+        'connect_s': round(connect_s, 3),
+        'duration_s': round(duration, 2),
+        'axis_events': len(axis_events),
+        'unanswered_events': unanswered,
+        **percentiles(latencies, 'input_to_publish'),
+        'target_changes': len(target_changes),
+        'unsent_targets': unsent_targets,
+        **percentiles(target_latencies, 'target_to_publish'),
+        'target_to_publish_limit_ms': round(TARGET_TO_PUBLISH_LIMIT * 1000, 2),
+        'moves': len(published),
+        'moves_per_s': round(len(published) / duration, 1),
+        'moves_suppressed': scheduler.suppressed,
+        'round_trip_p50_ms': stats['latency_p50_ms'],
+        'round_trip_p95_ms': stats['latency_p95_ms'],
+        'late': stats['late'],
+        'evicted': stats['evicted'],
+        'lost_messages': robot.uplink.lost + robot.downlink.lost,
+    }
+
+
+class _TimedTrack:
+    """Wraps a video track and keeps the capture time of the last frame it returned."""
+
+    def __init__(self, track):
+        self.track = track
+        self.frames = 0
+        self.capture_time = None
+
+    async def recv(self):
+        frame = await self.track.recv()
+        self.frames += 1
+        # Recorded sources carry no capture time, only the synthetic track does
+        if hasattr(self.track, 'capture_time'):
+            self.capture_time = self.track.capture_time(frame.pts)
+        return frame
+
+
+async def bench_camera(robot, duration):
+    """Run camera.py's receiver on the fake robot's video track for ``duration`` s."""
+    metrics = PipelineMetrics()
+    hub = FrameHub(quality=85, metrics=metrics)
+    hub.start()
+    # Capture time of each published frame; the hub numbers frames 1, 2, 3...
+    capture_times = []
+    jpeg_latencies = []
+    done = threading.Event()
+    viewing = threading.Event()
+
+    def viewer():
+        # Stands in for an MJPEG client, so the receiver converts every frame
+        with hub.consumer():
+            viewing.set()
+            seq = 0
+            while not done.is_set():
+                previous = seq
+                seq, jpeg = hub.wait_jpeg(seq, timeout=0.5)
+                # On timeout the same JPEG comes back, it was counted already
+                if seq == previous or jpeg is None:
+                    continue
+                if 0 < seq <= len(capture_times) and capture_times[seq - 1] is not None:
+                    jpeg_latencies.append(time.monotonic() - capture_times[seq - 1])
+
+    viewer_thread = threading.Thread(target=viewer, daemon=True)
+    viewer_thread.start()
+    viewing.wait()
+
+    tracks = []  # the fake robot delivers a single track
+    hub_publish = hub.publish
+
+    def timed_publish(img):
+        capture_times.append(tracks[-1].capture_time)
+        return hub_publish(img)
+    hub.publish = timed_publish
+
+    track_ready = asyncio.get_running_loop().create_future()
+
+    async def on_track(track):
+        tracks.append(_TimedTrack(track))
+        track_ready.set_result(time.monotonic())
+        await camera.receive_frames(tracks[-1], hub, metrics)
+
+    await robot.connect()
+    robot.video.add_track_callback(on_track)
+    robot.video.switchVideoChannel(True)
+    try:
+        start = await track_ready
+        await asyncio.sleep(duration)
+        elapsed = time.monotonic() - start
+    finally:
+        # Stops the track and with it the receiver
+        await robot.disconnect()
+        done.set()
+        viewer_thread.join(timeout=1.0)
+
+    frames = tracks[0].frames
+    snapshot = metrics.snapshot()
+    return {
+        'frames': frames,
+        'receive_fps': round(frames / elapsed, 1),
+        'encode_fps': snapshot['encode_fps'],
+        **percentiles(jpeg_latencies, 'capture_to_jpeg'),
+        'dropped_frames': hub.dropped_frames,
+        'frame_interval': snapshot['frame_interval'],
+        'stages': snapshot['stages'],
+    }
+
+
+def assertions(report):
+    """Hard limits checked on every run, with or without a baseline."""
+    failures = []
+    control = report.get('control')
+    if control:
+        if control['unsent_targets']:
+            failures.append(f"control: {control['unsent_targets']} velocity target changes never published")
+        p95 = control['target_to_publish_p95_ms']
+        if p95 is not None and p95 > control['target_to_publish_limit_ms']:
+            failures.append(f"control.target_to_publish_p95_ms: {p95} > {control['target_to_publish_limit_ms']}")
+    return failures
+
+
+def compare(report, baseline, tolerance):
+    """Metrics in ``report`` worse than ``baseline`` by more than ``tolerance`` (relative)."""
+    regressions = []
+    for (scenario, metric), higher_is_better in CHECKS.items():
+        new = report.get(scenario, {}).get(metric)
+        old = baseline.get(scenario, {}).get(metric)
+        if new is None or old is None:
+            continue
+        slack = next((value for suffix, value in ABSOLUTE_SLACK.items() if metric.endswith(suffix)), 0.0)
+        change = old - new if higher_is_better else new - old
+        if change > max(abs(old) * tolerance, slack):
+            regressions.append(f'{scenario}.{metric}: {old} -> {new}')
+    return regressions
+
+
+async def run(args):
+    report = {'network': {'latency_s': args.latency, 'jitter_s': args.jitter, 'loss': args.loss}}
+
+    def robot():
+        return FakeGo2Connection(latency=args.latency, jitter=args.jitter, loss=args.loss,
+                                 mode=args.start_mode, video_source=args.video, fps=args.fps)
+
+    if 'control' in args.scenarios:
+        trace = args.trace
+        if trace is None:
+            trace = os.path.join(tempfile.mkdtemp(), 'synthetic.jsonl')
+            synthetic_trace(trace, args.duration)
+        report['control'] = await bench_control(trace, robot())
+        report['control']['trace'] = os.path.basename(trace)
+    if 'camera' in args.scenarios:
+        report['camera'] = await bench_camera(robot(), args.duration)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('scenarios', nargs='*', help='control and/or camera (default: both)')
+    parser.add_argument('--trace', help='joystick trace to replay (default: synthetic)')
+    parser.add_argument('--video', help='video file for the fake robot (default: synthetic)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds (camera, synthetic trace)')
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--latency', type=float, default=0.02, help='one-way network latency in s')
+    parser.add_argument('--jitter', type=float, default=0.005, help='latency standard deviation in s')
+    parser.add_argument('--loss', type=float, default=0.0, help='message loss probability')
+    parser.add_argument('--start-mode', default='ai', help="robot's mode at start ('normal' skips the switch)")
+    parser.add_argument('--save', help='write the report to this file')
+    parser.add_argument('--baseline', help='report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    args = parser.parse_args()
+    args.scenarios = args.scenarios or ['control', 'camera']
+    unknown = set(args.scenarios) - {'control', 'camera'}
+    if unknown:
+        parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+
+    # move2 configures INFO logging on import
+    logging.getLogger().setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failures = assertions(report)
+    if failures:
+        print('Failed assertions:', *failures, sep='\n  ', file=sys.stderr)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print('Performance regressions:', *regressions, sep='\n  ', file=sys.stderr)
+            sys.exit(1)
+        print('No regressions against', args.baseline, file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,23 @@
-import cv2
-import numpy as np
+import av
 import asyncio
 import logging
+import os
+import socket
 import threading
 import time
-from queue import Queue
-from flask import Flask, Response, render_template_string
+from flask import Flask, Response, render_template_string, request
+from jinja2 import Template
 from go2_webrtc_driver.webrtc_driver import Go2WebRTCConnection, WebRTCConnectionMethod
 from aiortc import MediaStreamTrack
+from frame_hub import FrameHub, ClientStream
+from frame_bus import FrameBusWriter, FrameBusReader, DEFAULT_BUS_NAME
+from mjpeg_server import AsyncVideoServer
+from webrtc_relay import WebRTCRelay
+from recorder import SegmentRecorder
+from pipeline_metrics import PipelineMetrics
+from robot_client import RobotClient, daemon_running
+from connection_supervisor import ConnectionSupervisor
+from telemetry import Telemetry
 
 # Enable logging for debugging
 logging.basicConfig(level=logging.FATAL)
@@ -15,10 +25,60 @@ logging.basicConfig(level=logging.FATAL)
 # Flask app setup
 app = Flask(__name__)
 
+# "asyncio" serves HTTP on the same event loop as the WebRTC connection (no
+# thread per viewer); "flask" uses Flask's threaded server
+SERVER_MODE = "asyncio"
+HTTP_PORT = 5000
+
+# Share the robot connection owned by robot_daemon.py when it is running; the
+# daemon then publishes the frames on the shared-memory bus itself
+USE_DAEMON = True
+
+# The connection is supervised and re-established after drops; frames older
+# than STALE_AFTER_SECONDS are reported as stale on /status
+STALE_AFTER_SECONDS = 3.0
+supervisor = None
+
 # Global variables
-frame_queue = Queue()
-latest_frame = None
-frame_lock = threading.Lock()
+# Bounded frame buffer: memory stays constant even if a consumer falls behind
+FRAME_BUFFER_CAPACITY = 4
+metrics = PipelineMetrics()
+hub = FrameHub(quality=85, capacity=FRAME_BUFFER_CAPACITY, metrics=metrics)
+
+# Shared-memory frame bus for other local processes (see frame_bus.py)
+ENABLE_SHM_BUS = True
+SHM_BUS_NAME = DEFAULT_BUS_NAME
+SHM_BUS_CAPACITY = 4
+SHM_MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+# Re-broadcast the robot's track to browsers over WebRTC (/webrtc, asyncio mode
+# only); relay viewers alone don't need pixels, so the local pipeline then
+# idles as described for IDLE_CONVERT_EVERY
+ENABLE_WEBRTC_RELAY = True
+relay = None
+
+# Rolling recording of the stream (see recorder.py), browsable on /recordings.
+# Off by default: the recorder encodes every frame with libx264 whether or not
+# anyone is watching, which defeats the idle skipping below
+ENABLE_RECORDING = False
+RECORDING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+RECORDING_SEGMENT_SECONDS = 60
+RECORDING_MAX_SEGMENTS = 120
+recorder = None
+
+# Robot state (sport mode state, low state) in ring buffers, logged to disk
+# and served on /telemetry (see telemetry.py)
+ENABLE_TELEMETRY = True
+TELEMETRY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "telemetry")
+telemetry = None
+
+# With no MJPEG viewers or shared-memory readers the receiver only drains the track
+# (handing frames to the recorder, if enabled) and converts one frame in
+# IDLE_CONVERT_EVERY (keeps /status fresh)
+IDLE_CONVERT_EVERY = 30
+
+# Seconds between debug lines from the frame processing thread
+FRAME_LOG_INTERVAL = 5.0
 
 # HTML template for the web viewer
 HTML_TEMPLATE = """
@@ -75,28 +135,41 @@ HTML_TEMPLATE = """
         <div class="info">
             <p>Stream URL: <code>{{ url_for('video_feed', _external=True) }}</code></p>
             <p>Refresh the page if the stream doesn't load</p>
+            {% if relay %}
+            <p>Low-latency WebRTC viewer: <a href="/webrtc">/webrtc</a></p>
+            {% endif %}
         </div>
     </div>
 </body>
 </html>
 """
 
-def generate_frames():
+def generate_frames(client):
     """Generator function to yield video frames for streaming"""
-    global latest_frame
-    
-    while True:
-        with frame_lock:
-            if latest_frame is not None:
-                # Encode frame as JPEG
-                ret, buffer = cv2.imencode('.jpg', latest_frame, 
-                                         [cv2.IMWRITE_JPEG_QUALITY, 85])
-                if ret:
-                    frame_bytes = buffer.tobytes()
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-        
-        time.sleep(0.033)  # ~30 FPS
+    # Registered as a consumer while the client is connected, so the receiver
+    # keeps converting frames at full rate
+    with hub.consumer(), metrics.client(client):
+        while True:
+            # Wake up as soon as the hub has a new JPEG for this client's tier; the
+            # timeout only lets a stalled stream re-check instead of blocking forever
+            seq, frame_bytes = hub.wait_variant(client.last_seq, client.quality, client.scale,
+                                                timeout=1.0)
+            if frame_bytes is None or seq == client.last_seq:
+                continue
+            client.last_seq = seq
+
+            # The generator resumes once the server has written the chunk, so this
+            # measures the client's send backlog
+            start = time.monotonic()
+            yield (b'--frame\r\n'
+                   b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            elapsed = time.monotonic() - start
+            client.sent(elapsed)
+            metrics.client_sent(client, elapsed, hub.latest_frame()[0])
+
+            # Frame rate cap
+            if elapsed < client.frame_interval:
+                time.sleep(client.frame_interval - elapsed)
 
 @app.route('/')
 def index():
@@ -105,112 +178,331 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
-    """Video streaming route"""
-    return Response(generate_frames(),
+    """Video streaming route
+
+    Optional query parameters: q (JPEG quality), scale (0.25-1.0), fps, and
+    adaptive=1 to adjust them to the client's connection.
+    """
+    client = ClientStream.from_query(request.args)
+    return Response(generate_frames(client),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/recordings')
+def recordings():
+    """List of recorded segments"""
+    if recorder is None:
+        return {'error': 'recording disabled'}, 404
+    return {'segments': recorder.segments()}
+
+@app.route('/recordings/frame')
+def recording_frame():
+    """JPEG of the recorded frame nearest ?t=<unix timestamp>"""
+    if recorder is None:
+        return {'error': 'recording disabled'}, 404
+    status, content_type, body = recorder.frame_response(request.args.get('t'))
+    return Response(body, status=int(status.split()[0]), mimetype=content_type)
+
+@app.route('/telemetry')
+def telemetry_window():
+    """Robot state: ?channel=<name>&seconds=60&points=300, or the channel list"""
+    if telemetry is None:
+        return {'error': 'telemetry disabled'}, 404
+    status, content_type, body = telemetry.window_response(request.args)
+    return Response(body, status=int(status.split()[0]), mimetype=content_type)
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Pipeline metrics in Prometheus text format"""
+    return Response(metrics_text(), mimetype='text/plain; version=0.0.4')
+
+def metrics_text():
+    counters = {'dropped_frames': hub.dropped_frames}
+    if recorder is not None:
+        counters['recording_dropped_frames'] = recorder.dropped_frames
+    return metrics.prometheus(counters)
+
+async def metrics_route(query, body):
+    return '200 OK', 'text/plain; version=0.0.4', metrics_text().encode()
+
+def render_index():
+    """Main page for the asyncio server, without a Flask request context"""
+    def url_for(endpoint, _external=False):
+        prefix = f"http://{socket.gethostname()}:{HTTP_PORT}" if _external else ""
+        return f"{prefix}/{endpoint}"
+    return Template(HTML_TEMPLATE).render(url_for=url_for, relay=relay is not None)
+
 @app.route('/status')
 def status():
     """Status endpoint"""
-    with frame_lock:
-        has_frame = latest_frame is not None
-        frame_shape = latest_frame.shape if has_frame else None
-    
+    return status_info()
+
+def status_info():
+    _, frame = hub.latest_frame()
+    has_frame = frame is not None
+    frame_shape = frame.shape if has_frame else None
+    frame_age = hub.frame_age()
+
     return {
         'status': 'running',
         'has_frame': has_frame,
         'frame_shape': str(frame_shape) if frame_shape else None,
-        'queue_size': frame_queue.qsize()
+        'frame_age_s': round(frame_age, 2) if frame_age is not None else None,
+        'stale': frame_age is None or frame_age > STALE_AFTER_SECONDS,
+        'connection': supervisor.info() if supervisor is not None else None,
+        'queue_size': hub.queue_size(),
+        'queue_capacity': hub.capacity,
+        'dropped_frames': hub.dropped_frames,
+        'consumers': hub.consumers,
+        'relay_viewers': relay.viewers if relay is not None else None,
+        'recording_dropped_frames': recorder.dropped_frames if recorder is not None else None,
+        'pipeline': metrics.snapshot()
     }
 
+async def receive_frames(track, hub, metrics, bus=None, relay=None, recorder=None, on_error=None):
+    """Receive the robot's video track into ``hub`` until the track fails.
+
+    Frames go to the recorder as decoded; the BGR conversion and the copies
+    into ``hub`` and the shared-memory ``bus`` only happen while someone needs
+    the pixels. With a ``relay``, browsers get the track itself and this reads
+    its own copy. ``on_error(reason)`` is called when the track fails.
+    benchmark.py drives this same loop against the simulated robot.
+    """
+    if relay is not None:
+        # Browsers get the track itself, we read our own copy from the relay
+        relay.set_source(track)
+        track = relay.subscribe()
+    frame_count = 0
+
+    def pixels_needed():
+        return hub.consumers > 0 or (bus is not None and bus.has_readers())
+
+    while True:
+        try:
+            frame = await track.recv()
+            # 'receive' times our handling of the frame, not the wait for it
+            received_at = metrics.frame_received()
+            frame_count += 1
+            if recorder is not None:
+                # The recorder encodes the decoded frame itself, no BGR needed
+                recorder.push(frame)
+            if not pixels_needed():
+                # Nobody is watching (relay viewers get the track itself):
+                # skip the BGR conversion and copies
+                if frame_count % IDLE_CONVERT_EVERY:
+                    metrics.observe('receive', time.perf_counter() - received_at)
+                    continue
+            metrics.observe('receive', time.perf_counter() - received_at)
+            # Convert the frame to a NumPy array
+            with metrics.timer('convert'):
+                img = frame.to_ndarray(format="bgr24")
+
+            # Copy into the hub's ring buffer for web streaming and processing
+            hub.publish(img)
+            if bus is not None and bus.publish(img) is None:
+                logging.error(f"Frame {img.shape} doesn't fit in the shared memory bus")
+
+        except Exception as e:
+            logging.error(f"Error receiving frame: {e}")
+            if on_error is not None:
+                on_error(f"video track: {e}")
+            return
+
 def main():
-    global latest_frame
-    
-    # Choose a connection method (uncomment the correct one)
-    conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, ip="192.168.8.181")
-    # conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, serialNumber="B42D2000XXXXXXXX")
-    # conn = Go2WebRTCConnection(WebRTCConnectionMethod.Remote, serialNumber="B42D2000XXXXXXXX", username="email@gmail.com", password="pass")
-    # conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalAP)
-
-    # Async function to receive video frames and put them in the queue
+    global relay, recorder, supervisor, telemetry
+    use_daemon = USE_DAEMON and daemon_running()
+    if use_daemon:
+        conn = RobotClient()
+        print("Using the robot connection daemon")
+    else:
+        # Choose a connection method (uncomment the correct one)
+        conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, ip="192.168.8.181")
+        # conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, serialNumber="B42D2000XXXXXXXX")
+        # conn = Go2WebRTCConnection(WebRTCConnectionMethod.Remote, serialNumber="B42D2000XXXXXXXX", username="email@gmail.com", password="pass")
+        # conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalAP)
+    supervisor = ConnectionSupervisor(conn)
+
+    bus = None
+    if ENABLE_SHM_BUS and not use_daemon:
+        bus = FrameBusWriter(SHM_BUS_NAME, capacity=SHM_BUS_CAPACITY, slot_size=SHM_MAX_FRAME_BYTES)
+        print(f"Publishing frames on shared memory bus '{SHM_BUS_NAME}'")
+
+    # The relay forwards the robot's track, which only exists on a direct connection
+    if ENABLE_WEBRTC_RELAY and SERVER_MODE == "asyncio" and not use_daemon:
+        relay = WebRTCRelay()
+
+    if ENABLE_RECORDING:
+        recorder = SegmentRecorder(RECORDING_DIR, segment_seconds=RECORDING_SEGMENT_SECONDS,
+                                   max_segments=RECORDING_MAX_SEGMENTS)
+        recorder.start()
+        print(f"Recording to {RECORDING_DIR}")
+
+    # Async function to receive video frames and put them in the frame buffer
     async def recv_camera_stream(track: MediaStreamTrack):
-        global latest_frame
+        # The supervisor reconnects and a new track restarts the receiver
+        await receive_frames(track, hub, metrics, bus=bus, relay=relay, recorder=recorder,
+                             on_error=supervisor.report_failure)
+
+    # Frames from the daemon's shared-memory bus instead of a WebRTC track.
+    # The daemon may recreate the bus, so the reader reopens it on every connect
+    daemon_bus = {'name': None, 'generation': 0, 'thread': None}
+
+    def read_daemon_frames():
+        reader = None
+        generation = None
+        seq = 0
         while True:
-            try:
-                frame = await track.recv()
-                # Convert the frame to a NumPy array
-                img = frame.to_ndarray(format="bgr24")
-                frame_queue.put(img)
-                
-                # Update latest frame for web streaming
-                with frame_lock:
-                    latest_frame = img.copy()
-                    
-            except Exception as e:
-                logging.error(f"Error receiving frame: {e}")
-                break
+            # Waiting on the bus stamps its reader heartbeat, which makes the
+            # daemon convert and copy every frame: only read while a viewer
+            # (or the recorder) needs them. /status goes stale meanwhile
+            if recorder is None and not hub.wait_consumers(timeout=1.0):
+                continue
+            if generation != daemon_bus['generation']:
+                if reader is not None:
+                    reader.close()
+                    reader = None
+                try:
+                    reader = FrameBusReader(daemon_bus['name'])
+                except (OSError, ValueError) as e:
+                    # Retried until the daemon's bus can be opened
+                    logging.error(f"Can't open the daemon's frame bus '{daemon_bus['name']}': {e}")
+                    time.sleep(1.0)
+                    continue
+                generation = daemon_bus['generation']
+                seq = 0
+            frame = reader.wait(seq, timeout=1.0)
+            if frame is None:
+                continue
+            seq = frame.seq
+            metrics.frame_received()
+            if recorder is not None:
+                recorder.push(av.VideoFrame.from_ndarray(frame.image, format="bgr24"), frame.timestamp)
+            hub.publish(frame.image)
 
-    def run_asyncio_loop(loop):
-        asyncio.set_event_loop(loop)
-        async def setup():
-            try:
-                # Connect to the device
-                await conn.connect()
-                print("Connected to Go2 device")
-
-                # Switch video channel on and start receiving video frames
-                conn.video.switchVideoChannel(True)
-                print("Video channel switched on")
-
-                # Add callback to handle received video frames
-                conn.video.add_track_callback(recv_camera_stream)
-                print("Video track callback added")
-                
-            except Exception as e:
-                logging.error(f"Error in WebRTC connection: {e}")
-                print(f"WebRTC connection error: {e}")
+    async def start_video(conn):
+        """Run after every (re)connection: the video callbacks don't survive it"""
+        if use_daemon:
+            daemon_bus['name'] = await conn.video_bus()
+            daemon_bus['generation'] += 1
+            if daemon_bus['thread'] is None:
+                daemon_bus['thread'] = threading.Thread(target=read_daemon_frames, daemon=True)
+                daemon_bus['thread'].start()
+            print(f"Reading frames from the daemon's bus '{daemon_bus['name']}'")
+            return
 
-        # Run the setup coroutine and then start the event loop
-        loop.run_until_complete(setup())
-        loop.run_forever()
+        # Switch video channel on and start receiving video frames
+        conn.video.switchVideoChannel(True)
+        print("Video channel switched on")
 
-    # Create a new event loop for the asyncio code
-    loop = asyncio.new_event_loop()
+        # Add callback to handle received video frames
+        conn.video.add_track_callback(recv_camera_stream)
+        print("Video track callback added")
 
-    # Start the asyncio event loop in a separate thread
-    asyncio_thread = threading.Thread(target=run_asyncio_loop, args=(loop,))
-    asyncio_thread.daemon = True
-    asyncio_thread.start()
+    supervisor.on_connect(start_video)
+    if ENABLE_TELEMETRY:
+        telemetry = Telemetry(TELEMETRY_DIR)
+        supervisor.on_connect(telemetry.on_connect)
+        print(f"Logging telemetry to {TELEMETRY_DIR}")
+
+    background_tasks = set()
+
+    async def setup():
+        # Connects in the background, retrying with backoff, so the web server
+        # is up (and /status reports the stale stream) while the robot is away
+        task = asyncio.get_running_loop().create_task(supervisor.start())
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
 
     # Frame processing thread
     def process_frames():
+        seq = 0
+        last_log = 0.0
         while True:
-            if not frame_queue.empty():
-                img = frame_queue.get()
-                print(f"Frame - Shape: {img.shape}, Type: {img.dtype}, Size: {img.size}")
-            else:
-                time.sleep(0.01)
+            # Blocks until the receiver publishes a frame, no sleep-polling
+            seq, img = hub.wait_next(seq)
+            # At most one debug line per FRAME_LOG_INTERVAL, never one per frame
+            if img is not None and time.monotonic() - last_log >= FRAME_LOG_INTERVAL:
+                last_log = time.monotonic()
+                logging.debug(f"Frame {seq} - Shape: {img.shape}, Type: {img.dtype}, Size: {img.size}")
 
     # Start frame processing in a separate thread
     processing_thread = threading.Thread(target=process_frames)
     processing_thread.daemon = True
     processing_thread.start()
 
-    # Start Flask web server
     print("Starting web server...")
     print("Video stream will be available at:")
-    print("  Local: http://localhost:5000")
-    print("  Network: http://0.0.0.0:5000")
-    print("  Direct stream: http://localhost:5000/video_feed")
+    print(f"  Local: http://localhost:{HTTP_PORT}")
+    print(f"  Network: http://0.0.0.0:{HTTP_PORT}")
+    print(f"  Direct stream: http://localhost:{HTTP_PORT}/video_feed")
     print("\nPress Ctrl+C to stop")
-    
+
+    try:
+        if SERVER_MODE == "asyncio":
+            run_asyncio_server(setup, bus)
+        else:
+            run_flask_server(setup, bus)
+    finally:
+        if recorder is not None:
+            recorder.stop()
+
+def run_asyncio_server(setup, bus):
+    """Serve HTTP and the WebRTC connection from a single event loop"""
+    async def serve():
+        await setup()
+        server = AsyncVideoServer(hub, render_index, status_info, metrics=metrics)
+        server.add_route('GET', '/metrics', metrics_route)
+        if relay is not None:
+            server.add_route('GET', '/webrtc', relay.viewer_route)
+            server.add_route('POST', '/offer', relay.offer_route)
+        if telemetry is not None:
+            server.add_route('GET', '/telemetry', telemetry.route)
+        if recorder is not None:
+            server.add_route('GET', '/recordings', recorder.list_route)
+            server.add_route('GET', '/recordings/frame', recorder.frame_route)
+        await server.start(host='0.0.0.0', port=HTTP_PORT)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.close()
+            if relay is not None:
+                await relay.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        print("\nShutting down...")
+    finally:
+        if bus is not None:
+            bus.close()
+
+def run_flask_server(setup, bus):
+    """Run the WebRTC connection in a background loop and Flask in the main thread"""
+    def run_asyncio_loop(loop):
+        asyncio.set_event_loop(loop)
+        # Run the setup coroutine and then start the event loop
+        loop.run_until_complete(setup())
+        loop.run_forever()
+
+    # Create a new event loop for the asyncio code
+    loop = asyncio.new_event_loop()
+
+    # Start the asyncio event loop in a separate thread
+    asyncio_thread = threading.Thread(target=run_asyncio_loop, args=(loop,))
+    asyncio_thread.daemon = True
+    asyncio_thread.start()
+
+    # Start the JPEG encoder shared by all viewers
+    hub.start()
+
     try:
-        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+        app.run(host='0.0.0.0', port=HTTP_PORT, debug=False, threaded=True)
     except KeyboardInterrupt:
         print("\nShutting down...")
     finally:
         # Stop the asyncio event loop
         loop.call_soon_threadsafe(loop.stop)
+        if bus is not None:
+            bus.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from go2_webrtc_driver.constants import SPORT_CMD
+
+class VelocityScheduler:
+    """Envía la velocidad deseada al robot a frecuencia fija.
+
+    El bucle del joystick solo llama a set() con la última velocidad; una tarea
+    aparte la envía cada 1/rate_hz segundos con SportPublisher.publish_nowait(),
+    sin esperar la respuesta del robot. Los estados intermedios del stick se
+    descartan (solo se envía el más reciente) y la ventana del publicador
+    limita los Move en vuelo. Cuando el stick vuelve al centro se envía una
+    única velocidad cero.
+
+    Si la velocidad cambia, el destino nuevo sale en el acto, sin esperar al
+    siguiente tick. Solo si el envío adelantado anterior fue hace menos de
+    1/max_rate_hz se espera a que pase ese intervalo, y los cambios que
+    lleguen mientras tanto salen juntos en un único Move. Los ticks
+    periódicos no cuentan para ese límite: con el stick quieto se mantiene
+    rate_hz y un movimiento nuevo sale sin esperar al periodo.
+
+    Con `velocity_filter` (VelocityFilter) la velocidad deseada se suaviza en
+    cada tick antes de enviarla, y un Move que no cambia más que el umbral del
+    filtro respecto al último enviado se omite salvo que hayan pasado
+    `keepalive` segundos (por defecto 0: no se omite ninguno). Un destino
+    nuevo nunca se omite: el primer tick tras set() siempre envía, aunque el
+    primer paso del filtro quede por debajo del umbral.
+    """
+
+    def __init__(self, publisher, rate_hz=20, max_rate_hz=100, velocity_filter=None, keepalive=None):
+        self.publisher = publisher
+        self.period = 1.0 / rate_hz
+        self.min_interval = 1.0 / max_rate_hz
+        self.velocity_filter = velocity_filter
+        self.keepalive = keepalive if keepalive is not None else 0.0
+        self.suppressed = 0  # Move omitidos por no cambiar lo suficiente
+        self._target = (0.0, 0.0, 0.0)
+        self._target_pending = False  # destino nuevo aún sin enviar
+        self._zero_sent = True
+        self._sent = (0.0, 0.0, 0.0)
+        self._sent_at = None
+        self._stepped_at = None
+        self._urgent_at = None  # último envío adelantado por un destino nuevo
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def set(self, x, y, z):
+        """Actualiza la velocidad deseada (no bloquea)"""
+        if (x, y, z) != self._target:
+            self._target = (x, y, z)
+            self._target_pending = True
+            self._changed.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detiene el envío periódico y manda velocidad cero"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._target = (0.0, 0.0, 0.0)
+        if self.velocity_filter is not None:
+            self.velocity_filter.reset()
+        self._stepped_at = None
+        try:
+            await self.publisher.request(SPORT_CMD["Move"], self._parameter(self._target),
+                                         timeout=self.publisher.timeout)
+        except Exception as e:
+            logging.error(f"❌ Error enviando velocidad cero: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            self._changed.clear()
+            self._tick()
+            sent_at = loop.time()
+            # Programación por instantes absolutos para no acumular deriva
+            next_tick += self.period
+            delay = next_tick - sent_at
+            if delay < 0:
+                next_tick = sent_at
+                delay = 0
+            try:
+                await asyncio.wait_for(self._changed.wait(), delay)
+            except asyncio.TimeoutError:
+                continue
+            # Destino nuevo: sale ya, salvo que el anterior adelantado saliera
+            # hace menos de min_interval (entonces se agrupa con los que lleguen)
+            if self._urgent_at is not None:
+                wait = self._urgent_at + self.min_interval - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            self._urgent_at = next_tick = loop.time()
+
+    def _tick(self):
+        now = asyncio.get_running_loop().time()
+        command = self._filtered(now)
+        stopped = command == (0.0, 0.0, 0.0)
+        if stopped and self._zero_sent:
+            self._target_pending = False
+            return
+        if (not stopped and not self._target_pending and not self._significant(command)
+                and now - self._sent_at < self.keepalive):
+            self.suppressed += 1
+            return
+        logging.debug(f"Moviendo: x={command[0]}, y={command[1]}, z={command[2]}")
+        # Sin conexión no se envía nada; el cero se reintenta al reconectar
+        if self.publisher.publish_nowait(SPORT_CMD["Move"], self._parameter(command)) is not None:
+            self._zero_sent = stopped
+            self._target_pending = False
+            self._sent = command
+            self._sent_at = now
+
+    def _filtered(self, now):
+        if self.velocity_filter is None:
+            return self._target
+        # dt acotado: tras un rato sin ticks no se salta de golpe al destino
+        dt = min(now - self._stepped_at, 2 * self.period) if self._stepped_at is not None else self.period
+        self._stepped_at = now
+        return self.velocity_filter.step(self._target, dt)
+
+    def _significant(self, command):
+        if self._sent_at is None:
+            return True
+        if self.velocity_filter is None:
+            return command != self._sent
+        return self.velocity_filter.significant(command, self._sent)
+
+    @staticmethod
+    def _parameter(target):
+        x, y, z = target
+        return {"x": x, "y": y, "z": z}
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import random
+import time
+
+class ConnectionSupervisor:
+    """Vigila una conexión con el robot y la rehace cuando se cae.
+
+    Envuelve una Go2WebRTCConnection (o un RobotClient) y expone lo mismo que
+    usan los scripts (`datachannel`, `video`, `isConnected`), siempre apuntando
+    a la conexión vigente, así que SportPublisher y compañía no cambian.
+
+    La conexión se da por perdida si el datachannel se cierra, la conexión WebRTC
+    pasa a failed/closed, dejan de llegar las respuestas al heartbeat del driver
+    o alguien llama a report_failure() (p. ej. el receptor de vídeo). Entonces
+    se reconecta con espera exponencial (min_backoff..max_backoff, con algo de
+    aleatoriedad) y se vuelven a ejecutar los callbacks de on_connect(), que es
+    donde cada script rehace sus suscripciones y el callback de vídeo.
+    """
+
+    HEARTBEAT_TIMEOUT = 6.0  # el driver manda heartbeat cada 2 s
+    CONNECT_TIMEOUT = 15.0
+
+    def __init__(self, conn, min_backoff=0.5, max_backoff=30.0, check_interval=1.0):
+        self.conn = conn
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.check_interval = check_interval
+        self.state = "disconnected"  # connecting / connected / reconnecting
+        self.reconnects = 0
+        self.connected_since = None
+        self.last_failure = None
+        self._callbacks = []
+        self._lost = None
+        self._task = None
+
+    # Misma interfaz que la conexión envuelta
+
+    @property
+    def datachannel(self):
+        return self.conn.datachannel
+
+    @property
+    def video(self):
+        return self.conn.video
+
+    @property
+    def isConnected(self):
+        return self.state == "connected"
+
+    def on_connect(self, callback):
+        """Registra `async callback(conn)`, que se ejecuta tras cada (re)conexión"""
+        self._callbacks.append(callback)
+
+    async def start(self):
+        """Conecta (reintentando) y empieza a vigilar la conexión"""
+        self._lost = asyncio.Event()
+        self.state = "connecting"
+        await self._connect()
+        self._task = asyncio.create_task(self._watch())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.state = "disconnected"
+        await self.conn.disconnect()
+
+    def report_failure(self, reason):
+        """Marca la conexión como perdida (p. ej. si el track de vídeo falla)"""
+        if self.state == "connected":
+            logging.warning(f"⚠️ Conexión perdida: {reason}")
+            self.last_failure = reason
+            self._lost.set()
+
+    def info(self):
+        return {
+            "state": self.state,
+            "reconnects": self.reconnects,
+            "connected_for_s": round(time.monotonic() - self.connected_since, 1)
+                               if self.connected_since is not None else None,
+            "last_failure": self.last_failure,
+        }
+
+    async def _watch(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._lost.wait(), self.check_interval)
+            except asyncio.TimeoutError:
+                reason = self._check()
+                if reason is None:
+                    continue
+                self.report_failure(reason)
+
+            self.state = "reconnecting"
+            self.connected_since = None
+            try:
+                await self.conn.disconnect()
+            except Exception as e:
+                logging.debug(f"Error cerrando la conexión anterior: {e}")
+            await self._connect()
+            self.reconnects += 1
+
+    def _check(self):
+        """Motivo por el que la conexión parece caída, o None si está bien"""
+        conn = self.conn
+        if not conn.isConnected:
+            return "desconectado"
+        pc = getattr(conn, "pc", None)
+        if pc is None:
+            return None  # RobotClient: isConnected ya refleja el socket
+        if pc.connectionState in ("failed", "closed"):
+            return f"conexión WebRTC {pc.connectionState}"
+        datachannel = conn.datachannel
+        if not datachannel.data_channel_opened:
+            return "datachannel cerrado"
+        # heartbeat_response es time.time() de la última respuesta del robot
+        last_heartbeat = datachannel.heartbeat.heartbeat_response
+        if time.monotonic() - self.connected_since > self.HEARTBEAT_TIMEOUT and (
+                last_heartbeat is None or time.time() - last_heartbeat > self.HEARTBEAT_TIMEOUT):
+            return "sin respuesta al heartbeat"
+        return None
+
+    async def _connect(self):
+        delay = self.min_backoff
+        while True:
+            try:
+                await asyncio.wait_for(self.conn.connect(), self.CONNECT_TIMEOUT)
+                for callback in self._callbacks:
+                    await asyncio.wait_for(callback(self.conn), self.CONNECT_TIMEOUT)
+                break
+            # El driver llama a sys.exit() si el robot no contesta al SDP
+            except (Exception, SystemExit) as e:
+                logging.error(f"❌ Error conectando con el robot: {e!r}; reintento en {delay:.1f} s")
+                try:
+                    await self.conn.disconnect()
+                except Exception:
+                    pass
+                await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                delay = min(delay * 2, self.max_backoff)
+        self._lost.clear()
+        self.state = "connected"
+        self.connected_since = time.monotonic()
+        logging.info("✅ Conexión con el robot establecida")
@@ -0,0 +1,319 @@
+import asyncio
+import fractions
+import json
+import logging
+import math
+import random
+import time
+
+import av
+import numpy as np
+from aiortc import MediaStreamTrack
+from go2_webrtc_driver.constants import RTC_TOPIC, SPORT_CMD
+
+from motion_mode import CHECK_MODE, SELECT_MODE, STATE_TOPIC, mode_response
+
+class _Link:
+    """Un sentido de la red simulada: latencia con jitter, pérdida y orden de entrega.
+
+    Como el datachannel real (SCTP ordenado), un mensaje nunca adelanta al
+    anterior aunque el jitter le dé menos retraso.
+    """
+
+    def __init__(self, latency, jitter, loss):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.lost = 0
+        self._last_arrival = 0.0
+
+    def send(self, callback, *args):
+        """Programa callback(*args) a la llegada del mensaje; False si se pierde"""
+        if self.loss and random.random() < self.loss:
+            self.lost += 1
+            return False
+        loop = asyncio.get_running_loop()
+        arrival = max(loop.time() + max(0.0, random.gauss(self.latency, self.jitter)), self._last_arrival)
+        self._last_arrival = arrival
+        loop.call_at(arrival, callback, *args)
+        return True
+
+class _FutureResolver:
+    def __init__(self):
+        self.pending_callbacks = {}  # id -> lista de futuros (como en el driver)
+
+class _FakePubSub:
+    """Misma interfaz que conn.datachannel.pub_sub del driver"""
+
+    def __init__(self, robot):
+        self._robot = robot
+        self.future_resolver = _FutureResolver()
+        self.subscriptions = {}  # topic -> callback
+
+    async def publish_request_new(self, topic, options=None):
+        if not (options and "api_id" in options):
+            raise ValueError("Please provide app id")
+        if not self._robot.isConnected:
+            raise ConnectionError("Data channel is not open")
+        req_id = options.get("id") or int(time.time() * 1000) % 2147483648 + random.randint(0, 1000)
+        future = asyncio.get_running_loop().create_future()
+        self.future_resolver.pending_callbacks.setdefault(req_id, []).append(future)
+        self._robot.on_publish(topic, req_id, options)
+        return await future
+
+    def publish_without_callback(self, topic, data=None, msg_type=None):
+        pass
+
+    def subscribe(self, topic, callback=None):
+        if callback:
+            self.subscriptions[topic] = callback
+
+    def unsubscribe(self, topic):
+        self.subscriptions.pop(topic, None)
+
+    def resolve(self, req_id, message):
+        for future in self.future_resolver.pending_callbacks.pop(req_id, ()):
+            if not future.done():
+                future.set_result(message)
+
+    def deliver(self, topic, message):
+        callback = self.subscriptions.get(topic)
+        if callback is not None:
+            callback(message)
+
+class _Heartbeat:
+    def __init__(self):
+        self.heartbeat_response = None
+
+class _FakeDataChannel:
+    def __init__(self, robot):
+        self.pub_sub = _FakePubSub(robot)
+        self.heartbeat = _Heartbeat()
+        self.data_channel_opened = True
+
+    def switchVideoChannel(self, switch):
+        pass
+
+class SyntheticVideoTrack(MediaStreamTrack):
+    """Track de vídeo generado (barra que se desplaza sobre un degradado) a `fps`.
+
+    Los fotogramas salen en YUV420 como los que decodifica aiortc. Cada
+    fotograma lleva su pts y capture_time(pts) da el instante (monotónico) en
+    que la "cámara" lo capturó, para medir la latencia de la tubería.
+    """
+
+    kind = "video"
+
+    def __init__(self, width=1280, height=720, fps=30, latency=0.0):
+        super().__init__()
+        self.fps = fps
+        self.latency = latency
+        self.time_base = fractions.Fraction(1, fps)
+        self._frames = self._render(width, height, min(fps, 60))
+        self._start = None
+        self._pts = 0
+
+    @staticmethod
+    def _render(width, height, count):
+        """Fotogramas precalculados (se repiten en bucle) para no medir la generación"""
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        base = np.empty((height, width, 3), dtype=np.uint8)
+        base[...] = np.stack([x, x[::-1], np.full_like(x, 96)], axis=-1).astype(np.uint8)
+        frames = []
+        bar = max(1, width // 20)
+        for i in range(count):
+            img = base.copy()
+            left = i * (width - bar) // max(1, count - 1)
+            img[:, left:left + bar] = 255
+            frames.append(av.VideoFrame.from_ndarray(img, format="bgr24").reformat(format="yuv420p")
+                          .to_ndarray())
+        return frames
+
+    def capture_time(self, pts):
+        return self._start + pts / self.fps
+
+    async def recv(self):
+        if self.readyState != "live":
+            raise ConnectionError("track ended")
+        if self._start is None:
+            self._start = time.monotonic()
+        pts = self._pts
+        self._pts += 1
+        delay = self.capture_time(pts) + self.latency - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        frame = av.VideoFrame.from_ndarray(self._frames[pts % len(self._frames)], format="yuv420p")
+        frame.pts = pts
+        frame.time_base = self.time_base
+        return frame
+
+class _FakeVideo:
+    """Como conn.video del driver: los callbacks reciben el track al activarse el vídeo"""
+
+    def __init__(self, robot):
+        self._robot = robot
+        self.track_callbacks = []
+        self.track = None
+        self._task = None
+
+    def switchVideoChannel(self, switch):
+        if switch and self._task is None:
+            self._task = asyncio.create_task(self._deliver())
+
+    def add_track_callback(self, callback):
+        if callable(callback):
+            self.track_callbacks.append(callback)
+
+    async def _deliver(self):
+        # El track llega un poco después de activar el vídeo, como con el robot
+        await asyncio.sleep(self._robot.uplink.latency * 2)
+        self.track = self._robot.make_video_track()
+        for callback in self.track_callbacks:
+            try:
+                await callback(self.track)
+            except Exception as e:
+                logging.error(f"Error in callback {callback}: {e}")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.track is not None:
+            self.track.stop()
+
+class FakeGo2Connection:
+    """Go2 simulado en local con la parte de Go2WebRTCConnection que usa este repo.
+
+    connect()/disconnect(), `isConnected`, `datachannel.pub_sub`
+    (publish_request_new, subscribe, future_resolver.pending_callbacks),
+    `datachannel.heartbeat` y `video` (switchVideoChannel, add_track_callback).
+    Sirve para ejecutar los scripts y benchmark.py sin el robot:
+
+    - Las peticiones y respuestas viajan por una red simulada con `latency`,
+      `jitter` (s) y probabilidad de pérdida `loss` por mensaje y sentido.
+    - Responde a MOTION_SWITCHER (1001/1002; un cambio de modo tarda
+      `mode_switch_time` y corta el estado mientras tanto) y a SPORT_MOD.
+    - Publica LF_SPORT_MOD_STATE a `state_hz` integrando el último Move.
+    - El vídeo es sintético (SyntheticVideoTrack) o un archivo grabado en
+      `video_source` (p. ej. un segmento de recordings/), en bucle.
+
+    Cada petición SPORT_MOD recibida queda en `requests` como
+    (time.time() de envío, time.time() de llegada, api_id, parámetro).
+    """
+
+    def __init__(self, latency=0.02, jitter=0.005, loss=0.0, mode="normal", mode_switch_time=1.0,
+                 state_hz=50, video_source=None, video_size=(1280, 720), fps=30):
+        self.uplink = _Link(latency, jitter, loss)
+        self.downlink = _Link(latency, jitter, loss)
+        self.mode = mode
+        self.mode_switch_time = mode_switch_time
+        self.state_hz = state_hz
+        self.video_source = video_source
+        self.video_size = video_size
+        self.fps = fps
+        self.isConnected = False
+        self.datachannel = None
+        self.video = None
+        self.requests = []
+        self.velocity = (0.0, 0.0, 0.0)
+        self.position = [0.0, 0.0, 0.0]
+        self.yaw = 0.0
+        self._switching_until = 0.0
+        self._tasks = []
+
+    async def connect(self):
+        await asyncio.sleep(self.uplink.latency + self.downlink.latency)
+        self.datachannel = _FakeDataChannel(self)
+        self.video = _FakeVideo(self)
+        self.datachannel.heartbeat.heartbeat_response = time.time()
+        self.isConnected = True
+        self._tasks = [asyncio.create_task(self._state_loop()), asyncio.create_task(self._heartbeat_loop())]
+
+    async def disconnect(self):
+        self.isConnected = False
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self.datachannel is not None:
+            self.datachannel.data_channel_opened = False
+            for futures in self.datachannel.pub_sub.future_resolver.pending_callbacks.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(ConnectionError("conexión cerrada"))
+        if self.video is not None:
+            self.video.stop()
+
+    def drop(self):
+        """Simula un corte: el datachannel se cierra y deja de responder"""
+        if self.datachannel is not None:
+            self.datachannel.data_channel_opened = False
+        self.isConnected = False
+
+    def make_video_track(self):
+        if self.video_source is None:
+            width, height = self.video_size
+            return SyntheticVideoTrack(width, height, self.fps, latency=self.downlink.latency)
+        from aiortc.contrib.media import MediaPlayer
+        return MediaPlayer(self.video_source, loop=True).video
+
+    # Lado del "robot"
+
+    def on_publish(self, topic, req_id, options):
+        self.uplink.send(self._handle, self.datachannel, topic, req_id, options, time.time())
+
+    def _handle(self, datachannel, topic, req_id, options, sent_at):
+        if not self.isConnected or datachannel is not self.datachannel:
+            return
+        api_id = options["api_id"]
+        parameter = options.get("parameter")
+        if isinstance(parameter, str):
+            parameter = json.loads(parameter) if parameter else None
+        data = None
+        if topic == RTC_TOPIC["MOTION_SWITCHER"]:
+            if api_id == CHECK_MODE:
+                data = mode_response(self.mode)["data"]["data"]
+            elif api_id == SELECT_MODE:
+                self._select_mode(parameter["name"])
+        elif topic == RTC_TOPIC["SPORT_MOD"]:
+            self.requests.append((sent_at, time.time(), api_id, parameter))
+            if api_id == SPORT_CMD["Move"]:
+                self.velocity = (parameter["x"], parameter["y"], parameter["z"])
+            elif api_id in (SPORT_CMD["StopMove"], SPORT_CMD["Damp"], SPORT_CMD["Sit"]):
+                self.velocity = (0.0, 0.0, 0.0)
+        message = {"type": "res", "topic": topic, "data": {
+            "header": {"identity": {"id": req_id, "api_id": api_id}, "status": {"code": 0}},
+            "data": data}}
+        self.downlink.send(datachannel.pub_sub.resolve, req_id, message)
+
+    def _select_mode(self, name):
+        # El servicio de movimiento se reinicia: el modo nuevo tarda en verse
+        loop = asyncio.get_running_loop()
+        self._switching_until = loop.time() + self.mode_switch_time
+        loop.call_at(self._switching_until, setattr, self, "mode", name)
+        self.velocity = (0.0, 0.0, 0.0)
+
+    async def _state_loop(self):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / self.state_hz
+        next_tick = loop.time()
+        while True:
+            next_tick += period
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            vx, vy, vz = self.velocity
+            self.yaw += vz * period
+            self.position[0] += (vx * math.cos(self.yaw) - vy * math.sin(self.yaw)) * period
+            self.position[1] += (vx * math.sin(self.yaw) + vy * math.cos(self.yaw)) * period
+            if loop.time() < self._switching_until:
+                continue
+            message = {"type": "msg", "topic": STATE_TOPIC, "data": {
+                "mode": 1 if self.velocity == (0.0, 0.0, 0.0) else 3,
+                "gait_type": 1, "body_height": 0.32,
+                "position": list(self.position), "velocity": [vx, vy, 0.0], "yaw_speed": vz,
+                "imu_state": {"rpy": [0.0, 0.0, self.yaw]}, "foot_force": [100, 100, 100, 100]}}
+            self.downlink.send(self.datachannel.pub_sub.deliver, STATE_TOPIC, message)
+
+    async def _heartbeat_loop(self):
+        heartbeat = self.datachannel.heartbeat
+        while True:
+            await asyncio.sleep(2.0)
+            self.downlink.send(setattr, heartbeat, "heartbeat_response", time.time())
@@ -0,0 +1,241 @@
+"""Shared-memory bus for decoded Go2 camera frames.
+
+camera.py publishes every decoded BGR frame into a ``multiprocessing.shared_memory``
+ring. Other processes on the same machine (detection, recording...) attach with
+``FrameBusReader`` and get the frames as NumPy arrays that point straight into
+the shared buffer, without HTTP, JPEG decode or copies.
+
+Memory layout::
+
+    bus header   magic, capacity, slot size, write_seq,
+                 reader heartbeat, writer pid, writer start time (64 bytes)
+    slot 0       seq, timestamp, height, width, channels, dtype  (64 bytes)
+                 pixel data                                      (slot size)
+    slot 1       ...
+
+A slot's ``seq`` is set to 0 while the writer overwrites it, so readers check
+``valid(seq)`` after using a frame to know whether it was overwritten under
+them (seqlock style). There is a single writer per bus. Readers stamp the
+heartbeat whenever they wait for a frame, which lets the writer skip work
+when nobody has read the bus recently. The writer records its pid and
+process start time, so a new writer only takes over a segment whose writer
+has exited, however long the live one goes without publishing.
+
+Example::
+
+    reader = FrameBusReader()
+    seq = 0
+    while True:
+        frame = reader.wait(seq)
+        if frame:
+            seq = frame.seq
+            detect(frame.image)
+            if not reader.valid(frame.seq):
+                ...  # image was overwritten while we used it
+"""
+import os
+import struct
+import time
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+DEFAULT_BUS_NAME = "go2_frames"
+MAGIC = b"GO2FRAME"
+
+# magic, capacity, slot_size, write_seq (reader heartbeat, writer pid and
+# writer start time follow)
+_BUS_HEADER = struct.Struct("<8sIQQ")
+# seq, timestamp, height, width, channels, dtype
+_SLOT_HEADER = struct.Struct("<QdIII8s")
+_HEADER_SIZE = 64
+_WRITE_SEQ_OFFSET = 20
+_HEARTBEAT_OFFSET = 28
+_WRITER_OFFSET = 36
+# writer pid, start time (clock ticks since boot, 0 if unknown)
+_WRITER = struct.Struct("<IQ")
+
+Frame = namedtuple("Frame", ["seq", "timestamp", "image"])
+
+
+def _slot_offset(index, slot_size):
+    return _HEADER_SIZE + index * (_HEADER_SIZE + slot_size)
+
+
+def _process_start(pid):
+    """Start time of process ``pid`` (field 22 of /proc/<pid>/stat), or 0 if unknown."""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            # The command name may contain spaces: the fields start after ')'
+            return int(f.read().rsplit(b")", 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _live_writer(buf):
+    """PID of the writer still using the bus in ``buf``, or None if it can be reclaimed.
+
+    Reclaimable: not a frame bus header we understand, or a writer process
+    that no longer exists (a live process that reused its pid has a
+    different start time). How long ago it published doesn't matter: a
+    writer waiting for the robot is still the owner.
+    """
+    if len(buf) < _HEADER_SIZE or bytes(buf[:len(MAGIC)]) != MAGIC:
+        return None
+    pid, start = _WRITER.unpack_from(buf, _WRITER_OFFSET)
+    if pid == 0:
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass  # alive, owned by another user
+    if start and _process_start(pid) not in (0, start):
+        return None
+    return pid
+
+
+class FrameBusWriter:
+    """Publishes frames into a shared-memory ring (drop-oldest)."""
+
+    def __init__(self, name=DEFAULT_BUS_NAME, capacity=4, slot_size=1920 * 1080 * 3):
+        self.name = name
+        self.capacity = capacity
+        self.slot_size = slot_size
+        self.write_seq = 0
+        size = _slot_offset(capacity, slot_size)
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a previous run that didn't shut down cleanly, or
+            # still in use by another writer: only the former is reclaimed
+            existing = shared_memory.SharedMemory(name=name)
+            try:
+                owner = _live_writer(existing.buf)
+            finally:
+                existing.close()
+            if owner is not None:
+                raise FileExistsError(f"frame bus {name} is in use by writer PID {owner}")
+            existing.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        _BUS_HEADER.pack_into(self._shm.buf, 0, MAGIC, capacity, slot_size, 0)
+        _WRITER.pack_into(self._shm.buf, _WRITER_OFFSET, os.getpid(), _process_start(os.getpid()))
+
+    def publish(self, img, timestamp=None):
+        """Copy ``img`` into the next slot. Returns its seq, or None if too big."""
+        if img.nbytes > self.slot_size:
+            return None
+        seq = self.write_seq + 1
+        offset = _slot_offset(seq % self.capacity, self.slot_size)
+        buf = self._shm.buf
+
+        # Mark the slot as being written before touching the pixels
+        struct.pack_into("<Q", buf, offset, 0)
+        data = np.ndarray(img.shape, dtype=img.dtype, buffer=buf, offset=offset + _HEADER_SIZE)
+        np.copyto(data, img)
+        height, width = img.shape[:2]
+        channels = img.shape[2] if img.ndim == 3 else 1
+        now = time.time()
+        _SLOT_HEADER.pack_into(buf, offset, seq, timestamp or now,
+                               height, width, channels, img.dtype.str.encode())
+        struct.pack_into("<Q", buf, _WRITE_SEQ_OFFSET, seq)
+        self.write_seq = seq
+        return seq
+
+    def has_readers(self, max_age=2.0):
+        """True if a reader has polled the bus in the last ``max_age`` seconds."""
+        heartbeat = struct.unpack_from("<d", self._shm.buf, _HEARTBEAT_OFFSET)[0]
+        return time.time() - heartbeat < max_age
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+class FrameBusReader:
+    """Maps a bus created by ``FrameBusWriter`` and exposes frames without copying.
+
+    Arrays returned by ``latest()`` / ``wait()`` are views into shared memory:
+    they are only valid until the writer laps the ring and must not be used
+    after ``close()``.
+    """
+
+    def __init__(self, name=DEFAULT_BUS_NAME):
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13: stop the resource tracker from unlinking the
+            # writer's segment when this process exits
+            self._shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        magic, self.capacity, self.slot_size, _ = _BUS_HEADER.unpack_from(self._shm.buf, 0)
+        if magic != MAGIC:
+            self._shm.close()
+            raise ValueError(f"{name} is not a Go2 frame bus")
+
+    @property
+    def write_seq(self):
+        return struct.unpack_from("<Q", self._shm.buf, _WRITE_SEQ_OFFSET)[0]
+
+    def _offset(self, seq):
+        return _slot_offset(seq % self.capacity, self.slot_size)
+
+    def valid(self, seq):
+        """True if frame ``seq`` is still intact in the ring."""
+        return seq > 0 and struct.unpack_from("<Q", self._shm.buf, self._offset(seq))[0] == seq
+
+    def read(self, seq):
+        """Return frame ``seq`` as a ``Frame`` or None if it's no longer available."""
+        if not self.valid(seq):
+            return None
+        offset = self._offset(seq)
+        _, timestamp, height, width, channels, dtype = _SLOT_HEADER.unpack_from(self._shm.buf, offset)
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        image = np.ndarray(shape, dtype=np.dtype(dtype.rstrip(b"\0").decode()),
+                           buffer=self._shm.buf, offset=offset + _HEADER_SIZE)
+        return Frame(seq, timestamp, image)
+
+    def latest(self):
+        """Return the newest frame or None if nothing was published yet."""
+        return self.read(self.write_seq)
+
+    def wait(self, after_seq, timeout=None, poll_interval=0.002):
+        """Wait for a frame newer than ``after_seq``; None on timeout.
+
+        There is no cross-process notification, so this polls the header,
+        which only costs a few bytes of shared memory per check.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.heartbeat()
+        while self.write_seq == after_seq:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+            self.heartbeat()
+        return self.latest()
+
+    def heartbeat(self):
+        """Tell the writer this reader is alive (done by ``wait()``)."""
+        struct.pack_into("<d", self._shm.buf, _HEARTBEAT_OFFSET, time.time())
+
+    def close(self):
+        self._shm.close()
+
+
+if __name__ == "__main__":
+    reader = FrameBusReader()
+    seq = 0
+    try:
+        while True:
+            frame = reader.wait(seq, timeout=1.0)
+            if frame is None:
+                continue
+            seq = frame.seq
+            print(f"Frame {frame.seq} - Shape: {frame.image.shape}, "
+                  f"Latency: {(time.time() - frame.timestamp) * 1000:.1f} ms")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
@@ -0,0 +1,396 @@
+"""Frame distribution for the Go2 camera stream."""
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+# Encoded variants are cached per (quality, scale) tier, so client requests are
+# snapped to these values to let viewers with similar settings share encodes
+QUALITY_TIERS = (30, 40, 50, 60, 70, 85)
+SCALE_TIERS = (0.25, 0.5, 0.75, 1.0)
+MIN_FPS = 2
+MAX_FPS = 30
+
+
+def snap(value, tiers):
+    """Return the tier closest to ``value``."""
+    return min(tiers, key=lambda tier: abs(tier - value))
+
+
+def encode_jpeg(img, quality, scale=1.0):
+    """Encode ``img`` as JPEG, downscaling first if ``scale`` < 1. None on failure."""
+    if scale < 1.0:
+        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    ret, buffer = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes() if ret else None
+
+
+class FrameRing:
+    """Fixed-capacity ring of preallocated frame slots with a drop-oldest policy.
+
+    Frames are copied into reused slots, so memory stays constant no matter how
+    far behind a consumer falls. Slots are guarded seqlock-style: while a slot is
+    being overwritten its sequence number is 0, so a reader that took a view of
+    it can call ``valid(seq)`` afterwards to know whether the data was intact.
+    Not thread-safe on its own; ``FrameHub`` serialises access with its lock.
+    """
+
+    def __init__(self, capacity=4):
+        self.capacity = capacity
+        self.write_seq = 0
+        self._slots = None
+        self._slot_seq = [0] * capacity
+
+    def _ensure_slots(self, img):
+        if self._slots is None or self._slots.shape[1:] != img.shape or self._slots.dtype != img.dtype:
+            self._slots = np.empty((self.capacity,) + img.shape, dtype=img.dtype)
+            self._slot_seq = [0] * self.capacity
+
+    def begin_write(self, img):
+        """Reserve the slot for the next frame and return ``(seq, slot)``."""
+        self._ensure_slots(img)
+        seq = self.write_seq + 1
+        idx = seq % self.capacity
+        self._slot_seq[idx] = 0
+        return seq, self._slots[idx]
+
+    def end_write(self, seq):
+        self._slot_seq[seq % self.capacity] = seq
+        self.write_seq = seq
+
+    def read(self, seq):
+        """Return the slot holding ``seq`` or None if it was overwritten."""
+        if seq <= 0 or not self.valid(seq):
+            return None
+        return self._slots[seq % self.capacity]
+
+    def valid(self, seq):
+        return self._slot_seq[seq % self.capacity] == seq
+
+    def oldest_seq(self):
+        return max(1, self.write_seq - self.capacity + 1)
+
+    def __len__(self):
+        return min(self.write_seq, self.capacity)
+
+
+class FrameHub:
+    """Encodes each received frame once and shares the JPEG bytes with every viewer.
+
+    The WebRTC receiver publishes raw frames with ``publish()``. A single encoder
+    thread turns the newest frame into JPEG outside the lock, so the receiver is
+    never blocked by encoding and N viewers cost one encode per frame. Each frame
+    gets a sequence number; viewers remember the last one they sent so they
+    never send the same frame twice.
+
+    Consumers block on ``wait_frame()`` / ``wait_jpeg()`` instead of polling, so
+    a frame is pushed the moment it is ready and idle viewers cost no CPU.
+
+    Raw frames live in a bounded ``FrameRing``. Consumers that need every frame
+    use ``wait_next()``; if they fall more than ``capacity`` frames behind, the
+    oldest frames are dropped and counted in ``dropped_frames``.
+
+    Viewers that want a lower quality or resolution use ``wait_variant()``. Each
+    (quality, scale) tier is encoded at most once per frame, by whichever viewer
+    asks first, and shared with every other viewer on the same tier.
+
+    Viewers register with ``consumer()`` so the receiver can tell when nobody
+    needs pixels and skip the BGR conversion.
+    """
+
+    def __init__(self, quality=85, capacity=4, metrics=None):
+        self.quality = quality
+        self.metrics = metrics
+        self.dropped_frames = 0
+        self.consumers = 0
+        self.published_at = None  # monotonic time of the newest frame
+        self._ring = FrameRing(capacity)
+        self._lock = threading.Lock()
+        # Separate conditions so a raw frame only wakes the encoder, not viewers
+        self._frame_cond = threading.Condition(self._lock)
+        self._jpeg_cond = threading.Condition(self._lock)
+        self._consumer_cond = threading.Condition(self._lock)
+        self._jpeg = None
+        self._jpeg_seq = 0
+        # (quality, scale) -> (seq, bytes) for the non-default tiers
+        self._variants = {}
+        self._encoding = set()
+        self._listeners = []
+        self._encoder_thread = None
+
+    def add_listener(self, callback):
+        """Call ``callback(kind)`` whenever a new 'frame' or 'jpeg' is available.
+
+        Callbacks run on the publishing thread and must not block; the asyncio
+        server uses this to wake its event loop.
+        """
+        self._listeners.append(callback)
+
+    def _notify_listeners(self, kind):
+        for callback in self._listeners:
+            callback(kind)
+
+    @contextmanager
+    def consumer(self):
+        """Count the caller as an active consumer for the duration of the block."""
+        with self._lock:
+            self.consumers += 1
+            self._consumer_cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.consumers -= 1
+
+    def wait_consumers(self, timeout=None):
+        """Block until at least one consumer is registered; False on timeout."""
+        with self._lock:
+            return self._consumer_cond.wait_for(lambda: self.consumers > 0, timeout)
+
+    def publish(self, img):
+        """Copy a new raw frame into the ring and wake the consumers."""
+        start = time.perf_counter()
+        with self._lock:
+            seq, slot = self._ring.begin_write(img)
+        # The copy runs outside the lock; readers of this slot see it as invalid
+        np.copyto(slot, img)
+        if self.metrics is not None:
+            self.metrics.observe('copy', time.perf_counter() - start)
+        with self._lock:
+            self._ring.end_write(seq)
+            self.published_at = time.monotonic()
+            self._frame_cond.notify_all()
+        self._notify_listeners('frame')
+
+    def frame_age(self):
+        """Seconds since the newest frame was published, or None."""
+        published_at = self.published_at
+        return None if published_at is None else time.monotonic() - published_at
+
+    @property
+    def capacity(self):
+        return self._ring.capacity
+
+    def queue_size(self):
+        """Number of frames currently held in the ring."""
+        with self._lock:
+            return len(self._ring)
+
+    def valid(self, seq):
+        """True if the frame ``seq`` is still intact in the ring.
+
+        Call after using a view returned by ``wait_frame()`` / ``wait_next()``.
+        """
+        with self._lock:
+            return self._ring.valid(seq)
+
+    def latest_frame(self):
+        """Return ``(seq, ndarray)`` for the newest raw frame.
+
+        The array is a view into the ring, valid until ``capacity`` more frames
+        arrive.
+        """
+        with self._lock:
+            seq = self._ring.write_seq
+            return seq, self._ring.read(seq)
+
+    def latest_jpeg(self):
+        """Return ``(seq, bytes)`` for the newest encoded frame."""
+        with self._lock:
+            return self._jpeg_seq, self._jpeg
+
+    def wait_frame(self, after_seq, timeout=None):
+        """Block until a raw frame newer than ``after_seq`` arrives.
+
+        Returns ``(seq, ndarray)`` for the newest frame, skipping any in
+        between; ``seq`` equals ``after_seq`` on timeout.
+        """
+        with self._lock:
+            self._frame_cond.wait_for(lambda: self._ring.write_seq != after_seq, timeout)
+            seq = self._ring.write_seq
+            return seq, self._ring.read(seq)
+
+    def wait_next(self, after_seq, timeout=None):
+        """Block until the frame following ``after_seq`` is available.
+
+        Returns ``(seq, ndarray)`` in order. Frames already overwritten are
+        skipped and counted as dropped; ``seq`` equals ``after_seq`` on timeout.
+        """
+        with self._lock:
+            if not self._frame_cond.wait_for(lambda: self._ring.write_seq > after_seq, timeout):
+                return after_seq, None
+            seq = max(after_seq + 1, self._ring.oldest_seq())
+            self.dropped_frames += seq - after_seq - 1
+            return seq, self._ring.read(seq)
+
+    def wait_jpeg(self, after_seq, timeout=None):
+        """Block until a JPEG newer than ``after_seq`` is ready.
+
+        Returns ``(seq, bytes)``; ``seq`` equals ``after_seq`` on timeout.
+        """
+        with self._lock:
+            self._jpeg_cond.wait_for(lambda: self._jpeg_seq != after_seq, timeout)
+            return self._jpeg_seq, self._jpeg
+
+    def wait_variant(self, after_seq, quality, scale, timeout=None):
+        """Like ``wait_jpeg()`` but for a given (quality, scale) tier."""
+        if quality == self.quality and scale == 1.0:
+            return self.wait_jpeg(after_seq, timeout)
+        seq, _ = self.wait_frame(after_seq, timeout)
+        if seq == after_seq:
+            return seq, None
+        return self.encode_variant(seq, quality, scale)
+
+    def encode_variant(self, seq, quality, scale):
+        """Return ``(seq, bytes)`` for frame ``seq`` at a tier, encoding it if needed.
+
+        Falls back to the newest frame if ``seq`` was already overwritten.
+        """
+        key = (quality, scale)
+        with self._lock:
+            # Another viewer may already be encoding this tier
+            while key in self._encoding:
+                self._jpeg_cond.wait()
+            cached = self._variants.get(key)
+            if cached is not None and cached[0] >= seq:
+                return cached
+            img = self._ring.read(seq)
+            if img is None:
+                seq = self._ring.write_seq
+                img = self._ring.read(seq)
+            self._encoding.add(key)
+
+        jpeg = None
+        try:
+            jpeg = encode_jpeg(img, quality, scale)
+        finally:
+            with self._lock:
+                self._encoding.discard(key)
+                if jpeg is not None and self._ring.valid(seq):
+                    self._variants[key] = (seq, jpeg)
+                else:
+                    jpeg = None
+                self._jpeg_cond.notify_all()
+        return seq, jpeg
+
+    def encode(self, seq):
+        """Encode frame ``seq`` at the default quality and make it the latest JPEG."""
+        with self._lock:
+            img = self._ring.read(seq)
+        if img is None:
+            return
+        start = time.perf_counter()
+        # bytes are immutable, so every viewer can share the same object
+        jpeg = encode_jpeg(img, self.quality)
+        if self.metrics is not None:
+            self.metrics.observe('encode', time.perf_counter() - start)
+            self.metrics.encoded.tick()
+        with self._lock:
+            # The receiver may have lapped the ring while we were encoding
+            if jpeg is None or not self._ring.valid(seq) or seq <= self._jpeg_seq:
+                return
+            self._jpeg_seq, self._jpeg = seq, jpeg
+            self._jpeg_cond.notify_all()
+        self._notify_listeners('jpeg')
+
+    def start(self):
+        """Start the encoder thread (not needed when an event loop drives ``encode()``)."""
+        if self._encoder_thread is None:
+            self._encoder_thread = threading.Thread(target=self._encode_loop, daemon=True)
+            self._encoder_thread.start()
+
+    def _encode_loop(self):
+        seq = 0
+        while True:
+            seq, _ = self.wait_frame(seq)
+            # Frames also flow for shared-memory readers: only encode for viewers
+            if self.consumers:
+                self.encode(seq)
+
+
+class ClientStream:
+    """Stream settings of one viewer.
+
+    Built from the ``q``, ``scale`` and ``fps`` query parameters. With
+    ``adaptive=1`` the quality/scale/fps are driven by how long each frame takes
+    to write to the viewer's socket: a slow link walks down ``LADDER`` (and then
+    halves the frame rate), a fast one walks back up.
+    """
+
+    LADDER = ((85, 1.0), (70, 1.0), (60, 0.75), (50, 0.5), (40, 0.5), (30, 0.25))
+    SLOW_FRAMES = 3
+    FAST_FRAMES = 30
+
+    def __init__(self, quality=85, scale=1.0, fps=MAX_FPS, adaptive=False):
+        self.quality = snap(quality, QUALITY_TIERS)
+        self.scale = snap(scale, SCALE_TIERS)
+        self.max_fps = max(MIN_FPS, min(MAX_FPS, fps))
+        self.fps = self.max_fps
+        self.adaptive = adaptive
+        self.last_seq = 0
+        # Filled in by PipelineMetrics
+        self.frames_sent = 0
+        self.lag_frames = 0
+        self.send_ms = 0.0
+        self._level = 0
+        self._slow = 0
+        self._fast = 0
+        if adaptive:
+            self.quality, self.scale = self.LADDER[0]
+
+    @classmethod
+    def from_query(cls, args):
+        """Build from a mapping of query parameters, ignoring invalid values."""
+        def number(name, default, cast):
+            try:
+                return cast(args.get(name, default))
+            except (TypeError, ValueError):
+                return default
+
+        return cls(quality=number('q', 85, int),
+                   scale=number('scale', 1.0, float),
+                   fps=number('fps', MAX_FPS, float),
+                   adaptive=args.get('adaptive', '0') not in ('0', 'false', ''))
+
+    @property
+    def frame_interval(self):
+        return 1.0 / self.fps
+
+    def sent(self, send_time):
+        """Record how long the last frame took to write to the socket."""
+        if not self.adaptive:
+            return
+        budget = self.frame_interval
+        if send_time > 0.5 * budget:
+            self._slow += 1
+            self._fast = 0
+        elif send_time < 0.1 * budget:
+            self._fast += 1
+            self._slow = 0
+
+        if self._slow >= self.SLOW_FRAMES:
+            self._slow = 0
+            if self._level < len(self.LADDER) - 1:
+                self._level += 1
+            else:
+                self.fps = max(MIN_FPS, self.fps / 2)
+        elif self._fast >= self.FAST_FRAMES:
+            self._fast = 0
+            if self.fps < self.max_fps:
+                self.fps = min(self.max_fps, self.fps * 2)
+            elif self._level > 0:
+                self._level -= 1
+        self.quality, self.scale = self.LADDER[self._level]
+
+    def as_dict(self):
+        return {
+            'quality': self.quality,
+            'scale': self.scale,
+            'fps': self.fps,
+            'adaptive': self.adaptive,
+            'frames_sent': self.frames_sent,
+            'lag_frames': self.lag_frames,
+            'send_ms': self.send_ms,
+        }
@@ -0,0 +1,234 @@
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from collections import namedtuple
+
+# Tipos de evento
+AXIS = "axis"
+BUTTON = "button"
+
+JoystickEvent = namedtuple("JoystickEvent", ["kind", "index", "value", "timestamp"])
+
+class JoystickInput:
+    """Entrada del mando por eventos para los scripts de teleoperación.
+
+    Usa evdev (lectura asíncrona de /dev/input, sin esperas fijas) y, si no
+    está disponible, pygame como alternativa. Los índices de ejes y botones son
+    los mismos que da pygame/SDL (eje 0/1 stick izquierdo, 3 stick derecho,
+    botón 0 = A...), así que los scripts no dependen del backend.
+
+    El estado actual se guarda en `axes` y `buttons`, listas de tamaño fijo que
+    se actualizan en el sitio. events() genera JoystickEvent con la marca de
+    tiempo del evento:
+
+        joystick = JoystickInput.open()
+        async for event in joystick.events():
+            if event.kind == AXIS:
+                x = joystick.axes[1]
+    """
+
+    def __init__(self, backend, name, num_axes, num_buttons):
+        self.backend = backend
+        self.name = name
+        self.axes = [0.0] * num_axes
+        self.buttons = [False] * num_buttons
+
+    @staticmethod
+    def open(device_path=None):
+        """Abre el primer mando disponible (o `device_path` con evdev).
+
+        Con la variable de entorno GO2_JOYSTICK_TRACE reproduce esa grabación
+        en lugar de usar un mando (ver replay()).
+        """
+        trace = os.environ.get("GO2_JOYSTICK_TRACE")
+        if trace:
+            return JoystickInput.replay(trace)
+        try:
+            return _EvdevJoystick(device_path)
+        except (ImportError, OSError, LookupError) as e:
+            logging.info(f"evdev no disponible ({e}), usando pygame")
+            return _PygameJoystick()
+
+    @staticmethod
+    def replay(path, speed=1.0):
+        """Mando que reproduce una grabación de record_trace() respetando sus tiempos"""
+        return _TraceJoystick(path, speed)
+
+    async def events(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+async def record_trace(joystick, path):
+    """Graba los eventos del mando en `path` (JSON por línea) hasta cancelarlo.
+
+    La primera línea describe el mando; cada evento es [t, tipo, índice, valor]
+    con t en segundos desde el primer evento.
+    """
+    with open(path, "w") as f:
+        f.write(json.dumps({"name": joystick.name, "axes": len(joystick.axes),
+                            "buttons": len(joystick.buttons)}) + "\n")
+        start = None
+        async for event in joystick.events():
+            if start is None:
+                start = event.timestamp
+            f.write(json.dumps([round(event.timestamp - start, 4), event.kind, event.index, event.value]) + "\n")
+
+
+class _TraceJoystick(JoystickInput):
+    """Reproduce una grabación; los eventos salen en su instante (ajustado por `speed`)"""
+
+    def __init__(self, path, speed=1.0):
+        with open(path) as f:
+            header = json.loads(f.readline())
+            self.trace = [tuple(json.loads(line)) for line in f if line.strip()]
+        self.speed = speed
+        super().__init__("trace", header.get("name", os.path.basename(path)),
+                         header["axes"], header["buttons"])
+
+    @property
+    def duration(self):
+        return self.trace[-1][0] / self.speed if self.trace else 0.0
+
+    async def events(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for t, kind, index, value in self.trace:
+            # Instantes absolutos: los retrasos del consumidor no se acumulan
+            delay = start + t / self.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if kind == AXIS:
+                self.axes[index] = value
+            else:
+                self.buttons[index] = value
+            yield JoystickEvent(kind, index, value, time.time())
+
+
+class _EvdevJoystick(JoystickInput):
+    # SDL trata los ejes de cruceta como "hats", no como ejes
+    HAT_CODES = range(0x10, 0x18)  # ABS_HAT0X .. ABS_HAT3Y
+    BTN_MISC = 0x100
+    BTN_JOYSTICK = 0x120
+
+    def __init__(self, device_path=None):
+        import evdev
+        from evdev import ecodes
+        self._ecodes = ecodes
+
+        self.device = evdev.InputDevice(device_path) if device_path else self._find_device(evdev)
+        capabilities = self.device.capabilities()
+
+        # Mismo orden que SDL: ejes por código, botones desde BTN_JOYSTICK y luego BTN_MISC
+        abs_codes = sorted(code for code, _ in capabilities.get(ecodes.EV_ABS, [])
+                           if code not in self.HAT_CODES)
+        key_codes = sorted(code for code in capabilities.get(ecodes.EV_KEY, [])
+                           if code >= self.BTN_MISC)
+        key_codes = ([code for code in key_codes if code >= self.BTN_JOYSTICK]
+                     + [code for code in key_codes if code < self.BTN_JOYSTICK])
+
+        self._axis_index = {code: i for i, code in enumerate(abs_codes)}
+        self._button_index = {code: i for i, code in enumerate(key_codes)}
+        # Normalización a [-1, 1] precalculada por eje
+        self._axis_scale = {}
+        for code in abs_codes:
+            info = self.device.absinfo(code)
+            span = (info.max - info.min) or 1
+            self._axis_scale[code] = (2.0 / span, info.min)
+
+        super().__init__("evdev", self.device.name, len(abs_codes), len(key_codes))
+
+    @staticmethod
+    def _find_device(evdev):
+        for path in evdev.list_devices():
+            device = evdev.InputDevice(path)
+            keys = device.capabilities().get(evdev.ecodes.EV_KEY, [])
+            if evdev.ecodes.BTN_GAMEPAD in keys or evdev.ecodes.BTN_JOYSTICK in keys:
+                return device
+            device.close()
+        raise LookupError("No se detectó ningún mando")
+
+    async def events(self):
+        ecodes = self._ecodes
+        async for ev in self.device.async_read_loop():
+            if ev.type == ecodes.EV_ABS:
+                index = self._axis_index.get(ev.code)
+                if index is None:
+                    continue
+                scale, minimum = self._axis_scale[ev.code]
+                value = (ev.value - minimum) * scale - 1.0
+                self.axes[index] = value
+                yield JoystickEvent(AXIS, index, value, ev.timestamp())
+            elif ev.type == ecodes.EV_KEY and ev.value != 2:  # 2 = autorepetición
+                index = self._button_index.get(ev.code)
+                if index is None:
+                    continue
+                pressed = ev.value == 1
+                self.buttons[index] = pressed
+                yield JoystickEvent(BUTTON, index, pressed, ev.timestamp())
+
+    def close(self):
+        self.device.close()
+
+
+class _PygameJoystick(JoystickInput):
+    """Alternativa con pygame: lee la cola de eventos de SDL con un sondeo corto"""
+
+    POLL_INTERVAL = 0.005
+
+    def __init__(self):
+        import pygame
+        self._pygame = pygame
+        pygame.init()
+        pygame.joystick.init()
+        if pygame.joystick.get_count() == 0:
+            raise LookupError("No se detectó ningún mando")
+        self.joystick = pygame.joystick.Joystick(0)
+        self.joystick.init()
+        # Solo entran en la cola los eventos del mando; el resto (ventana,
+        # audio, dispositivos) nadie los lee y la haría crecer sin límite
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed([pygame.JOYAXISMOTION, pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP])
+        super().__init__("pygame", self.joystick.get_name(),
+                         self.joystick.get_numaxes(), self.joystick.get_numbuttons())
+
+    async def events(self):
+        pygame = self._pygame
+        while True:
+            # get() sin filtro vacía toda la cola, también lo que no es del mando
+            for ev in pygame.event.get():
+                now = time.time()
+                if ev.type == pygame.JOYAXISMOTION:
+                    self.axes[ev.axis] = ev.value
+                    yield JoystickEvent(AXIS, ev.axis, ev.value, now)
+                elif ev.type in (pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP):
+                    pressed = ev.type == pygame.JOYBUTTONDOWN
+                    self.buttons[ev.button] = pressed
+                    yield JoystickEvent(BUTTON, ev.button, pressed, now)
+            await asyncio.sleep(self.POLL_INTERVAL)
+
+    def close(self):
+        self._pygame.quit()
+
+
+async def _record(path):
+    joystick = JoystickInput.open()
+    print(f"🎮 Grabando {joystick.name} en {path} (Ctrl+C para terminar)")
+    try:
+        await record_trace(joystick, path)
+    finally:
+        joystick.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"Uso: {sys.argv[0]} <archivo.jsonl>")
+        sys.exit(1)
+    try:
+        asyncio.run(_record(sys.argv[1]))
+    except KeyboardInterrupt:
+        print("\n✅ Grabación terminada")
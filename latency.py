@@ -0,0 +1,33 @@
+"""Latency histogram shared by the camera pipeline metrics and the servo controller."""
+import bisect
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts for Prometheus plus a window of recent samples
+    for percentiles."""
+
+    BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+    def __init__(self, window=1024):
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._samples = np.zeros(window)
+        self._next = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        self._samples[self._next % len(self._samples)] = seconds
+        self._next += 1
+
+    def percentiles(self):
+        """p50/p95/p99 of the recent window in milliseconds, or None."""
+        n = min(self._next, len(self._samples))
+        if n == 0:
+            return None
+        p50, p95, p99 = (np.percentile(self._samples[:n], (50, 95, 99)) * 1000).tolist()
+        return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import math
+import os
+from collections import namedtuple
+from go2_webrtc_driver.constants import SPORT_CMD
+
+MACRO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "macros")
+
+DEFAULT_COMMAND_DURATION = 1.0  # segundos hasta la siguiente acción tras un comando
+DEFAULT_WALK_SPEED = 0.5  # m/s
+DEFAULT_TURN_RATE = 60.0  # grados/s
+
+# time: segundos desde el inicio; kind: "velocity" (value = (x, y, z)) o "command" (value = nombre)
+Step = namedtuple("Step", ["time", "kind", "value"])
+Macro = namedtuple("Macro", ["name", "steps", "duration"])
+
+def compile_macro(name, actions):
+    """Convierte la lista de acciones en un programa de pasos con instantes absolutos.
+
+    Acciones (un dict por acción; `duration` es opcional salvo en move/wait):
+        {"cmd": "Hello", "duration": 2.5}           comando SPORT_CMD
+        {"walk": 2.0, "speed": 0.5}                  metros hacia delante (negativo: atrás)
+        {"strafe": -1.0, "speed": 0.3}               metros a la izquierda (negativo: derecha)
+        {"turn": 90, "rate": 60}                     grados a la izquierda (negativo: derecha)
+        {"move": [x, y, z], "duration": 1.5}         velocidad directa
+        {"wait": 1.0}                                pausa parado
+    """
+    steps = []
+    t = 0.0
+    moving = False
+    for i, action in enumerate(actions):
+        try:
+            if "cmd" in action:
+                if action["cmd"] not in SPORT_CMD:
+                    raise ValueError(f"comando desconocido: {action['cmd']}")
+                if moving:
+                    steps.append(Step(t, "velocity", (0.0, 0.0, 0.0)))
+                    moving = False
+                steps.append(Step(t, "command", action["cmd"]))
+                t += float(action.get("duration", DEFAULT_COMMAND_DURATION))
+                continue
+
+            if "walk" in action or "strafe" in action:
+                distance = float(action.get("walk", action.get("strafe")))
+                speed = math.copysign(abs(float(action.get("speed", DEFAULT_WALK_SPEED))), distance)
+                velocity = (speed, 0.0, 0.0) if "walk" in action else (0.0, speed, 0.0)
+                duration = abs(distance / speed)
+            elif "turn" in action:
+                angle = float(action["turn"])
+                rate = math.copysign(abs(float(action.get("rate", DEFAULT_TURN_RATE))), angle)
+                velocity = (0.0, 0.0, math.radians(rate))
+                duration = abs(angle / rate)
+            elif "move" in action:
+                velocity = tuple(float(v) for v in action["move"])
+                if len(velocity) != 3:
+                    raise ValueError("move necesita [x, y, z]")
+                duration = float(action["duration"])
+            elif "wait" in action:
+                velocity = (0.0, 0.0, 0.0)
+                duration = float(action["wait"])
+            else:
+                raise ValueError(f"acción desconocida: {action}")
+        except (KeyError, TypeError, ValueError, ZeroDivisionError) as e:
+            raise ValueError(f"{name}, acción {i + 1}: {e}") from None
+
+        if velocity != (0.0, 0.0, 0.0) or moving:
+            steps.append(Step(t, "velocity", velocity))
+        moving = velocity != (0.0, 0.0, 0.0)
+        t += duration
+
+    if moving:
+        steps.append(Step(t, "velocity", (0.0, 0.0, 0.0)))
+    return Macro(name, steps, t)
+
+def load_macro(path):
+    """Carga y compila una macro JSON (lista de acciones, ver compile_macro)"""
+    if not os.path.isabs(path):
+        path = os.path.join(MACRO_DIR, path)
+    with open(path) as f:
+        actions = json.load(f)
+    return compile_macro(os.path.basename(path), actions)
+
+class MacroRunner:
+    """Ejecuta macros compiladas sobre el VelocityScheduler y el SportPublisher.
+
+    Cada paso se programa en su instante absoluto desde el inicio de la macro,
+    así que los retrasos de un paso no se acumulan en los siguientes. Las
+    velocidades se dejan en el planificador (que las sigue enviando a su
+    frecuencia) y los comandos se envían en tareas aparte para no retrasar el
+    programa. cancel() para la macro en cualquier momento y deja el robot
+    parado.
+    """
+
+    def __init__(self, scheduler, publisher):
+        self.scheduler = scheduler
+        self.publisher = publisher
+        self.max_lateness = 0.0  # peor retraso de un paso respecto a su instante, en s
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def start(self, macro):
+        self.cancel()
+        print(f"🎬 Macro '{macro.name}' ({macro.duration:.1f} s)")
+        self._task = asyncio.create_task(self._run(macro))
+        return self._task
+
+    def cancel(self):
+        if self.running:
+            self._task.cancel()
+            # Se para aquí y no en _run: la tarea cancelada sigue viva hasta su
+            # siguiente await y un cero suyo pisaría la velocidad que el
+            # llamador ponga justo después (por ejemplo el stick que la cancela)
+            self.scheduler.set(0.0, 0.0, 0.0)
+            print("⏹️ Macro cancelada")
+        self._task = None
+
+    async def _run(self, macro):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        for step in macro.steps:
+            delay = start + step.time - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.max_lateness = max(self.max_lateness, loop.time() - start - step.time)
+            if step.kind == "velocity":
+                self.scheduler.set(*step.value)
+            else:
+                asyncio.create_task(self._command(step.value))
+        # Esperar al final de la última acción
+        delay = start + macro.duration - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        # Al cancelar la parada la hace cancel()
+        self.scheduler.set(0.0, 0.0, 0.0)
+        logging.info(f"✅ Macro '{macro.name}' terminada (retraso máximo "
+                     f"{self.max_lateness * 1000:.1f} ms)")
+
+    async def _command(self, name):
+        try:
+            await self.publisher.request(SPORT_CMD[name])
+        except Exception as e:
+            logging.error(f"❌ Error enviando {name}: {e}")
@@ -0,0 +1,227 @@
+"""asyncio HTTP/MJPEG server for the Go2 camera stream.
+
+Serves ``/``, ``/video_feed`` and ``/status`` from the same event loop that runs
+``Go2WebRTCConnection``, so there is no thread per viewer and no lock between
+the WebRTC receiver and the HTTP side. Frame handoff from ``FrameHub`` uses
+futures on the loop, and JPEG encoding runs on a small thread pool executor.
+"""
+import asyncio
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from frame_hub import ClientStream
+from pipeline_metrics import PipelineMetrics
+
+BOUNDARY = b'frame'
+# Largest request body read (the WebRTC offer is a few KB of SDP)
+MAX_BODY = 64 * 1024
+
+
+class AsyncVideoServer:
+    """Minimal HTTP/1.1 server for the MJPEG stream.
+
+    ``render_index()`` returns the HTML of the main page and ``status()`` the
+    dict served as JSON on ``/status``. Extra endpoints are registered with
+    ``add_route()``.
+    """
+
+    def __init__(self, hub, render_index, status, metrics=None, encoder_workers=2):
+        self.hub = hub
+        self.metrics = metrics or PipelineMetrics()
+        self.render_index = render_index
+        self.status = status
+        self.viewers = 0
+        self._executor = ThreadPoolExecutor(max_workers=encoder_workers,
+                                            thread_name_prefix='jpeg')
+        self._loop = None
+        self._waiters = {}
+        self._server = None
+        self._encoder_task = None
+        self._routes = {}
+        self._connections = set()
+
+    def add_route(self, method, path, handler):
+        """Serve ``method path`` with ``await handler(query, body)``.
+
+        ``query`` is a dict of query parameters and ``body`` the request body;
+        the handler returns ``(status, content_type, body_bytes)``.
+        """
+        self._routes[(method, path)] = handler
+
+    async def start(self, host='0.0.0.0', port=5000):
+        self._loop = asyncio.get_running_loop()
+        self._waiters = {'frame': self._loop.create_future(),
+                         'jpeg': self._loop.create_future(),
+                         'viewer': self._loop.create_future()}
+        self.hub.add_listener(self._on_hub_event)
+        self._encoder_task = asyncio.create_task(self._encode_loop())
+        self._server = await asyncio.start_server(self._accept, host, port)
+
+    async def close(self):
+        if self._encoder_task is not None:
+            self._encoder_task.cancel()
+        if self._server is not None:
+            self._server.close()
+        # Open streams never end by themselves
+        connections = list(self._connections)
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    # Frame notifications
+
+    def _on_hub_event(self, kind):
+        # May be called from any thread
+        self._loop.call_soon_threadsafe(self._wake, kind)
+
+    def _wake(self, kind):
+        waiter = self._waiters[kind]
+        self._waiters[kind] = self._loop.create_future()
+        waiter.set_result(None)
+
+    async def _wait(self, kind, timeout=None):
+        """Wait for the next 'frame' or 'jpeg' event. False on timeout."""
+        try:
+            await asyncio.wait_for(asyncio.shield(self._waiters[kind]), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def _encode_loop(self):
+        seq = 0
+        while True:
+            if self.hub.consumers == 0:
+                # Frames can still arrive for shared-memory readers or the
+                # recorder; nobody needs the JPEG until a viewer connects
+                await self._wait('viewer')
+                continue
+            latest, _ = self.hub.latest_frame()
+            if latest == seq:
+                await self._wait('frame')
+                continue
+            seq = latest
+            await self._loop.run_in_executor(self._executor, self.hub.encode, seq)
+
+    async def _next_jpeg(self, client, timeout=1.0):
+        """Return ``(seq, bytes)`` for the next frame of the client's tier."""
+        if client.quality == self.hub.quality and client.scale == 1.0:
+            seq, jpeg = self.hub.latest_jpeg()
+            if seq == client.last_seq and await self._wait('jpeg', timeout):
+                seq, jpeg = self.hub.latest_jpeg()
+            return seq, jpeg
+
+        seq, _ = self.hub.latest_frame()
+        if seq == client.last_seq:
+            if not await self._wait('frame', timeout):
+                return seq, None
+            seq, _ = self.hub.latest_frame()
+        return await self._loop.run_in_executor(
+            self._executor, self.hub.encode_variant, seq, client.quality, client.scale)
+
+    # HTTP
+
+    def _accept(self, reader, writer):
+        # The handler runs in a task of our own rather than one created by
+        # start_server: on Python 3.11 that task's done callback logs a
+        # traceback for every stream still open when the loop shuts down
+        task = self._loop.create_task(self._handle(reader, writer))
+        self._connections.add(task)
+        task.add_done_callback(self._connections.discard)
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            content_length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.strip().lower() == 'content-length':
+                    value = value.strip()
+                    content_length = int(value) if value.isdigit() else -1
+            if content_length < 0:
+                await self._respond(writer, '400 Bad Request', 'text/plain', b'')
+                return
+            if content_length > MAX_BODY:
+                await self._respond(writer, '413 Payload Too Large', 'text/plain', b'')
+                return
+            body = await reader.readexactly(content_length) if content_length else b''
+
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                await self._respond(writer, '400 Bad Request', 'text/plain', b'')
+                return
+            method, url = parts[0], urlsplit(parts[1])
+            query = dict(parse_qsl(url.query))
+            handler = self._routes.get((method, url.path))
+            if handler is not None:
+                await self._respond(writer, *await handler(query, body))
+            elif method != 'GET':
+                await self._respond(writer, '405 Method Not Allowed', 'text/plain', b'')
+            elif url.path == '/':
+                page = self.render_index().encode()
+                await self._respond(writer, '200 OK', 'text/html; charset=utf-8', page)
+            elif url.path == '/status':
+                await self._respond(writer, '200 OK', 'application/json',
+                                    json.dumps(self.status()).encode())
+            elif url.path == '/video_feed':
+                await self._stream(writer, ClientStream.from_query(query))
+            else:
+                await self._respond(writer, '404 Not Found', 'text/plain', b'Not Found')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutting down: the finally below drops the connection,
+            # and the cancellation is not logged as a request error
+            raise
+        except Exception as e:
+            logging.error(f"Error serving request: {e}")
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, content_type, body):
+        writer.write(f'HTTP/1.1 {status}\r\n'
+                     f'Content-Type: {content_type}\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     'Connection: close\r\n\r\n'.encode() + body)
+        await writer.drain()
+
+    async def _stream(self, writer, client):
+        writer.write(b'HTTP/1.1 200 OK\r\n'
+                     b'Content-Type: multipart/x-mixed-replace; boundary=' + BOUNDARY + b'\r\n'
+                     b'Cache-Control: no-cache\r\n'
+                     b'Connection: close\r\n\r\n')
+        await writer.drain()
+        self.viewers += 1
+        try:
+            with self.hub.consumer(), self.metrics.client(client):
+                self._wake('viewer')
+                await self._send_frames(writer, client)
+        finally:
+            self.viewers -= 1
+
+    async def _send_frames(self, writer, client):
+        while True:
+            seq, frame_bytes = await self._next_jpeg(client)
+            if frame_bytes is None or seq == client.last_seq:
+                continue
+            client.last_seq = seq
+
+            start = time.monotonic()
+            writer.write(b'--' + BOUNDARY + b'\r\n'
+                         b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+            # drain() waits while the socket buffer is full: the send backlog
+            await writer.drain()
+            elapsed = time.monotonic() - start
+            client.sent(elapsed)
+            self.metrics.client_sent(client, elapsed, self.hub.latest_frame()[0])
+
+            if elapsed < client.frame_interval:
+                await asyncio.sleep(client.frame_interval - elapsed)
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import logging
+import time
+from go2_webrtc_driver.constants import RTC_TOPIC
+
+# api_id de MOTION_SWITCHER
+CHECK_MODE = 1001
+SELECT_MODE = 1002
+
+STATE_TOPIC = RTC_TOPIC["LF_SPORT_MOD_STATE"]
+
+def mode_response(name):
+    """Respuesta con la misma forma que la de 1001 del robot (usada por el demonio)"""
+    return {"data": {"header": {"identity": {"api_id": CHECK_MODE}, "status": {"code": 0}},
+                     "data": json.dumps({"name": name})}}
+
+class MotionModeManager:
+    """Modo de movimiento (MOTION_SWITCHER) con caché.
+
+    El último modo conocido se guarda y se da por bueno mientras el estado del
+    robot (LF_SPORT_MOD_STATE) siga llegando sin cortes: un cambio de modo
+    reinicia el servicio de movimiento y una reconexión corta el flujo, y en
+    ambos casos un hueco de más de `state_gap` segundos invalida la caché.
+
+    ensure() solo pregunta al robot si no hay caché válida y, si hay que
+    cambiar de modo, en lugar de esperar un tiempo fijo espera a que 1001
+    confirme el modo nuevo y llegue estado del robot, con un límite de
+    `timeout` segundos.
+
+        modes = MotionModeManager(publisher, required="normal")
+        conn.on_connect(modes.on_connect)  # suscribe y pone el modo al (re)conectar
+    """
+
+    def __init__(self, publisher, required=None, state_gap=1.0, timeout=10.0, poll_interval=0.25):
+        self.publisher = publisher
+        self.required = required
+        self.state_gap = state_gap
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.mode = None
+        self._last_state = None
+        self._state_count = 0
+
+    def attach(self, pub_sub):
+        """Suscribe al estado del robot (hay que repetirlo tras cada conexión)"""
+        pub_sub.subscribe(STATE_TOPIC, self.on_state)
+
+    async def on_connect(self, conn):
+        """Callback para ConnectionSupervisor.on_connect()"""
+        self.attach(conn.datachannel.pub_sub)
+        if self.required is not None:
+            await self.ensure(self.required)
+
+    def on_state(self, message):
+        now = time.monotonic()
+        if self._last_state is not None and now - self._last_state > self.state_gap:
+            self.invalidate()
+        self._last_state = now
+        self._state_count += 1
+
+    def invalidate(self):
+        self.mode = None
+
+    def cached(self):
+        """Modo en caché si sigue siendo válido, o None"""
+        if self._last_state is None or time.monotonic() - self._last_state > self.state_gap:
+            return None
+        return self.mode
+
+    def update(self, response):
+        """Guarda el modo de una respuesta a 1001 y lo devuelve"""
+        self.mode = json.loads(response["data"]["data"])["name"]
+        return self.mode
+
+    async def query(self, timeout=None):
+        """Pregunta el modo al robot (1001)"""
+        response = await self.publisher.request(CHECK_MODE, topic=RTC_TOPIC["MOTION_SWITCHER"],
+                                                timeout=timeout or self.timeout)
+        return self.update(response)
+
+    async def current(self):
+        return self.cached() or await self.query()
+
+    async def ensure(self, name):
+        """Pone el robot en el modo `name`; devuelve True si ha habido que cambiarlo"""
+        if await self.current() == name:
+            return False
+
+        print(f"🔄 Cambiando a modo '{name}'...")
+        start = time.monotonic()
+        deadline = start + self.timeout
+        self.invalidate()
+        state_count = self._state_count
+        await self.publisher.request(SELECT_MODE, {"name": name}, topic=RTC_TOPIC["MOTION_SWITCHER"],
+                                     timeout=self.timeout)
+
+        # Esperar a que el robot confirme el modo y vuelva a publicar su estado
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"El robot no confirmó el modo '{name}'")
+            try:
+                confirmed = await self.query(timeout=remaining) == name
+            except asyncio.TimeoutError:
+                confirmed = False
+            # Sin estado recibido nunca (suscripción no disponible) basta con 1001
+            if confirmed and (self._state_count > state_count or self._last_state is None):
+                break
+            await asyncio.sleep(self.poll_interval)
+        logging.info(f"✅ Modo '{name}' confirmado en {time.monotonic() - start:.2f} s")
+        return True
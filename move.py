@@ -1,113 +1,107 @@
 import asyncio
 import logging
-import json
 import sys
-import pygame
-from go2_webrtc_driver.webrtc_driver import Go2WebRTCConnection, WebRTCConnectionMethod
-from go2_webrtc_driver.constants import RTC_TOPIC, SPORT_CMD
+from go2_webrtc_driver.constants import SPORT_CMD
+from command_scheduler import VelocityScheduler
+from velocity_filter import VelocityFilter
+from sport_publisher import SportPublisher
+from joystick_input import JoystickInput, AXIS
+from robot_client import supervised_connection
+from motion_mode import MotionModeManager
 
 logging.basicConfig(level=logging.INFO)
 
 JOYSTICK_DEADZONE = 0.0
 MAX_SPEED = 1.0
+ROTATION_MULTIPLIER = 2.5
+COMMAND_RATE_HZ = 20  # frecuencia de envío de Move
+MOVE_WINDOW = 4  # máximo de Move sin respuesta
+FILTER_CUTOFF_HZ = (4.0, 4.0, 4.0)  # paso bajo de la velocidad (x, y, z)
+MAX_ACCEL = (2.0, 2.0, 6.0)  # m/s², m/s², rad/s²
+CHANGE_THRESHOLD = (0.02, 0.02, 0.05)  # cambio mínimo que justifica un Move nuevo
+MOVE_KEEPALIVE = 0.2  # s máximos sin reenviar la velocidad aunque no cambie
 
 def process_joystick_input(axis_value):
    if abs(axis_value) < JOYSTICK_DEADZONE:
        return 0.0
    return round(axis_value * MAX_SPEED, 2)
 
-async def send_movement(conn, x, y, z):
-   for i in range(2):
-       print(f"🕹 Moviendo: x={x}, y={y}, z={z} (envío {i+1}/2)")
-       await conn.datachannel.pub_sub.publish_request_new(
-           RTC_TOPIC["SPORT_MOD"],
-           {
-               "api_id": SPORT_CMD["Move"],
-               "parameter": {"x": x, "y": y, "z": z * 2.5}
-           }
-       )
-       await asyncio.sleep(0.1)
+# Botón -> (comando, mensaje)
+BUTTON_COMMANDS = {
+   0: (SPORT_CMD["Hello"], "👋 Botón A pulsado: saludo"),
+   2: (SPORT_CMD["Sit"], "🪑 Botón X pulsado: sentarse"),
+   3: (SPORT_CMD["StandUp"], "🦵 Botón Y pulsado: levantarse"),
+}
+
+async def send_command(publisher, cmd):
+   try:
+       await publisher.request(cmd)
+   except Exception as e:
+       logging.error(f"❌ Error enviando comando {cmd}: {e}")
+
+# El bucle de eventos solo guarda referencias débiles a las tareas: sin esta
+# referencia una tarea de comando podría recogerse antes de terminar
+background_tasks = set()
+
+def start_command(publisher, cmd):
+   """send_command en una tarea aparte, para no retrasar los siguientes eventos"""
+   task = asyncio.create_task(send_command(publisher, cmd))
+   background_tasks.add(task)
+   task.add_done_callback(background_tasks.discard)
 
 async def main():
-   pygame.init()
-   pygame.joystick.init()
-   if pygame.joystick.get_count() == 0:
+   try:
+       joystick = JoystickInput.open()
+   except LookupError:
        print("❌ No se detectó ningún mando.")
        return
+   print(f"🎮 Mando detectado: {joystick.name} ({joystick.backend})")
 
-   joystick = pygame.joystick.Joystick(0)
-   joystick.init()
-   print(f"🎮 Mando detectado: {joystick.get_name()}")
+   # A través de robot_daemon.py si está en marcha, si no conexión directa;
+   # si se cae se reconecta sola y vuelve a comprobar el modo
+   conn = supervised_connection("192.168.12.52")
 
-   conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, ip="192.168.12.52")
-   await conn.connect()
-   print("✅ Conectado al robot")
+   # Move se publica sin esperar respuesta; los comandos puntuales con request()
+   publisher = SportPublisher(conn, window=MOVE_WINDOW)
 
-   response = await conn.datachannel.pub_sub.publish_request_new(
-       RTC_TOPIC["MOTION_SWITCHER"], {"api_id": 1001}
-   )
-   mode = json.loads(response["data"]["data"])["name"]
-   if mode != "normal":
-       print("🔄 Cambiando a modo 'normal'...")
-       await conn.datachannel.pub_sub.publish_request_new(
-           RTC_TOPIC["MOTION_SWITCHER"],
-           {"api_id": 1002, "parameter": {"name": "normal"}}
-       )
-       await asyncio.sleep(4)
+   # Modo 'normal': sin consulta si el modo en caché sigue siendo válido y, si hay
+   # que cambiarlo, esperando la confirmación del robot en vez de un tiempo fijo
+   modes = MotionModeManager(publisher, required="normal")
+   conn.on_connect(modes.on_connect)
+   await conn.start()
+   print("✅ Conectado al robot")
 
    print("👋 Enviando saludo")
-   await conn.datachannel.pub_sub.publish_request_new(
-       RTC_TOPIC["SPORT_MOD"],
-       {"api_id": SPORT_CMD["Hello"]}
-   )
+   await publisher.request(SPORT_CMD["Hello"])
 
    print("🕹️ Controla el robot con el joystick (Ctrl+C para salir)")
 
-   prev_buttons = [False] * joystick.get_numbuttons()
+   # El movimiento lo envía el planificador a frecuencia fija
+   scheduler = VelocityScheduler(
+       publisher, rate_hz=COMMAND_RATE_HZ, keepalive=MOVE_KEEPALIVE,
+       velocity_filter=VelocityFilter(FILTER_CUTOFF_HZ, MAX_ACCEL, CHANGE_THRESHOLD))
+   scheduler.start()
 
+   axes = joystick.axes
    try:
-       while True:
-           pygame.event.pump()
-
-           # Movimiento
-           x = -process_joystick_input(joystick.get_axis(1))
-           y = -process_joystick_input(joystick.get_axis(0))
-           z = process_joystick_input(joystick.get_axis(3))
-
-           if x != 0 or y != 0 or z != 0:
-               await send_movement(conn, x, y, z)
-
-           # A: saludar (índice 0)
-           if joystick.get_button(0) and not prev_buttons[0]:
-               print("👋 Botón A pulsado: saludo")
-               await conn.datachannel.pub_sub.publish_request_new(
-                   RTC_TOPIC["SPORT_MOD"],
-                   {"api_id": SPORT_CMD["Hello"]}
-               )
-
-           # X: sentarse (índice 2)
-           if joystick.get_button(2) and not prev_buttons[2]:
-               print("🪑 Botón X pulsado: sentarse")
-               await conn.datachannel.pub_sub.publish_request_new(
-                   RTC_TOPIC["SPORT_MOD"],
-                   {"api_id": SPORT_CMD["Sit"]}
-               )
-
-           # Y: levantarse (índice 3)
-           if joystick.get_button(3) and not prev_buttons[3]:
-               print("🦵 Botón Y pulsado: levantarse")
-               await conn.datachannel.pub_sub.publish_request_new(
-                   RTC_TOPIC["SPORT_MOD"],
-                   {"api_id": SPORT_CMD["StandUp"]}
-               )
-
-           # Guardar estado de los botones
-           for i in range(len(prev_buttons)):
-               prev_buttons[i] = joystick.get_button(i)
-
-           await asyncio.sleep(0.1)
+       # Cada evento del mando se procesa al llegar, sin esperas fijas
+       async for event in joystick.events():
+           if event.kind == AXIS:
+               # Movimiento
+               x = -process_joystick_input(axes[1])
+               y = -process_joystick_input(axes[0])
+               z = process_joystick_input(axes[3])
+               scheduler.set(x, y, z * ROTATION_MULTIPLIER)
+           elif event.value and event.index in BUTTON_COMMANDS:
+               cmd, desc = BUTTON_COMMANDS[event.index]
+               print(desc)
+               start_command(publisher, cmd)
    except KeyboardInterrupt:
        print("\n⛔ Finalizado por el usuario")
+   finally:
+       await scheduler.stop()
+       logging.info(f"📊 Envíos: {publisher.stats()}, omitidos: {scheduler.suppressed}")
+       joystick.close()
 
 if __name__ == "__main__":
    try:
@@ -1,11 +1,14 @@
 import asyncio
 import logging
-import json
 import sys
-import pygame
-import time
-from go2_webrtc_driver.webrtc_driver import Go2WebRTCConnection, WebRTCConnectionMethod
-from go2_webrtc_driver.constants import RTC_TOPIC, SPORT_CMD
+from go2_webrtc_driver.constants import SPORT_CMD
+from command_scheduler import VelocityScheduler
+from velocity_filter import VelocityFilter
+from sport_publisher import SportPublisher
+from joystick_input import JoystickInput, AXIS
+from robot_client import supervised_connection
+from motion_mode import MotionModeManager
+from macro_engine import MacroRunner, load_macro
 
 # Configuración de logs
 logging.basicConfig(level=logging.INFO)
@@ -14,104 +17,130 @@ logging.basicConfig(level=logging.INFO)
 JOYSTICK_DEADZONE = 0.1
 MAX_SPEED = 1.0
 ROTATION_MULTIPLIER = 2.5
-COMMAND_COOLDOWN = 0.2  # en segundos
+COMMAND_RATE_HZ = 20  # frecuencia de envío de Move
+MOVE_WINDOW = 4  # máximo de Move sin respuesta
+FILTER_CUTOFF_HZ = (4.0, 4.0, 4.0)  # paso bajo de la velocidad (x, y, z)
+MAX_ACCEL = (2.0, 2.0, 6.0)  # m/s², m/s², rad/s²
+CHANGE_THRESHOLD = (0.02, 0.02, 0.05)  # cambio mínimo que justifica un Move nuevo
+MOVE_KEEPALIVE = 0.2  # s máximos sin reenviar la velocidad aunque no cambie
 
 # Utilidades
 def process_axis(value):
     """Normaliza el valor del joystick con zona muerta"""
     return 0.0 if abs(value) < JOYSTICK_DEADZONE else round(value * MAX_SPEED, 2)
 
-async def send_movement(conn, x, y, z):
-    """Envía el comando de movimiento al robot"""
-    logging.debug(f"Moviendo: x={x}, y={y}, z={z}")
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {
-            "api_id": SPORT_CMD["Move"],
-            "parameter": {"x": x, "y": y, "z": z * ROTATION_MULTIPLIER}
-        }
-    )
+# Botones: índice -> (nombre, comando, descripción)
+BUTTONS = {
+    0: ("A", SPORT_CMD["Hello"], "👋 Saludo"),
+    1: ("B", SPORT_CMD["StandUp"], "🦵 Levantar"),
+    2: ("X", SPORT_CMD["Sit"], "🪑 Sentarse"),
+    3: ("Y", SPORT_CMD["StandUp"], "🦵 Levantar"),
+    7: ("Start", SPORT_CMD["Damp"], "⛔ Parar")
+}
+
+# Macros (macros/*.json): índice de botón -> archivo. Mover el stick o pulsar
+# cualquier botón durante una macro la cancela
+MACRO_BUTTONS = {
+    4: "paseo.json",  # LB
+}
+
+async def send_command(publisher, cmd):
+    """Comando puntual; los errores se registran sin cortar el control"""
+    try:
+        await publisher.request(cmd)
+    except Exception as e:
+        logging.error(f"❌ Error enviando comando {cmd}: {e}")
+
+# El bucle de eventos solo guarda referencias débiles a las tareas: sin esta
+# referencia una tarea de comando podría recogerse antes de terminar
+background_tasks = set()
+
+def start_command(publisher, cmd):
+    """send_command en una tarea aparte, para no retrasar los siguientes eventos"""
+    task = asyncio.create_task(send_command(publisher, cmd))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+def make_scheduler(publisher):
+    """Planificador de Move con el filtro de velocidad de este script"""
+    return VelocityScheduler(
+        publisher, rate_hz=COMMAND_RATE_HZ, keepalive=MOVE_KEEPALIVE,
+        velocity_filter=VelocityFilter(FILTER_CUTOFF_HZ, MAX_ACCEL, CHANGE_THRESHOLD))
+
+async def control_loop(joystick, publisher, scheduler, macro_runner, macros):
+    """Traduce los eventos del mando en velocidades, comandos y macros (también lo usa benchmark.py)"""
+    axes = joystick.axes
+    # Los eventos llegan según se producen; el estado de los ejes se
+    # actualiza en el sitio dentro de JoystickInput
+    async for event in joystick.events():
+        if event.kind == AXIS:
+            x = -process_axis(axes[1])  # vertical izquierdo
+            y = -process_axis(axes[0])  # horizontal izquierdo
+            z = process_axis(axes[3])   # horizontal derecho
+
+            if macro_runner.running:
+                if x == y == z == 0.0:
+                    continue  # stick en reposo: la macro sigue
+                macro_runner.cancel()
+
+            # Solo se guarda la última velocidad; el planificador la envía
+            scheduler.set(x, y, z * ROTATION_MULTIPLIER)
+        elif event.value and macro_runner.running:
+            macro_runner.cancel()
+        elif event.value and event.index in macros:
+            macro_runner.start(macros[event.index])
+        elif event.value and event.index in BUTTONS:
+            name, cmd, desc = BUTTONS[event.index]
+            print(f"{desc} ({name})")
+            start_command(publisher, cmd)
 
 async def main():
-    # Inicializar pygame y joystick
-    pygame.init()
-    pygame.joystick.init()
-
-    if pygame.joystick.get_count() == 0:
+    # Inicializar joystick (evdev, o pygame si no está disponible)
+    try:
+        joystick = JoystickInput.open()
+    except LookupError:
         print("❌ No se detectó ningún mando.")
         return
-
-    joystick = pygame.joystick.Joystick(0)
-    joystick.init()
-    print(f"🎮 Mando detectado: {joystick.get_name()}")
+    print(f"🎮 Mando detectado: {joystick.name} ({joystick.backend})")
 
     # Conexión con el robot
-    conn = Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, ip="192.168.4.15")
-    await conn.connect()
+    # A través de robot_daemon.py si está en marcha, si no conexión directa;
+    # si se cae se reconecta sola y vuelve a comprobar el modo
+    conn = supervised_connection("192.168.4.15")
+
+    # Move se publica sin esperar respuesta; los comandos puntuales con request()
+    publisher = SportPublisher(conn, window=MOVE_WINDOW)
+
+    # Modo 'normal': sin consulta si el modo en caché sigue siendo válido y, si hay
+    # que cambiarlo, esperando la confirmación del robot en vez de un tiempo fijo
+    modes = MotionModeManager(publisher, required="normal")
+    conn.on_connect(modes.on_connect)
+    await conn.start()
     print("✅ Conectado al robot")
 
-    # Comprobar y establecer modo
-    response = await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["MOTION_SWITCHER"], {"api_id": 1001}
-    )
-    current_mode = json.loads(response["data"]["data"])["name"]
-    if current_mode != "normal":
-        print("🔄 Cambiando a modo 'normal'...")
-        await conn.datachannel.pub_sub.publish_request_new(
-            RTC_TOPIC["MOTION_SWITCHER"],
-            {"api_id": 1002, "parameter": {"name": "normal"}}
-        )
-        await asyncio.sleep(4)
-
     # Saludo inicial
     print("👋 Enviando saludo inicial...")
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["Hello"]}
-    )
+    await publisher.request(SPORT_CMD["Hello"])
 
     print("🕹️ Control activo. Usa el joystick para mover el robot. Ctrl+C para salir.")
-    prev_buttons = [False] * joystick.get_numbuttons()
-    last_command_time = time.time()
+
+    # El movimiento lo envía el planificador a frecuencia fija
+    scheduler = make_scheduler(publisher)
+    scheduler.start()
+
+    # Las macros se compilan al arrancar para detectar errores antes de usarlas
+    macros = {idx: load_macro(path) for idx, path in MACRO_BUTTONS.items()}
+    macro_runner = MacroRunner(scheduler, publisher)
 
     try:
-        while True:
-            pygame.event.pump()
-
-            # Joystick: ejes
-            x = -process_axis(joystick.get_axis(1))  # vertical izquierdo
-            y = -process_axis(joystick.get_axis(0))  # horizontal izquierdo
-            z = process_axis(joystick.get_axis(3))   # horizontal derecho
-
-            # Si ha pasado el cooldown, enviamos
-            now = time.time()
-            if (x, y, z) != (0, 0, 0) and (now - last_command_time) > COMMAND_COOLDOWN:
-                await send_movement(conn, x, y, z)
-                last_command_time = now
-
-            # Botones
-            buttons = {
-                0: ("A", SPORT_CMD["Hello"], "👋 Saludo"),
-                1: ("B", SPORT_CMD["StandUp"], "🦵 Levantar"),
-                2: ("X", SPORT_CMD["Sit"], "🪑 Sentarse"),
-                3: ("Y", SPORT_CMD["StandUp"], "🦵 Levantar"),
-                7: ("Start", SPORT_CMD["Damp"], "⛔ Parar")
-            }
-
-            for idx, (name, cmd, desc) in buttons.items():
-                if joystick.get_button(idx) and not prev_buttons[idx]:
-                    print(f"{desc} ({name})")
-                    await conn.datachannel.pub_sub.publish_request_new(
-                        RTC_TOPIC["SPORT_MOD"], {"api_id": cmd}
-                    )
-
-            # Actualizar estado previo de botones
-            prev_buttons = [joystick.get_button(i) for i in range(joystick.get_numbuttons())]
-            await asyncio.sleep(0.05)
+        await control_loop(joystick, publisher, scheduler, macro_runner, macros)
     except KeyboardInterrupt:
         print("\n⛔ Finalizado por el usuario")
     finally:
-        pygame.quit()
+        macro_runner.cancel()
+        await scheduler.stop()
+        logging.info(f"📊 Envíos: {publisher.stats()}, omitidos: {scheduler.suppressed}")
+        joystick.close()
 
 if __name__ == "__main__":
     try:
@@ -1,12 +1,13 @@
 import asyncio
 import logging
-from evdev import InputDevice, categorize, ecodes
+import sys
 from unitree_sdk2_python.high_level import SportClient
 from unitree_sdk2_python.common import SportMode
+from joystick_input import JoystickInput, AXIS
 
 logging.basicConfig(level=logging.INFO)
 
-JOYSTICK_DEVICE = '/dev/input/event0'  # actualiza según tu sistema
+JOYSTICK_DEVICE = None  # p. ej. '/dev/input/event0'; None = primer mando
 JOY_DEADZONE = 0.1
 MAX_SPEED = 1.0
 ROT_MULT = 2.5
@@ -15,8 +16,8 @@ def norm(val):
     return 0.0 if abs(val) < JOY_DEADZONE else round(val * MAX_SPEED, 2)
 
 async def main():
-    dev = InputDevice(JOYSTICK_DEVICE)
-    logging.info(f"Mando detectado: {dev.name}")
+    joystick = JoystickInput.open(JOYSTICK_DEVICE)
+    logging.info(f"Mando detectado: {joystick.name}")
 
     sport = SportClient()
     await sport.connect()
@@ -25,33 +26,27 @@ async def main():
     await sport.set_sport_mode(SportMode.Normal)
     logging.info("🔄 Modo 'normal' activado")
 
-    prev = {"axes": (0,0,0), "buttons": {}}
-    async for ev in dev.async_read_loop():
-        if ev.type == ecodes.EV_ABS:
-            ab = categorize(ev)
-            # asigna índices correctos según tu mando
-            ax = {1: -norm(ab.event.value/32767),
-                  0: -norm(ab.event.value/32767),
-                  3: norm(ab.event.value/32767)}
-            x = ax.get(1, prev["axes"][0])
-            y = ax.get(0, prev["axes"][1])
-            z = ax.get(3, prev["axes"][2])
-            if (x,y,z) != prev["axes"]:
+    # Índices como en pygame: A=0, B=1, X=2, botón central=8
+    buttons = {
+        0: ("Hello", sport.hello),
+        1: ("StandUp", sport.stand_up),
+        2: ("Sit", sport.sit_down),
+        8: ("Damp", sport.damp)
+    }
+
+    axes = joystick.axes
+    prev = (0.0, 0.0, 0.0)
+    async for event in joystick.events():
+        if event.kind == AXIS:
+            x, y, z = -norm(axes[1]), -norm(axes[0]), norm(axes[3])
+            if (x, y, z) != prev:
                 await sport.velocity_move(x, y, z * ROT_MULT)
-                prev["axes"] = (x,y,z)
-
-        elif ev.type == ecodes.EV_KEY and ev.value == 1:
-            btn = ev.code
-            mapping = {
-                ecodes.BTN_SOUTH: ("Hello", sport.hello),
-                ecodes.BTN_EAST: ("StandUp", sport.stand_up),
-                ecodes.BTN_NORTH: ("Sit", sport.sit_down),
-                ecodes.BTN_MODE: ("Damp", sport.damp)
-            }
-            if btn in mapping:
-                name, action = mapping[btn]
-                logging.info(f"🔘 Botón {name}")
-                await action()
+                prev = (x, y, z)
+
+        elif event.value and event.index in buttons:
+            name, action = buttons[event.index]
+            logging.info(f"🔘 Botón {name}")
+            await action()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,147 @@
+"""Timing instrumentation for the camera frame pipeline.
+
+Each stage (WebRTC receive, BGR conversion, copy into the ring buffer, JPEG
+encode, per-client send) records its duration into a ``LatencyHistogram``.
+``receive`` is the receiver's own handling of a frame once it has arrived;
+the time spent waiting for the next frame is recorded separately as the
+frame interval, so an idle wait never shows up as a costly stage.
+Recording is a few list/array writes with no locks: metrics may be off by a
+sample when threads race, which is fine for monitoring and keeps the hot path
+cheap. ``PipelineMetrics`` renders everything as JSON for ``/status`` and in
+Prometheus text format for ``/metrics``.
+"""
+import itertools
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from latency import LatencyHistogram
+
+STAGES = ('receive', 'convert', 'copy', 'encode', 'send')
+
+
+class RateMeter:
+    """Events per second over the last ``window`` events."""
+
+    def __init__(self, window=64):
+        self._times = np.zeros(window)
+        self._next = 0
+
+    def tick(self, now=None):
+        self._times[self._next % len(self._times)] = now or time.monotonic()
+        self._next += 1
+
+    def rate(self):
+        n = min(self._next, len(self._times))
+        if n < 2:
+            return 0.0
+        newest = self._times[(self._next - 1) % len(self._times)]
+        oldest = self._times[(self._next - n) % len(self._times)]
+        if time.monotonic() - newest > 2.0:
+            return 0.0  # stream stalled
+        return (n - 1) / (newest - oldest) if newest > oldest else 0.0
+
+
+class PipelineMetrics:
+    """Per-stage latency histograms, frame rates and per-client stats."""
+
+    def __init__(self):
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+        self.received = RateMeter()
+        self.frame_interval = LatencyHistogram()
+        self.encoded = RateMeter()
+        self._last_frame = None
+        self._clients = {}
+        self._client_ids = itertools.count(1)
+
+    def frame_received(self):
+        """Count an arriving frame and record the time since the previous one.
+
+        Returns the arrival time (``time.perf_counter()``), to time the
+        ``receive`` stage from.
+        """
+        now = time.perf_counter()
+        if self._last_frame is not None:
+            self.frame_interval.observe(now - self._last_frame)
+        self._last_frame = now
+        self.received.tick()
+        return now
+
+    def observe(self, stage, seconds):
+        self.stages[stage].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[stage].observe(time.perf_counter() - start)
+
+    @contextmanager
+    def client(self, client):
+        """Track a viewer's ``ClientStream`` while it is connected."""
+        client_id = next(self._client_ids)
+        self._clients[client_id] = client
+        try:
+            yield client_id
+        finally:
+            self._clients.pop(client_id, None)
+
+    def client_sent(self, client, seconds, latest_seq):
+        """Record a frame sent to ``client``; ``latest_seq`` is the newest frame."""
+        self.stages['send'].observe(seconds)
+        client.frames_sent += 1
+        client.send_ms = round(seconds * 1000, 2)
+        client.lag_frames = max(0, latest_seq - client.last_seq)
+
+    def snapshot(self):
+        return {
+            'receive_fps': round(self.received.rate(), 1),
+            'encode_fps': round(self.encoded.rate(), 1),
+            'frame_interval': self.frame_interval.percentiles(),
+            'stages': {stage: hist.percentiles() for stage, hist in self.stages.items()},
+            'clients': {
+                client_id: client.as_dict()
+                for client_id, client in list(self._clients.items())
+            },
+        }
+
+    def prometheus(self, counters=None):
+        """Render the metrics in Prometheus text exposition format.
+
+        ``counters`` maps extra counter names (e.g. dropped frames) to values.
+        """
+        lines = ['# TYPE go2_stage_seconds histogram']
+        for stage, hist in self.stages.items():
+            cumulative = 0
+            for bound, count in zip(hist.BUCKETS + (float('inf'),), hist.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'go2_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'go2_stage_seconds_sum{{stage="{stage}"}} {hist.total}')
+            lines.append(f'go2_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+
+        lines.append('# TYPE go2_frame_interval_seconds histogram')
+        cumulative = 0
+        hist = self.frame_interval
+        for bound, count in zip(hist.BUCKETS + (float('inf'),), hist.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'go2_frame_interval_seconds_bucket{{le="{le}"}} {cumulative}')
+        lines.append(f'go2_frame_interval_seconds_sum {hist.total}')
+        lines.append(f'go2_frame_interval_seconds_count {hist.count}')
+
+        lines.append('# TYPE go2_fps gauge')
+        lines.append(f'go2_fps{{stage="receive"}} {self.received.rate():.2f}')
+        lines.append(f'go2_fps{{stage="encode"}} {self.encoded.rate():.2f}')
+
+        lines.append('# TYPE go2_client_lag_frames gauge')
+        for client_id, client in list(self._clients.items()):
+            lines.append(f'go2_client_lag_frames{{client="{client_id}"}} {client.lag_frames}')
+
+        for name, value in (counters or {}).items():
+            lines.append(f'# TYPE go2_{name}_total counter')
+            lines.append(f'go2_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
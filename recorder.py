@@ -0,0 +1,254 @@
+"""Segmented recording of the Go2 camera stream.
+
+Frames from the WebRTC track are written by a background thread into
+fixed-duration H.264 segments (Matroska, so a segment cut short by a crash is
+still readable). When a segment is closed its time range is appended to
+``index.jsonl`` in the recordings directory, which lets ``frame_at()`` find the
+right file by timestamp and seek straight to the nearest keyframe instead of
+scanning whole files. The segment being written is not in the index yet (the
+encoder still holds frames and the file has no cues), so its frames can only
+be looked up once it closes, at most ``segment_seconds`` later.
+
+aiortc only hands out decoded frames, so the original H.264 can't be remuxed;
+the recorder encodes the ``av.VideoFrame`` objects it receives directly, which
+skips the BGR conversion done for the MJPEG stream.
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from fractions import Fraction
+
+import av
+
+from frame_hub import encode_jpeg
+
+# Segment timestamps are stored in milliseconds since the segment start
+TIME_BASE = Fraction(1, 1000)
+
+
+class SegmentRecorder:
+    """Writes frames into rolling segment files and indexes them by time.
+
+    Only the newest ``max_segments`` segments are kept on disk.
+    """
+
+    def __init__(self, directory, segment_seconds=60, max_segments=120, fps=30, max_queue=60,
+                 codec='libx264'):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.max_segments = max_segments
+        self.fps = fps
+        self.codec = codec
+        self.dropped_frames = 0
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, 'index.jsonl')
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._segments = self._load_index()
+        self._recording_since = None  # start of the open segment
+        self._thread = None
+
+    def _load_index(self):
+        segments = []
+        if os.path.exists(self._index_path):
+            with open(self._index_path) as f:
+                for line in f:
+                    if line.strip():
+                        segments.append(json.loads(line))
+        return sorted(segments, key=lambda segment: segment['start'])
+
+    def segments(self):
+        """Closed segments as dicts with file, start, end and frames."""
+        with self._lock:
+            return list(self._segments)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Flush and close the current segment."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def push(self, frame, timestamp=None):
+        """Queue an ``av.VideoFrame`` for recording without blocking the caller."""
+        try:
+            self._queue.put_nowait((timestamp or time.time(), frame))
+        except queue.Full:
+            self.dropped_frames += 1
+
+    def _run(self):
+        segment = None
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            timestamp, frame = item
+            try:
+                if segment is None or timestamp - segment['start'] >= self.segment_seconds:
+                    if segment is not None:
+                        self._close_segment(segment)
+                    segment = self._open_segment(timestamp, frame)
+                self._encode(segment, timestamp, frame)
+            except Exception as e:
+                logging.error(f"Error recording frame: {e}")
+                # Keep what was recorded so far; the next frame starts a new segment
+                if segment is not None:
+                    try:
+                        self._close_segment(segment)
+                    except Exception as e:
+                        logging.error(f"Error closing segment {segment['file']}: {e}")
+                segment = None
+        if segment is not None:
+            self._close_segment(segment)
+
+    def _open_segment(self, timestamp, frame):
+        stem = datetime.fromtimestamp(timestamp).strftime('%Y%m%d-%H%M%S')
+        name = stem + '.mkv'
+        suffix = 1
+        # A segment reopened after an error can start within the same second
+        while os.path.exists(os.path.join(self.directory, name)):
+            suffix += 1
+            name = f'{stem}-{suffix}.mkv'
+        container = av.open(os.path.join(self.directory, name), 'w')
+        stream = container.add_stream(self.codec, rate=self.fps)
+        stream.width = frame.width
+        stream.height = frame.height
+        stream.pix_fmt = 'yuv420p'
+        stream.time_base = TIME_BASE
+        # A keyframe every second bounds how much a seek has to decode
+        stream.codec_context.gop_size = self.fps
+        with self._lock:
+            self._recording_since = timestamp
+        return {'file': name, 'start': timestamp, 'end': timestamp, 'frames': 0,
+                'container': container, 'stream': stream, 'last_pts': -1}
+
+    def _encode(self, segment, timestamp, frame):
+        pts = int((timestamp - segment['start']) * 1000)
+        if pts <= segment['last_pts']:
+            return
+        if frame.format.name != 'yuv420p':
+            frame = frame.reformat(format='yuv420p')
+        frame.pts = pts
+        frame.time_base = TIME_BASE
+        for packet in segment['stream'].encode(frame):
+            segment['container'].mux(packet)
+        segment['last_pts'] = pts
+        segment['end'] = timestamp
+        segment['frames'] += 1
+
+    def _close_segment(self, segment):
+        with self._lock:
+            self._recording_since = None
+        # Best effort: after an encoding error flushing or closing may fail too
+        try:
+            for packet in segment['stream'].encode(None):
+                segment['container'].mux(packet)
+        except Exception as e:
+            logging.error(f"Error flushing segment {segment['file']}: {e}")
+        try:
+            segment['container'].close()
+        except Exception as e:
+            logging.error(f"Error closing segment {segment['file']}: {e}")
+        if segment['frames'] == 0:
+            try:
+                os.remove(os.path.join(self.directory, segment['file']))
+            except FileNotFoundError:
+                pass
+            return
+        entry = {key: segment[key] for key in ('file', 'start', 'end', 'frames')}
+        with self._lock:
+            self._segments.append(entry)
+            expired = self._segments[:-self.max_segments]
+            del self._segments[:-self.max_segments]
+        if not expired:
+            with open(self._index_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+            return
+
+        for old in expired:
+            try:
+                os.remove(os.path.join(self.directory, old['file']))
+            except FileNotFoundError:
+                pass
+        # Rewrite the index without the expired segments
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for kept in self.segments():
+                f.write(json.dumps(kept) + '\n')
+        os.replace(tmp_path, self._index_path)
+
+    def frame_at(self, timestamp):
+        """Return the recorded frame nearest ``timestamp`` as a BGR ndarray.
+
+        Returns ``(frame_timestamp, ndarray)`` or None if no closed segment
+        covers the time, which includes times in the segment still being
+        recorded (see ``recording_since()``).
+        """
+        with self._lock:
+            starts = [segment['start'] for segment in self._segments]
+            i = bisect.bisect_right(starts, timestamp) - 1
+            if i < 0 or timestamp > self._segments[i]['end']:
+                return None
+            segment = self._segments[i]
+
+        target = int((timestamp - segment['start']) * 1000)
+        with av.open(os.path.join(self.directory, segment['file'])) as container:
+            stream = container.streams.video[0]
+            # Jump to the keyframe before the target, then decode forward
+            container.seek(int(Fraction(target, 1000) / stream.time_base), stream=stream,
+                           backward=True)
+            best = None
+            for frame in container.decode(stream):
+                pts = int(frame.pts * frame.time_base * 1000)
+                if best is None or abs(pts - target) < abs(best[0] - target):
+                    best = (pts, frame)
+                if pts >= target:
+                    break
+        if best is None:
+            return None
+        pts, frame = best
+        return segment['start'] + pts / 1000, frame.to_ndarray(format='bgr24')
+
+    def recording_since(self):
+        """Start of the segment being written, or None between segments."""
+        with self._lock:
+            return self._recording_since
+
+    # Routes for AsyncVideoServer.add_route(); blocking work runs in an executor
+
+    async def list_route(self, query, body):
+        return '200 OK', 'application/json', json.dumps({'segments': self.segments()}).encode()
+
+    async def frame_route(self, query, body):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.frame_response, query.get('t'))
+
+    def frame_response(self, t):
+        """``(status, content_type, body)`` for the JPEG of the frame nearest ``t``."""
+        try:
+            timestamp = float(t)
+        except (TypeError, ValueError):
+            return '400 Bad Request', 'text/plain', b'Missing or invalid t (unix timestamp)'
+        result = self.frame_at(timestamp)
+        if result is None:
+            since = self.recording_since()
+            if since is not None and timestamp >= since:
+                message = (f'Still recording that time; segments can be read once they '
+                           f'close, every {self.segment_seconds} s')
+                return '404 Not Found', 'text/plain', message.encode()
+            return '404 Not Found', 'text/plain', b'No recording at that time'
+        jpeg = encode_jpeg(result[1], 85)
+        if jpeg is None:
+            return '500 Internal Server Error', 'text/plain', b'Could not encode the frame'
+        return '200 OK', 'image/jpeg', jpeg
@@ -0,0 +1,156 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+
+from go2_webrtc_driver.webrtc_driver import Go2WebRTCConnection, WebRTCConnectionMethod
+from connection_supervisor import ConnectionSupervisor
+from robot_daemon import DEFAULT_SOCKET
+
+class _FutureResolver:
+    def __init__(self):
+        self.pending_callbacks = {}  # id -> lista de futuros (como en el driver)
+
+class _PubSub:
+    """Misma interfaz que conn.datachannel.pub_sub del driver, a través del demonio"""
+
+    def __init__(self, client):
+        self._client = client
+        self._ids = itertools.count(1)
+        self._callbacks = {}  # topic -> callback
+        self.future_resolver = _FutureResolver()
+
+    async def publish_request_new(self, topic, options=None):
+        options = dict(options or {})
+        req_id = options.get("id") or next(self._ids)
+        options["id"] = req_id
+        return await self._client.call({"op": "request", "id": req_id, "topic": topic,
+                                        "options": options}, req_id)
+
+    def publish_without_callback(self, topic, data=None):
+        self._client.send({"op": "publish", "topic": topic, "data": data})
+
+    def subscribe(self, topic, callback=None):
+        if callback is not None:
+            self._callbacks[topic] = callback
+        self._client.send({"op": "subscribe", "topic": topic})
+
+    def unsubscribe(self, topic):
+        self._callbacks.pop(topic, None)
+        self._client.send({"op": "unsubscribe", "topic": topic})
+
+class _DataChannel:
+    def __init__(self, client):
+        self.pub_sub = _PubSub(client)
+
+class RobotClient:
+    """Conexión con el robot a través de robot_daemon.py.
+
+    Expone `datachannel.pub_sub` con la misma interfaz que Go2WebRTCConnection
+    (publish_request_new, subscribe, future_resolver.pending_callbacks...), así
+    que SportPublisher y el resto del código funcionan igual con las dos.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.socket_path = socket_path
+        self.datachannel = _DataChannel(self)
+        self.isConnected = False
+        self._reader = None
+        self._writer = None
+        self._task = None
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        self._task = asyncio.create_task(self._read_loop())
+        self.isConnected = True
+
+    async def disconnect(self):
+        self.isConnected = False
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    async def video_bus(self):
+        """Activa el vídeo en el demonio y devuelve el nombre del bus de fotogramas"""
+        req_id = next(self.datachannel.pub_sub._ids)
+        response = await self.call({"op": "video", "id": req_id}, req_id)
+        return response["bus"]
+
+    def send(self, message):
+        self._writer.write(json.dumps(message).encode() + b"\n")
+
+    async def call(self, message, req_id):
+        pending = self.datachannel.pub_sub.future_resolver.pending_callbacks
+        future = asyncio.get_running_loop().create_future()
+        pending.setdefault(req_id, []).append(future)
+        self.send(message)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # Abandonada por el llamante: el demonio deja de esperarla
+            pending.pop(req_id, None)
+            if not self._writer.is_closing():
+                self.send({"op": "forget", "id": req_id})
+            raise
+
+    async def _read_loop(self):
+        pub_sub = self.datachannel.pub_sub
+        try:
+            while line := await self._reader.readline():
+                msg = json.loads(line)
+                if "topic" in msg:
+                    callback = pub_sub._callbacks.get(msg["topic"])
+                    if callback is not None:
+                        callback(msg["message"])
+                    continue
+                for future in pub_sub.future_resolver.pending_callbacks.pop(msg.get("id"), ()):
+                    if future.done():
+                        continue  # respuesta abandonada
+                    if "error" in msg:
+                        future.set_exception(RuntimeError(msg["error"]))
+                    else:
+                        future.set_result(msg["response"])
+        finally:
+            if self.isConnected:
+                logging.error("❌ Conexión con el demonio cerrada")
+            self.isConnected = False
+            for futures in pub_sub.future_resolver.pending_callbacks.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(ConnectionError("demonio desconectado"))
+
+def daemon_running(socket_path=DEFAULT_SOCKET):
+    """Comprueba (sin asyncio) si el demonio acepta conexiones"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+def make_connection(ip, socket_path=DEFAULT_SOCKET):
+    """RobotClient si el demonio está en marcha; si no, conexión WebRTC directa (sin conectar).
+
+    Con GO2_FAKE=1 en el entorno devuelve un FakeGo2Connection (robot simulado).
+    """
+    if os.environ.get("GO2_FAKE"):
+        from fake_go2 import FakeGo2Connection
+        logging.info("🧪 Usando el Go2 simulado (GO2_FAKE)")
+        return FakeGo2Connection()
+    if daemon_running(socket_path):
+        logging.info(f"🔌 Usando el demonio de conexión ({socket_path})")
+        return RobotClient(socket_path)
+    return Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, ip=ip)
+
+def supervised_connection(ip, socket_path=DEFAULT_SOCKET):
+    """Conexión supervisada (aún sin conectar): se reconecta sola si se cae.
+
+    Registrar con on_connect() lo que haya que rehacer tras cada conexión
+    (modo de movimiento, suscripciones...) y luego llamar a start().
+    """
+    return ConnectionSupervisor(make_connection(ip, socket_path))
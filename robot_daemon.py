@@ -0,0 +1,275 @@
+"""Demonio de conexión con el Go2.
+
+Mantiene una única Go2WebRTCConnection abierta y la comparte con los scripts
+locales (camera.py, move.py, move2.py...) por un socket Unix, de forma que
+cambiar de script en el lanzador no repite el handshake WebRTC.
+
+Protocolo: una línea JSON por mensaje.
+
+    cliente -> demonio
+        {"op": "request", "id": 7, "topic": "rt/api/sport/request", "options": {...}}
+        {"op": "publish", "topic": ..., "data": ...}
+        {"op": "subscribe", "topic": ...}
+        {"op": "unsubscribe", "topic": ...}
+        {"op": "forget", "id": 7}          (ya no interesa la respuesta)
+        {"op": "video", "id": 8}           (activa el vídeo, responde con el bus)
+
+    demonio -> cliente
+        {"id": 7, "response": {...}}  o  {"id": 7, "error": "..."}
+        {"topic": ..., "message": {...}}   (mensajes de los topics suscritos)
+
+Los identificadores de cada cliente se traducen a identificadores propios del
+demonio, así que varios clientes pueden usar los mismos. El vídeo no pasa por
+el socket: los fotogramas BGR se publican en el bus de memoria compartida de
+frame_bus.py y los clientes los leen con FrameBusReader.
+
+La conexión con el robot está supervisada (connection_supervisor.py): si se
+cae, se reconecta y se rehacen las suscripciones y el callback de vídeo sin
+que los clientes tengan que hacer nada.
+
+El demonio sigue siempre el estado del robot (LF_SPORT_MOD_STATE) para
+mantener en caché el modo de MOTION_SWITCHER (motion_mode.py): las consultas
+1001 de los clientes se contestan sin ir al robot mientras la caché es válida.
+
+Uso: python robot_daemon.py --ip 192.168.12.52
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+
+from go2_webrtc_driver.webrtc_driver import Go2WebRTCConnection, WebRTCConnectionMethod
+from go2_webrtc_driver.constants import RTC_TOPIC
+from frame_bus import FrameBusWriter, DEFAULT_BUS_NAME
+from connection_supervisor import ConnectionSupervisor
+from motion_mode import MotionModeManager, STATE_TOPIC, CHECK_MODE, SELECT_MODE, mode_response
+
+DEFAULT_SOCKET = "/tmp/go2_robot.sock"
+DEFAULT_IP = "192.168.12.52"
+REQUEST_TIMEOUT = 10.0  # las peticiones sin respuesta se abandonan
+MAX_CLIENT_BUFFER = 1 << 20  # bytes pendientes antes de descartar mensajes de un cliente lento
+VIDEO_MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+
+class _Client:
+    def __init__(self, writer):
+        self.writer = writer
+        self.topics = set()
+        self.requests = {}  # id del demonio -> id del cliente
+
+    def send(self, message):
+        """Encola un mensaje; si el cliente no lee, se descarta"""
+        if self.writer.is_closing():
+            return
+        if self.writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            return
+        self.writer.write(json.dumps(message, default=str).encode() + b"\n")
+
+
+class RobotDaemon:
+    def __init__(self, conn, socket_path=DEFAULT_SOCKET, bus_name=DEFAULT_BUS_NAME):
+        self.conn = ConnectionSupervisor(conn)
+        self.conn.on_connect(self._resync)
+        self.socket_path = socket_path
+        self.bus_name = bus_name
+        self.bus = None
+        self.clients = set()
+        self._subscribers = {}  # topic -> clientes
+        # Solo observa: la caché se llena con las respuestas a 1001 de los clientes
+        self.modes = MotionModeManager(publisher=None)
+        self._ids = itertools.count(1)
+        self._tasks = {}  # id del demonio -> tarea de publish_request_new
+        self._server = None
+
+    @property
+    def pub_sub(self):
+        return self.conn.datachannel.pub_sub
+
+    async def start(self):
+        await self.conn.start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # de una ejecución anterior
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        logging.info(f"🔌 Escuchando en {self.socket_path}")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            os.unlink(self.socket_path)
+        if self.bus is not None:
+            self.bus.close()
+        await self.conn.close()
+
+    async def _resync(self, conn):
+        """Tras (re)conectar: rehace las suscripciones y el vídeo en el robot"""
+        for topic in set(self._subscribers) | {STATE_TOPIC}:
+            self.pub_sub.subscribe(topic, self._topic_callback(topic))
+        if self.bus is not None:
+            conn.video.switchVideoChannel(True)
+            conn.video.add_track_callback(self._recv_video)
+
+    async def _handle(self, reader, writer):
+        client = _Client(writer)
+        self.clients.add(client)
+        logging.info(f"Cliente conectado ({len(self.clients)} en total)")
+        try:
+            while line := await reader.readline():
+                try:
+                    self._dispatch(client, json.loads(line))
+                except Exception as e:
+                    logging.error(f"❌ Mensaje no válido: {e}")
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            # El script se paró con mensajes en vuelo: no es un error del demonio
+            logging.info(f"Conexión con el cliente cortada: {e!r}")
+        finally:
+            self._drop(client)
+            writer.close()
+            logging.info(f"Cliente desconectado ({len(self.clients)} en total)")
+
+    def _dispatch(self, client, msg):
+        op = msg["op"]
+        if op == "request":
+            self._request(client, msg["id"], msg["topic"], msg.get("options") or {})
+        elif op == "publish":
+            self.pub_sub.publish_without_callback(msg["topic"], msg.get("data"))
+        elif op == "subscribe":
+            self._subscribe(client, msg["topic"])
+        elif op == "unsubscribe":
+            self._unsubscribe(client, msg["topic"])
+        elif op == "forget":
+            for daemon_id, client_id in list(client.requests.items()):
+                if client_id == msg["id"]:
+                    self._forget(client, daemon_id)
+        elif op == "video":
+            self._start_video()
+            client.send({"id": msg["id"], "response": {"bus": self.bus_name}})
+        else:
+            client.send({"id": msg.get("id"), "error": f"operación desconocida: {op}"})
+
+    def _request(self, client, client_id, topic, options):
+        mode_query = topic == RTC_TOPIC["MOTION_SWITCHER"] and options.get("api_id") == CHECK_MODE
+        if mode_query and self.modes.cached() is not None:
+            client.send({"id": client_id, "response": mode_response(self.modes.cached())})
+            return
+        if topic == RTC_TOPIC["MOTION_SWITCHER"] and options.get("api_id") == SELECT_MODE:
+            self.modes.invalidate()
+
+        daemon_id = next(self._ids)
+        client.requests[daemon_id] = client_id
+        options = dict(options, id=daemon_id)
+        task = self._tasks[daemon_id] = asyncio.ensure_future(self.pub_sub.publish_request_new(topic, options))
+        task.add_done_callback(lambda t: self._tasks.pop(daemon_id, None))
+        task.add_done_callback(lambda t: self._on_response(client, daemon_id, t, mode_query))
+        asyncio.get_running_loop().call_later(REQUEST_TIMEOUT, self._expire, client, daemon_id)
+
+    def _on_response(self, client, daemon_id, task, mode_query=False):
+        client_id = client.requests.pop(daemon_id, None)
+        if client_id is None or task.cancelled():
+            return
+        if task.exception() is not None:
+            client.send({"id": client_id, "error": str(task.exception())})
+            return
+        if mode_query:
+            try:
+                self.modes.update(task.result())
+            except (KeyError, TypeError, ValueError) as e:
+                logging.error(f"❌ Respuesta de modo no válida: {e}")
+        client.send({"id": client_id, "response": task.result()})
+
+    def _expire(self, client, daemon_id):
+        client_id = client.requests.get(daemon_id)
+        if client_id is not None:
+            self._forget(client, daemon_id)
+            client.send({"id": client_id, "error": "sin respuesta del robot"})
+
+    def _forget(self, client, daemon_id):
+        client.requests.pop(daemon_id, None)
+        # El driver guarda una lista de futuros por id
+        for future in self.pub_sub.future_resolver.pending_callbacks.pop(daemon_id, ()):
+            if not future.done():
+                future.cancel()
+        task = self._tasks.pop(daemon_id, None)
+        if task is not None:
+            task.cancel()
+
+    def _subscribe(self, client, topic):
+        subscribers = self._subscribers.get(topic)
+        if subscribers is None:
+            # Una sola suscripción en el robot por topic, repartida a los clientes
+            subscribers = self._subscribers[topic] = set()
+            if topic != STATE_TOPIC:  # ya suscrito desde la conexión
+                self.pub_sub.subscribe(topic, self._topic_callback(topic))
+        subscribers.add(client)
+        client.topics.add(topic)
+
+    def _unsubscribe(self, client, topic):
+        subscribers = self._subscribers.get(topic, set())
+        subscribers.discard(client)
+        client.topics.discard(topic)
+        if not subscribers and topic in self._subscribers:
+            del self._subscribers[topic]
+            if topic != STATE_TOPIC:  # el demonio lo sigue para la caché de modo
+                self.pub_sub.unsubscribe(topic)
+
+    def _topic_callback(self, topic):
+        return lambda message: self._fanout(topic, message)
+
+    def _fanout(self, topic, message):
+        if topic == STATE_TOPIC:
+            self.modes.on_state(message)
+        for client in self._subscribers.get(topic, ()):
+            client.send({"topic": topic, "message": message})
+
+    def _drop(self, client):
+        self.clients.discard(client)
+        for topic in list(client.topics):
+            self._unsubscribe(client, topic)
+        for daemon_id in list(client.requests):
+            self._forget(client, daemon_id)
+
+    # Vídeo
+
+    def _start_video(self):
+        if self.bus is not None:
+            return
+        self.bus = FrameBusWriter(self.bus_name, slot_size=VIDEO_MAX_FRAME_BYTES)
+        self.conn.video.switchVideoChannel(True)
+        self.conn.video.add_track_callback(self._recv_video)
+        logging.info(f"🎥 Vídeo activado en el bus '{self.bus_name}'")
+
+    async def _recv_video(self, track):
+        while True:
+            try:
+                frame = await track.recv()
+            except Exception as e:
+                logging.error(f"❌ Error recibiendo vídeo: {e}")
+                self.conn.report_failure(f"vídeo: {e}")
+                break
+            # Sin lectores en el bus no se convierte a BGR
+            if self.bus.has_readers():
+                self.bus.publish(frame.to_ndarray(format="bgr24"), time.time())
+
+
+async def serve(ip, socket_path):
+    daemon = RobotDaemon(Go2WebRTCConnection(WebRTCConnectionMethod.LocalSTA, ip=ip), socket_path)
+    await daemon.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await daemon.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Conexión persistente con el Go2")
+    parser.add_argument("--ip", default=os.environ.get("GO2_IP", DEFAULT_IP))
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.ip, args.socket))
+    except KeyboardInterrupt:
+        print("\n⛔ Demonio detenido")
@@ -1,36 +1,179 @@
-from flask import Flask, render_template, redirect, url_for
+from flask import Flask, Response, abort, render_template, redirect, request, url_for
 import os
+import time
 from script_manager import (
-    start_script, stop_script, is_running, get_pid, get_log,
-    get_current_script
+    start_script, stop_script, is_running, read_log, log_size, latest_run, log_runs, tail_lines,
+    log_range, log_exists, running_scripts, conflicting_script, script_info, script_samples, start_supervisor,
+    start_daemon, start_fork_server, MAX_LOG_CHUNK, DAEMON_NAME, FORK_SERVER_NAME
 )
 
 SCRIPT_DIR = os.path.join(os.path.dirname(__file__), 'scripts')
+# Conexión persistente con el robot compartida por todos los scripts
+DAEMON_SCRIPT = os.path.join(os.path.dirname(__file__), 'daemon.sh')
+# Intérprete precargado para lanzar los scripts de Python al instante (LAUNCHER_FORK_SERVER=1)
+FORK_SERVER_SCRIPT = os.path.join(os.path.dirname(__file__), 'forkserver.sh')
 app = Flask(__name__)
 
+# Log en vivo (SSE): cada cuánto se mira si el log ha crecido y cada cuánto se
+# manda un comentario para que proxies y móviles no corten la conexión
+LOG_POLL_INTERVAL = 0.5
+SSE_KEEPALIVE = 15
+
+def sparkline(samples, field, width=120, height=24):
+    """Puntos de un <polyline> SVG con la serie `field` de las muestras (1 = CPU, 2 = RSS)"""
+    values = [sample[field] for sample in samples]
+    if len(values) < 2:
+        return ""
+    top = max(max(values), 1e-9)
+    step = width / (len(values) - 1)
+    return " ".join(f"{i * step:.1f},{height - value / top * height:.1f}" for i, value in enumerate(values))
+
+def list_scripts():
+    return sorted(f for f in os.listdir(SCRIPT_DIR) if f.endswith(('.sh', '.py')))
+
+def checked_run(script, run):
+    """Ejecución pedida (None = la última); 404 si el script o la ejecución no existen.
+
+    Los dos acaban en una ruta del LogStore: nada de '..' ni rutas absolutas
+    """
+    if script not in list_scripts() + [DAEMON_NAME, FORK_SERVER_NAME]:
+        abort(404)
+    if run is not None and not log_exists(script, run):
+        abort(404)
+    return run
+
 @app.route('/')
 def index():
-    scripts = [f for f in os.listdir(SCRIPT_DIR) if f.endswith(('.sh', '.py'))]
-    current_script = get_current_script()
+    scripts = list_scripts()
+    running = running_scripts()
     status = {}
     for s in scripts:
-        status[s] = {'running': (s == current_script and is_running(s)), 'pid': get_pid(s)}
-    log_output = get_log(current_script) if current_script else "No hay script en ejecución."
-    return render_template('index.html', scripts=scripts, status=status, current_script=current_script, log_output=log_output)
+        samples = script_samples(s)
+        status[s] = {'running': is_running(s), 'info': script_info(s), 'conflict': conflicting_script(s),
+                     'cpu_line': sparkline(samples, 1), 'rss_line': sparkline(samples, 2)}
+    # Log del script elegido (?log=) o del primero en marcha; solo el final,
+    # lo nuevo llega por /log/<script>/stream
+    log_script = request.args.get('log') if request.args.get('log') in scripts else (running[0] if running else None)
+    log_output, log_offset, log_run = "No hay script en ejecución.", 0, None
+    if log_script:
+        log_run = latest_run(log_script)
+        log_output, log_offset, _ = read_log(log_script, run=log_run)
+    # Ejecuciones anteriores, para revisar por qué se paró un script
+    previous_runs = sorted((run for s in scripts for run in log_runs(s)[:3] if not run.get('running')),
+                           key=lambda run: run['run'], reverse=True)[:10]
+    return render_template('index.html', scripts=scripts, status=status, running=running,
+                           log_script=log_script, log_output=log_output, log_offset=log_offset,
+                           log_run=log_run, previous_runs=previous_runs)
 
 @app.route('/run/<script>')
 def run_script(script):
-    current_script = get_current_script()
-    if current_script is None:  # Solo ejecutar si no hay otro en marcha
-        script_path = os.path.join(SCRIPT_DIR, script)
-        if os.path.isfile(script_path):
-            start_script(script_path)
-    return redirect(url_for('index'))
+    # Se lanza si no choca con otro script en marcha de su grupo (ver SCRIPT_GROUPS)
+    script_path = os.path.join(SCRIPT_DIR, script)
+    if os.path.isfile(script_path):
+        start_script(script_path)
+    return redirect(url_for('index', log=script))
 
 @app.route('/stop/<script>')
 def stop_script_route(script):
+    # No espera a que el proceso salga: la página muestra "stopping" mientras tanto
     stop_script(script)
-    return redirect(url_for('index'))
+    return redirect(url_for('index', log=script))
+
+@app.route('/status')
+def status_route():
+    """Estado de todos los scripts, del demonio y del fork server, con la última muestra de CPU/memoria
+    y el tiempo hasta la primera salida de cada lanzamiento"""
+    return {name: script_info(name) for name in list_scripts() + [DAEMON_NAME, FORK_SERVER_NAME]}
+
+def parse_offset(value):
+    return int(value) if value and value.isdigit() else None
+
+def parse_time(value):
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+@app.route('/log/<script>')
+def log_tail(script):
+    """Log de ?run= (la última por defecto) desde el byte ?offset= (sin offset, el final), como mucho ?max= bytes"""
+    max_bytes = min(parse_offset(request.args.get('max')) or MAX_LOG_CHUNK, MAX_LOG_CHUNK)
+    run = checked_run(script, request.args.get('run')) or latest_run(script)
+    text, offset, reset = read_log(script, parse_offset(request.args.get('offset')), max_bytes, run=run)
+    return {'run': run, 'data': text, 'offset': offset, 'size': log_size(script, run), 'reset': reset,
+            'running': bool(is_running(script))}
+
+@app.route('/log/<script>/runs')
+def log_runs_route(script):
+    """Ejecuciones guardadas: inicio, fin, tamaño y código de salida"""
+    checked_run(script, None)
+    return {'runs': log_runs(script)}
+
+@app.route('/log/<script>/lines')
+def log_lines(script):
+    """Últimas ?n= líneas (100 por defecto) de ?run=, en texto plano"""
+    n = min(parse_offset(request.args.get('n')) or 100, 5000)
+    lines = tail_lines(script, n, run=checked_run(script, request.args.get('run')))
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; charset=utf-8')
+
+@app.route('/log/<script>/range')
+def log_range_route(script):
+    """Salida de ?run= entre ?from= y ?to= (segundos Unix), en texto plano.
+
+    La cabecera X-Log-Next-Offset indica dónde seguir con /log/<script>?offset=
+    si la respuesta se ha cortado en MAX_LOG_CHUNK bytes.
+    """
+    text, offset = log_range(script, parse_time(request.args.get('from')), parse_time(request.args.get('to')),
+                             run=checked_run(script, request.args.get('run')))
+    return Response(text, mimetype='text/plain; charset=utf-8', headers={'X-Log-Next-Offset': str(offset)})
+
+@app.route('/log/<script>/stream')
+def log_stream(script):
+    """Server-Sent Events con las líneas nuevas del log.
+
+    Cada evento lleva como id "<ejecución>:<offset siguiente>", así que el
+    navegador reanuda donde lo dejó al reconectar (cabecera Last-Event-ID).
+    El tamaño de la ejecución en marcha se consulta en memoria y solo se leen
+    los bytes nuevos; si el script se relanza se manda 'reset' y se sigue con
+    la ejecución nueva.
+    """
+    checked_run(script, None)
+    run, _, offset = (request.headers.get('Last-Event-ID') or '').rpartition(':')
+    if run and not log_exists(script, run):
+        run, offset = '', ''  # ejecución borrada (o id no válido): se sigue con la última
+    run = run or checked_run(script, request.args.get('run')) or latest_run(script)
+    offset = parse_offset(offset) if run else None
+    if offset is None:
+        offset = parse_offset(request.args.get('offset'))
+
+    def events():
+        current, position = run, offset
+        last_sent = time.monotonic()
+        while True:
+            latest = latest_run(script)
+            if latest != current:
+                yield 'event: reset\ndata:\n\n'
+                current, position = latest, 0
+            if current is not None and (position is None or log_size(script, current) != position):
+                text, position, _ = read_log(script, position, run=current)
+                if text:
+                    lines = ''.join(f'data: {line}\n' for line in text.splitlines())
+                    yield f'id: {current}:{position}\n{lines}\n'
+                    last_sent = time.monotonic()
+                    continue  # puede quedar más por leer
+            if not is_running(script):
+                yield 'event: end\ndata:\n\n'
+                return
+            if time.monotonic() - last_sent > SSE_KEEPALIVE:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+            time.sleep(LOG_POLL_INTERVAL)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 if __name__ == '__main__':
+    start_supervisor()
+    start_daemon(DAEMON_SCRIPT)
+    start_fork_server(FORK_SERVER_SCRIPT)
     app.run(host='0.0.0.0', port=5000)
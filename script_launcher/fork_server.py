@@ -0,0 +1,313 @@
+"""Fork server: intérprete caliente para lanzar los scripts sin re-importar nada.
+
+Se ejecuta con el Python del venv y desde la raíz del proyecto (forkserver.sh):
+importa una vez los módulos pesados de PRELOAD (cv2, numpy, aiortc, flask,
+pygame...) y escucha en un socket Unix. Por cada petición hace fork() y el
+hijo ejecuta el script como __main__, con la salida en el pipe que manda el
+lanzador (SCM_RIGHTS), así que el log es el mismo que lanzando el .sh.
+
+Protocolo (una línea JSON por mensaje):
+- lanzador -> servidor: {"script", "args", "cwd"} + el extremo de escritura del pipe
+- servidor -> lanzador: {"pid"} (o {"error"}) y, al terminar el hijo, {"exit"}
+
+Solo se precargan librerías: los módulos del proyecto se importan en cada
+ejecución, así que los cambios en el código se ven sin reiniciar el servidor.
+Tras actualizar el venv hay que reiniciarlo. PRELOAD solo importa, no
+inicializa (nada de pygame.init() ni bucles asyncio): el hijo hereda el
+estado tal cual y un hilo o conexión abiertos antes del fork no sobreviven.
+
+Desde el lanzador se usa spawn(), que devuelve un ForkedProcess con la misma
+interfaz que asyncio.subprocess.Process (pid, stdout, wait()).
+"""
+import array
+import asyncio
+import atexit
+import importlib
+import json
+import os
+import runpy
+import selectors
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+PRELOAD = [
+    "numpy",
+    "cv2",
+    "av",
+    "aiortc",
+    "aiohttp",
+    "flask",
+    "jinja2",
+    "pygame",
+    "go2_webrtc_driver.webrtc_driver",
+    "go2_webrtc_driver.constants",
+]
+SPAWN_TIMEOUT = 5.0  # segundos para que el servidor conteste con el pid
+
+# Servidor (Python del venv)
+
+def preload(modules):
+    """Importa los módulos que estén instalados; devuelve los que se cargaron"""
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    loaded = []
+    for name in modules:
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception as e:
+            print(f"No se pudo precargar {name}: {e}", flush=True)
+    return loaded
+
+def _exit_code(status):
+    """Código de salida al estilo de subprocess: negativo si lo mató una señal"""
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+def _send(conn, message):
+    try:
+        conn.sendall(json.dumps(message).encode() + b"\n")
+    except OSError:
+        pass  # el lanzador se fue: el hijo sigue y lo recoge el supervisor al volver
+
+def _receive(conn):
+    """Petición y descriptor que la acompaña, o (None, None) si no llega bien"""
+    fds = array.array("i")
+    data, ancdata, _, _ = conn.recvmsg(65536, socket.CMSG_SPACE(fds.itemsize))
+    for level, kind, payload in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(payload[:len(payload) - len(payload) % fds.itemsize])
+    while data and not data.endswith(b"\n"):
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    fd = fds[0] if fds else None
+    for extra in fds[1:]:
+        os.close(extra)
+    try:
+        return json.loads(data), fd
+    except ValueError:
+        if fd is not None:
+            os.close(fd)
+        return None, None
+
+def _run_child(request, fd, ready):
+    """Código del hijo tras el fork: no vuelve nunca"""
+    code = 1
+    try:
+        os.setsid()  # grupo propio: el supervisor manda SIGTERM/SIGKILL a todo el script
+        # Ya hay grupo: el servidor puede dar el pid al lanzador
+        os.close(ready)
+        signal.set_wakeup_fd(-1)
+        for sig in (signal.SIGCHLD, signal.SIGTERM, signal.SIGHUP):
+            signal.signal(sig, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.close(devnull)
+        sys.stdout.reconfigure(line_buffering=True)
+        if request.get("cwd"):
+            os.chdir(request["cwd"])
+        script = os.path.abspath(request["script"])
+        sys.argv = [script] + list(request.get("args", ()))
+        sys.path[0] = os.path.dirname(script)
+        if "numpy" in sys.modules:
+            # random se re-siembra solo tras el fork; numpy no
+            sys.modules["numpy"].random.seed()
+        code = 0
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            code = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except KeyboardInterrupt:
+        code = 130
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    try:
+        # Lo que haría el intérprete al salir: esperar a los hilos no daemon y atexit
+        for thread in threading.enumerate():
+            if thread is not threading.main_thread() and not thread.daemon:
+                thread.join()
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(code)
+
+def serve(socket_path):
+    start = time.monotonic()
+    loaded = preload(PRELOAD)
+    print(f"Precargados {len(loaded)} módulos en {time.monotonic() - start:.2f} s: {', '.join(loaded)}", flush=True)
+
+    # SIGCHLD despierta al selector a través de este socket
+    wakeup_r, wakeup_w = socket.socketpair()
+    wakeup_r.setblocking(False)
+    wakeup_w.setblocking(False)
+    signal.set_wakeup_fd(wakeup_w.fileno())
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    stop = []
+    signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(8)
+    print(f"Esperando peticiones en {socket_path}", flush=True)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, "accept")
+    selector.register(wakeup_r, selectors.EVENT_READ, "reap")
+    children = {}  # pid -> conexión del lanzador que lo pidió (None si se cerró)
+    try:
+        while not stop:
+            for key, _ in selector.select():
+                if key.data == "accept":
+                    conn, _ = listener.accept()
+                    conn.settimeout(1.0)
+                    try:
+                        request, fd = _receive(conn)
+                    except OSError:
+                        request, fd = None, None
+                    if request is None or fd is None or "script" not in request:
+                        _send(conn, {"error": "petición no válida"})
+                        conn.close()
+                        continue
+                    sys.stdout.flush()
+                    sys.stderr.flush()
+                    ready_r, ready_w = os.pipe()
+                    pid = os.fork()
+                    if pid == 0:
+                        os.close(ready_r)
+                        listener.close()
+                        wakeup_r.close()
+                        wakeup_w.close()
+                        conn.close()
+                        for other in children.values():
+                            if other is not None:
+                                other.close()
+                        _run_child(request, fd, ready_w)
+                    os.close(fd)
+                    # Hasta que el hijo no haya hecho setsid(), killpg(pid) fallaría:
+                    # el pid solo se contesta después (EOF al cerrar el hijo su extremo)
+                    os.close(ready_w)
+                    os.read(ready_r, 1)
+                    os.close(ready_r)
+                    _send(conn, {"pid": pid})
+                    print(f"{request['script']} lanzado (PID {pid})", flush=True)
+                    children[pid] = conn
+                    selector.register(conn, selectors.EVENT_READ, pid)
+                elif key.data == "reap":
+                    try:
+                        while wakeup_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    while children:
+                        try:
+                            pid, status = os.waitpid(-1, os.WNOHANG)
+                        except ChildProcessError:
+                            break
+                        if pid == 0:
+                            break
+                        conn = children.pop(pid, None)
+                        print(f"PID {pid} terminó con {_exit_code(status)}", flush=True)
+                        if conn is not None:
+                            selector.unregister(conn)
+                            _send(conn, {"exit": _exit_code(status)})
+                            conn.close()
+                else:
+                    # El lanzador cerró la conexión: el hijo sigue, ya no hay a quién avisar
+                    conn = key.fileobj
+                    try:
+                        closed = not conn.recv(4096)
+                    except OSError:
+                        closed = True
+                    if closed:
+                        selector.unregister(conn)
+                        conn.close()
+                        children[key.data] = None
+    finally:
+        listener.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+# Cliente (lanzador)
+
+class ForkedProcess:
+    """Script lanzado por el fork server, con la interfaz de asyncio.subprocess.Process que usa el supervisor"""
+
+    def __init__(self, pid, stdout, control, control_writer):
+        self.pid = pid
+        self.stdout = stdout
+        self.returncode = None
+        self._control = control
+        self._control_writer = control_writer
+        self._exit = None
+
+    async def wait(self):
+        """Código de salida; None si se perdió la conexión con el fork server"""
+        if self._exit is None:
+            self._exit = asyncio.ensure_future(self._read_exit())
+        return await asyncio.shield(self._exit)
+
+    async def _read_exit(self):
+        try:
+            line = await self._control.readline()
+            self.returncode = json.loads(line)["exit"] if line else None
+        except (ValueError, KeyError, OSError):
+            self.returncode = None
+        finally:
+            self._control_writer.close()
+        return self.returncode
+
+async def spawn(socket_path, script, args=(), cwd=None):
+    """Pide al fork server que ejecute `script`; lanza OSError si no está disponible"""
+    loop = asyncio.get_running_loop()
+    read_fd, write_fd = os.pipe()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        # Socket local: conectar y mandar la petición no llegan a bloquear
+        sock.settimeout(1.0)
+        sock.connect(socket_path)
+        request = json.dumps({"script": script, "args": list(args), "cwd": cwd}).encode() + b"\n"
+        sock.sendmsg([request], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array("i", [write_fd]))])
+        sock.setblocking(False)
+        control, control_writer = await asyncio.open_unix_connection(sock=sock)
+    except OSError:
+        sock.close()
+        os.close(read_fd)
+        raise
+    finally:
+        os.close(write_fd)  # solo debe tenerlo el hijo, o el pipe no llegaría a EOF
+
+    try:
+        line = await asyncio.wait_for(control.readline(), SPAWN_TIMEOUT)
+        reply = json.loads(line) if line else {"error": "el fork server cerró la conexión"}
+    except (asyncio.TimeoutError, ValueError):
+        reply = {"error": "el fork server no responde"}
+    if "pid" not in reply:
+        control_writer.close()
+        os.close(read_fd)
+        raise OSError(reply.get("error", "respuesta no válida del fork server"))
+
+    stdout = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stdout), os.fdopen(read_fd, "rb", 0))
+    return ForkedProcess(reply["pid"], stdout, control, control_writer)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit(f"Uso: {sys.argv[0]} <socket>")
+    serve(sys.argv[1])
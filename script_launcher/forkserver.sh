@@ -0,0 +1,4 @@
+#!/bin/bash
+
+cd /home/zt01/unitree_zt01
+./venv/bin/python script_launcher/fork_server.py "$@"
@@ -0,0 +1,342 @@
+import bisect
+import gzip
+import json
+import os
+import shutil
+import struct
+import threading
+import time
+from datetime import datetime
+
+# Entrada del índice: (instante, offset del primer byte escrito en ese instante)
+_INDEX_RECORD = struct.Struct("<dQ")
+
+def _path_component(name):
+    """Nombre de script o de ejecución: un solo componente de ruta (ValueError si no)"""
+    if not name or os.path.basename(name) != name or name in (".", ".."):
+        raise ValueError(f"Nombre no válido: {name!r}")
+    return name
+
+class LogStore:
+    """Logs de los scripts por ejecución, con rotación, compresión e índice.
+
+    Cada ejecución tiene su carpeta `<directorio>/<script>/<AAAAMMDD-HHMMSS>/`:
+    - segmentos `<offset inicial>.log` de como mucho `segment_bytes` bytes o
+      `segment_seconds` segundos; al cerrarse se comprimen a `.log.gz`,
+    - `index.bin`, registros (instante, offset) cada `index_interval` s como
+      mucho, para buscar por tiempo con una búsqueda binaria,
+    - `meta.json` con inicio, fin, tamaño y código de salida.
+
+    Los offsets son posiciones en la salida completa de la ejecución, como si
+    fuera un único archivo. Se conservan como mucho `max_runs` ejecuciones por
+    script y `max_total_bytes` en disco; lo más antiguo se borra primero.
+    """
+
+    def __init__(self, directory, segment_bytes=1024 * 1024, segment_seconds=3600, index_interval=1.0,
+                 max_runs=20, max_total_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.index_interval = index_interval
+        self.max_runs = max_runs
+        self.max_total_bytes = max_total_bytes
+        self._writers = {}  # (script, run) -> RunWriter activo
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # Escritura
+
+    def start_run(self, script_name):
+        """Crea una ejecución nueva y devuelve su RunWriter"""
+        run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+        path = self.run_path(script_name, run_id)
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = self.run_path(script_name, f"{run_id}-{suffix}")
+        run_id = os.path.basename(path)
+        os.makedirs(path)
+        writer = RunWriter(self, script_name, run_id, path)
+        with self._lock:
+            self._writers[(script_name, run_id)] = writer
+        self.enforce_limits()
+        return writer
+
+    def _finished(self, writer):
+        with self._lock:
+            self._writers.pop((writer.script_name, writer.run_id), None)
+
+    def enforce_limits(self):
+        """Borra las ejecuciones y segmentos más antiguos que sobren (nunca los activos)"""
+        with self._lock:
+            active = {writer.path for writer in self._writers.values()}
+            active_segments = {writer.segment_path for writer in self._writers.values()}
+        for script_name in self.scripts():
+            finished = [run for run in self.runs(script_name) if self.run_path(script_name, run) not in active]
+            for run in finished[:max(0, len(self.runs(script_name)) - self.max_runs)]:
+                shutil.rmtree(self.run_path(script_name, run), ignore_errors=True)
+
+        segments = []
+        total = 0
+        for script_name in self.scripts():
+            for run in self.runs(script_name):
+                path = self.run_path(script_name, run)
+                for name in os.listdir(path):
+                    file_path = os.path.join(path, name)
+                    try:
+                        stat = os.stat(file_path)
+                    except FileNotFoundError:
+                        continue
+                    total += stat.st_size
+                    if name.endswith((".log", ".log.gz")) and file_path not in active_segments:
+                        segments.append((stat.st_mtime, file_path, stat.st_size))
+        for _, file_path, size in sorted(segments):
+            if total <= self.max_total_bytes:
+                break
+            try:
+                os.remove(file_path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+    # Lectura
+
+    def scripts(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.isdir(os.path.join(self.directory, name)))
+
+    def run_path(self, script_name, run_id):
+        """Carpeta de la ejecución; los dos nombres tienen que ser un solo componente"""
+        return os.path.join(self.directory, _path_component(script_name), _path_component(run_id))
+
+    def runs(self, script_name):
+        """Ejecuciones del script, de la más antigua a la más reciente"""
+        path = os.path.join(self.directory, _path_component(script_name))
+        if not os.path.isdir(path):
+            return []
+        return sorted(os.listdir(path))
+
+    def latest_run(self, script_name):
+        runs = self.runs(script_name)
+        return runs[-1] if runs else None
+
+    def info(self, script_name, run_id):
+        """meta.json de la ejecución (con el tamaño al día si sigue activa)"""
+        writer = self._writers.get((script_name, run_id))
+        if writer is not None:
+            return writer.meta()
+        try:
+            with open(os.path.join(self.run_path(script_name, run_id), "meta.json")) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            # Sin meta.json (el lanzador murió durante la ejecución)
+            size = self._end_from_segments(script_name, run_id) if self._segments(script_name, run_id) else 0
+            return {"run": run_id, "script": script_name, "size": size, "running": False}
+
+    def size(self, script_name, run_id):
+        """Bytes escritos en la ejecución; para la activa sale de memoria, sin tocar el disco"""
+        writer = self._writers.get((script_name, run_id))
+        if writer is not None:
+            return writer.offset
+        return self.info(script_name, run_id).get("size") or 0
+
+    def read(self, script_name, run_id, offset, max_bytes):
+        """Hasta `max_bytes` bytes desde `offset` (pueden cruzar segmentos)"""
+        chunks = []
+        remaining = max_bytes
+        segments = self._segments(script_name, run_id)
+        starts = [start for start, _ in segments]
+        i = bisect.bisect_right(starts, offset) - 1
+        if i < 0:
+            # Los primeros segmentos se han borrado: seguir desde el más antiguo
+            i, offset = 0, starts[0] if starts else offset
+        while remaining > 0 and i < len(segments):
+            start, path = segments[i]
+            data = self._read_segment(path, offset - start, remaining)
+            if data is None:
+                break
+            chunks.append(data)
+            remaining -= len(data)
+            offset += len(data)
+            if remaining == 0:
+                break
+            # Fin del segmento: seguir en el siguiente
+            i += 1
+            if i < len(segments):
+                offset = segments[i][0]
+        return offset, b"".join(chunks)
+
+    def tail(self, script_name, run_id, lines, max_bytes=256 * 1024):
+        """Últimas `lines` líneas, leyendo hacia atrás solo lo necesario"""
+        segments = self._segments(script_name, run_id)
+        data = b""
+        for start, path in reversed(segments):
+            if path.endswith(".gz"):
+                block = self._read_segment(path, 0, self.segment_bytes * 2) or b""
+            else:
+                # Segmento activo: desde el final, por bloques
+                block = b""
+                try:
+                    with open(path, "rb") as f:
+                        end = f.seek(0, os.SEEK_END)
+                        position = end
+                        while position > 0 and block.count(b"\n") <= lines and len(block) < max_bytes:
+                            position = max(0, position - 8192)
+                            f.seek(position)
+                            block = f.read(end - position)
+                except FileNotFoundError:
+                    continue
+            data = block + data
+            if data.count(b"\n") > lines or len(data) >= max_bytes:
+                break
+        text = data[-max_bytes:].decode("utf-8", errors="replace")
+        return text.splitlines()[-lines:] if lines else []
+
+    def time_range(self, script_name, run_id, since=None, until=None):
+        """(offset inicial, offset final) de lo escrito entre `since` y `until` (time.time()).
+
+        Con la resolución del índice (`index_interval`): el inicio puede
+        incluir algo de salida algo anterior a `since`.
+        """
+        path = os.path.join(self.run_path(script_name, run_id), "index.bin")
+        end = self.size(script_name, run_id)
+        try:
+            with open(path, "rb") as f:
+                count = f.seek(0, os.SEEK_END) // _INDEX_RECORD.size
+
+                def entry(i):
+                    f.seek(i * _INDEX_RECORD.size)
+                    return _INDEX_RECORD.unpack(f.read(_INDEX_RECORD.size))
+
+                def first_after(t):
+                    lo, hi = 0, count
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        if entry(mid)[0] <= t:
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    return lo
+
+                start = 0
+                if since is not None and count:
+                    i = first_after(since) - 1
+                    start = entry(i)[1] if i >= 0 else 0
+                if until is not None and count:
+                    i = first_after(until)
+                    end = entry(i)[1] if i < count else end
+        except FileNotFoundError:
+            start = 0
+        return start, end
+
+    def _segments(self, script_name, run_id):
+        path = self.run_path(script_name, run_id)
+        try:
+            names = os.listdir(path)
+        except FileNotFoundError:
+            return []
+        segments = {}
+        for name in names:
+            prefix = name.split(".")[0]
+            if name.endswith((".log", ".log.gz")) and prefix.isdigit():
+                start = int(prefix)
+                # Durante la compresión existen las dos versiones: mejor la .log
+                if start not in segments or name.endswith(".log"):
+                    segments[start] = os.path.join(path, name)
+        return sorted(segments.items())
+
+    def _end_from_segments(self, script_name, run_id):
+        start, path = self._segments(script_name, run_id)[-1]
+        data = self._read_segment(path, 0, self.segment_bytes * 2) or b""
+        return start + len(data)
+
+    @staticmethod
+    def _read_segment(path, offset, max_bytes):
+        opener = gzip.open if path.endswith(".gz") else open
+        for candidate, open_file in ((path, opener), (path + ".gz", gzip.open)):
+            try:
+                with open_file(candidate, "rb") as f:
+                    f.seek(offset)
+                    return f.read(max_bytes)
+            except FileNotFoundError:
+                continue  # comprimido mientras tanto
+        return None
+
+
+class RunWriter:
+    """Escribe la salida de una ejecución en su carpeta del LogStore"""
+
+    def __init__(self, store, script_name, run_id, path):
+        self.store = store
+        self.script_name = script_name
+        self.run_id = run_id
+        self.path = path
+        self.offset = 0
+        self.started = time.time()
+        self.exit_code = None
+        self._segment = None
+        self.segment_path = None
+        self._segment_start = 0
+        self._segment_opened = 0.0
+        self._index = open(os.path.join(path, "index.bin"), "ab")
+        self._last_index = None
+        self._lock = threading.Lock()
+        self._open_segment()
+
+    def write(self, data):
+        now = time.time()
+        with self._lock:
+            if self._last_index is None or now - self._last_index >= self.store.index_interval:
+                self._index.write(_INDEX_RECORD.pack(now, self.offset))
+                self._index.flush()
+                self._last_index = now
+            self._segment.write(data)
+            self._segment.flush()
+            self.offset += len(data)
+            if (self.offset - self._segment_start >= self.store.segment_bytes
+                    or now - self._segment_opened >= self.store.segment_seconds):
+                self._rotate()
+
+    def close(self, exit_code=None):
+        with self._lock:
+            self.exit_code = exit_code
+            self._close_segment()
+            self._index.close()
+            self._write_meta(ended=time.time())
+        self.store._finished(self)
+
+    def meta(self):
+        return {"run": self.run_id, "script": self.script_name, "started": self.started,
+                "ended": None, "size": self.offset, "exit_code": None, "running": True}
+
+    def _write_meta(self, ended):
+        meta = dict(self.meta(), ended=ended, exit_code=self.exit_code, running=False)
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f)
+
+    def _open_segment(self):
+        self._segment_start = self.offset
+        self._segment_opened = time.time()
+        self.segment_path = os.path.join(self.path, f"{self.offset:012d}.log")
+        self._segment = open(self.segment_path, "ab")
+
+    def _close_segment(self):
+        self._segment.close()
+        path = self.segment_path
+        # Comprimir fuera del hilo que lee la salida del proceso
+        threading.Thread(target=_compress, args=(path,), daemon=True).start()
+
+    def _rotate(self):
+        self._close_segment()
+        self._open_segment()
+        threading.Thread(target=self.store.enforce_limits, daemon=True).start()
+
+
+def _compress(path):
+    try:
+        with open(path, "rb") as src, gzip.open(path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(path + ".gz.tmp", path + ".gz")
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # borrado por el límite de espacio mientras tanto
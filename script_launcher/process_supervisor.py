@@ -0,0 +1,441 @@
+import asyncio
+import json
+import os
+import signal
+import threading
+import time
+from collections import deque
+
+import fork_server
+
+RESTART_POLICIES = ("never", "on-failure", "always")
+
+class ManagedProcess:
+    """Estado de un script gestionado por el ProcessSupervisor"""
+
+    def __init__(self, name, command, policy="never", group=None, history=(), samples=150, fork=None):
+        self.name = name
+        self.command = command
+        self.fork = fork  # {"script", "args", "cwd"} para lanzarlo con el fork server, o None
+        self.policy = policy
+        self.group = group
+        self.state = "stopped"  # starting / running / stopping / restarting / failed
+        self.desired = "stopped"
+        self.pid = None
+        self.pid_identity = None  # (inicio del proceso, cmdline) para reconocerlo tras reiniciar el lanzador
+        self.run_id = None
+        self.started_at = None
+        self.mode = None  # "fork" o "exec"
+        self.startup_s = None  # del lanzamiento a la primera salida del script
+        self.restarts = 0  # reinicios seguidos sin llegar a estabilizarse
+        self.history = deque(history, maxlen=20)  # salidas: inicio, fin, código, ejecución del log
+        self.samples = deque(maxlen=samples)  # (instante, CPU %, RSS MB)
+        self.proc = None
+        self._stop_requested = False
+
+    @property
+    def running(self):
+        return self.state in ("starting", "running", "stopping")
+
+    def info(self):
+        cpu, rss = self.samples[-1][1:] if self.samples else (None, None)
+        return {
+            "name": self.name, "state": self.state, "pid": self.pid, "policy": self.policy,
+            "group": self.group, "run": self.run_id, "restarts": self.restarts,
+            "uptime_s": round(time.time() - self.started_at) if self.running and self.started_at else None,
+            "cpu_percent": cpu, "rss_mb": rss, "mode": self.mode, "startup_s": self.startup_s,
+            "history": list(self.history),
+        }
+
+    def snapshot(self):
+        return {"command": self.command, "fork": self.fork, "policy": self.policy, "group": self.group,
+                "state": self.state, "desired": self.desired, "pid": self.pid,
+                "pid_identity": self.pid_identity, "history": list(self.history)}
+
+
+class ProcessSupervisor:
+    """Lanza y vigila los scripts desde un bucle asyncio en un hilo propio.
+
+    - run()/stop() no bloquean: programan el trabajo en el bucle y vuelven.
+      stop() manda SIGTERM al grupo de procesos del script (bash y lo que
+      haya lanzado) y, si sigue vivo tras `stop_timeout` s, SIGKILL.
+    - Política de reinicio por script: "never", "on-failure" (salida distinta
+      de 0) o "always", con espera exponencial; tras `max_restarts` fallos
+      seguidos sin estabilizarse el script queda en "failed".
+    - Scripts del mismo `group` no pueden ejecutarse a la vez (p. ej. los que
+      mueven el robot); el resto sí.
+    - El estado vive en memoria; cada cambio se guarda en `snapshot_path`
+      (un único JSON) para recuperarse si el lanzador muere: los scripts que
+      seguían en marcha se paran y, si su política lo permite, se relanzan.
+    - Cada `sample_interval` s se mide CPU y memoria de cada script (sumando
+      sus procesos hijos) en un buffer circular.
+    - La salida de cada ejecución va al LogStore.
+    - Con `fork_socket`, los scripts que traen `fork` se lanzan como fork del
+      fork server (módulos ya importados); si no está disponible, con su
+      comando normal. De cada lanzamiento se mide el tiempo hasta la primera
+      salida del script.
+    """
+
+    def __init__(self, log_store, snapshot_path, stop_timeout=5.0, sample_interval=2.0,
+                 min_backoff=1.0, max_backoff=30.0, stable_after=60.0, max_restarts=5, fork_socket=None):
+        self.log_store = log_store
+        self.snapshot_path = snapshot_path
+        self.fork_socket = fork_socket
+        self.stop_timeout = stop_timeout
+        self.sample_interval = sample_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.max_restarts = max_restarts
+        self.processes = {}  # nombre -> ManagedProcess
+        # run() llega desde varios hilos de Flask: comprobar y marcar "starting" tiene que ser atómico
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = None
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._page_mb = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+    def start(self):
+        """Arranca el bucle del supervisor y recupera el estado guardado"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._submit(self._restore()).result()
+        self._submit(self._sample_loop())
+
+    # API para los hilos de Flask (no bloquea)
+
+    def run(self, name, command, policy="never", group=None, fork=None):
+        """Lanza el script; devuelve False si ya está en marcha o choca con otro de su grupo.
+
+        Con `fork` ({"script", "args", "cwd"}) se lanza con el fork server
+        si está disponible y `command` queda como alternativa.
+        """
+        if policy not in RESTART_POLICIES:
+            raise ValueError(f"Política de reinicio desconocida: {policy}")
+        with self._lock:
+            if self.conflict(name, group) is not None or self.is_running(name):
+                return False
+            managed = self.processes.get(name)
+            if managed is None:
+                managed = self.processes[name] = ManagedProcess(name, command, policy, group, fork=fork)
+            managed.command, managed.policy, managed.group, managed.fork = command, policy, group, fork
+            managed.desired = "running"
+            managed.state = "starting"
+            managed.restarts = 0
+        self._submit(self._supervise(managed))
+        return True
+
+    def stop(self, name):
+        """Pide parar el script (SIGTERM y luego SIGKILL) sin esperar a que salga"""
+        managed = self.processes.get(name)
+        if managed is None or managed.desired == "stopped" and not managed.running:
+            return False
+        managed.desired = "stopped"
+        self._submit(self._terminate(managed))
+        return True
+
+    def is_running(self, name):
+        managed = self.processes.get(name)
+        return managed is not None and (managed.running or managed.state == "restarting")
+
+    def conflict(self, name, group):
+        """Script en marcha del mismo grupo que impide lanzar `name`, o None"""
+        if group is None:
+            return None
+        for other in list(self.processes.values()):
+            if other.name != name and other.group == group and (other.running or other.state == "restarting"):
+                return other.name
+        return None
+
+    def info(self, name):
+        managed = self.processes.get(name)
+        return managed.info() if managed is not None else None
+
+    def samples(self, name):
+        managed = self.processes.get(name)
+        return list(managed.samples) if managed is not None else []
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    # Bucle del supervisor
+
+    async def _supervise(self, managed):
+        """Ejecuta el script y lo relanza según su política hasta que deba parar"""
+        while True:
+            code = await self._run_once(managed)
+            if code is None or not self._should_restart(managed, code):
+                return
+            managed.state = "restarting"
+            self._save()
+            delay = min(self.min_backoff * 2 ** max(0, managed.restarts - 1), self.max_backoff)
+            await asyncio.sleep(delay)
+            if managed.desired != "running" or managed.state != "restarting":
+                return
+            managed.state = "starting"
+
+    async def _run_once(self, managed):
+        """Lanza el script, copia su salida al log y devuelve el código de salida"""
+        managed._stop_requested = False
+        writer = self.log_store.start_run(managed.name)
+        launched = time.monotonic()
+        proc = await self._fork(managed, writer)
+        managed.mode = "exec" if proc is None else "fork"
+        if proc is None:
+            try:
+                # Sesión propia: SIGTERM/SIGKILL llegan también a los hijos del script
+                proc = await asyncio.create_subprocess_exec(
+                    *managed.command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+                    start_new_session=True)
+            except OSError as e:
+                writer.write(f"No se pudo lanzar {managed.command}: {e}\n".encode())
+                writer.close(None)
+                managed.state = "failed"
+                managed.desired = "stopped"
+                self._save()
+                return None
+        managed.startup_s = None
+        managed.proc = proc
+        managed.pid = proc.pid
+        managed.pid_identity = self._identity(proc.pid)
+        managed.run_id = writer.run_id
+        managed.started_at = time.time()
+        managed.samples.clear()
+        managed.state = "running"
+        self._save()
+        if managed.desired != "running":
+            # stop() llegó mientras se lanzaba
+            asyncio.get_running_loop().create_task(self._terminate(managed))
+
+        while data := await proc.stdout.read(65536):
+            if managed.startup_s is None:
+                managed.startup_s = round(time.monotonic() - launched, 3)
+            writer.write(data)
+        code = await proc.wait()
+        writer.close(code)
+
+        managed.history.append({"run": managed.run_id, "started": managed.started_at, "ended": time.time(),
+                                "exit_code": code, "stopped": managed._stop_requested,
+                                "mode": managed.mode, "startup_s": managed.startup_s})
+        managed.proc = None
+        managed.pid = None
+        managed.pid_identity = None
+        return code
+
+    async def _fork(self, managed, writer):
+        """Lanza el script con el fork server; None si no procede o no está disponible"""
+        if managed.fork is None or self.fork_socket is None:
+            return None
+        try:
+            return await fork_server.spawn(self.fork_socket, managed.fork["script"], managed.fork.get("args", ()),
+                                           managed.fork.get("cwd"))
+        except OSError as e:
+            writer.write(f"Fork server no disponible ({e}): se lanza {' '.join(managed.command)}\n".encode())
+            return None
+
+    def _should_restart(self, managed, code):
+        restart = not managed._stop_requested and managed.desired == "running" and (
+            managed.policy == "always" or managed.policy == "on-failure" and code != 0)
+        if restart:
+            stable = time.time() - managed.started_at >= self.stable_after
+            managed.restarts = 0 if stable else managed.restarts + 1
+            restart = managed.restarts <= self.max_restarts
+        if not restart:
+            managed.state = "stopped" if code == 0 or managed._stop_requested else "failed"
+            managed.desired = "stopped"
+            self._save()
+        return restart
+
+    async def _terminate(self, managed):
+        proc = managed.proc
+        if proc is None:
+            # Esperando un reinicio: basta con cancelarlo
+            if managed.state == "restarting":
+                managed.state = "stopped"
+                self._save()
+            return
+        managed._stop_requested = True
+        managed.state = "stopping"
+        await self._stop_group(proc.pid, lambda: asyncio.shield(proc.wait()))
+
+    async def _stop_group(self, pid, exited):
+        """SIGTERM al grupo del script y, si `exited()` no termina en `stop_timeout` s, SIGKILL.
+
+        Devuelve False si ni así ha salido en otros `stop_timeout` s.
+        """
+        self._signal(pid, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(exited(), self.stop_timeout)
+            return True
+        except asyncio.TimeoutError:
+            self._signal(pid, signal.SIGKILL)
+        try:
+            await asyncio.wait_for(exited(), self.stop_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    @staticmethod
+    async def _group_exited(pid):
+        """Espera a que no quede ningún proceso del grupo `pid` (un huérfano no es hijo nuestro: sin wait())"""
+        while True:
+            try:
+                os.killpg(pid, 0)
+            except ProcessLookupError:
+                return
+            except PermissionError:
+                pass
+            await asyncio.sleep(0.1)
+
+    @staticmethod
+    def _identity(pid):
+        """(instante de arranque en ticks, cmdline) del proceso, o None si ya no existe.
+
+        El pid solo no basta: tras reiniciar la máquina, o si los pids dan la
+        vuelta, puede ser de otro proceso.
+        """
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                start = int(f.read().rsplit(b")", 1)[1].split()[19])  # campo 22
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                cmdline = f.read().decode(errors="replace")
+        except (OSError, IndexError, ValueError):
+            return None
+        return [start, cmdline]
+
+    @staticmethod
+    def _signal(pid, sig):
+        try:
+            os.killpg(pid, sig)
+        except ProcessLookupError:
+            # Aún sin grupo propio (recién lanzado): al menos al proceso
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    # Estado persistente
+
+    def _save(self):
+        data = {"saved_at": time.time(),
+                "processes": {name: managed.snapshot() for name, managed in self.processes.items()}}
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.snapshot_path)
+
+    async def _restore(self):
+        try:
+            with open(self.snapshot_path) as f:
+                saved = json.load(f)["processes"]
+        except (FileNotFoundError, ValueError, KeyError):
+            return
+        for name, entry in saved.items():
+            managed = ManagedProcess(name, entry["command"], entry.get("policy", "never"),
+                                     entry.get("group"), entry.get("history", ()), fork=entry.get("fork"))
+            self.processes[name] = managed
+            if entry.get("state") == "failed":
+                managed.state = "failed"
+            orphan = None
+            if entry.get("pid"):
+                # Quedó huérfano al morir el lanzador: sin su salida no se puede vigilar.
+                # Solo se para si sigue siendo el mismo proceso (mismo arranque y cmdline)
+                identity = entry.get("pid_identity")
+                if identity is not None and self._identity(entry["pid"]) == identity:
+                    orphan = entry["pid"]
+                managed.history.append({"run": None, "started": None, "ended": time.time(),
+                                        "exit_code": None, "stopped": True, "note": "lanzador reiniciado"})
+            if entry.get("desired") == "running" and managed.policy != "never":
+                managed.desired = "running"
+            if orphan is not None or managed.desired == "running":
+                final_state = managed.state
+                # "stopping"/"starting" cuentan como en marcha: run() no lo lanza otra vez mientras tanto
+                managed.state = "stopping" if orphan is not None else "starting"
+                asyncio.get_running_loop().create_task(self._recover(managed, orphan, final_state))
+        self._save()
+
+    async def _recover(self, managed, orphan, final_state):
+        """Para el huérfano de la ejecución anterior y solo después, si toca, relanza el script.
+
+        Relanzarlo antes haría que los dos se pelearan por el puerto, el
+        socket del demonio o el bus de memoria compartida.
+        """
+        if orphan is not None and not await self._stop_group(orphan, lambda: self._group_exited(orphan)):
+            managed.history.append({"run": None, "started": None, "ended": time.time(), "exit_code": None,
+                                    "stopped": True, "note": f"el PID {orphan} no salió ni con SIGKILL"})
+        if managed.desired == "running":
+            managed.state = "starting"
+            await self._supervise(managed)
+        else:
+            managed.state = final_state
+            self._save()
+
+    # Consumo de CPU y memoria
+
+    async def _sample_loop(self):
+        previous = {}  # nombre -> (instante, ticks de CPU)
+        while True:
+            await asyncio.sleep(self.sample_interval)
+            running = [managed for managed in self.processes.values() if managed.pid is not None]
+            if not running:
+                previous.clear()
+                continue
+            children = self._children()
+            now = time.monotonic()
+            for managed in running:
+                # La cmdline cambia con el exec de bash tras el fork: mantener la identidad al día
+                identity = self._identity(managed.pid)
+                if identity is not None and identity != managed.pid_identity:
+                    managed.pid_identity = identity
+                    self._save()
+                ticks, pages = 0, 0
+                for pid in self._tree(managed.pid, children):
+                    usage = self._usage(pid)
+                    if usage is not None:
+                        ticks += usage[0]
+                        pages += usage[1]
+                last = previous.get(managed.name)
+                previous[managed.name] = (now, ticks, managed.pid)
+                if last is None or last[2] != managed.pid:
+                    continue
+                cpu = 100.0 * (ticks - last[1]) / self._clock_ticks / (now - last[0])
+                managed.samples.append((round(time.time(), 1), round(max(cpu, 0.0), 1),
+                                        round(pages * self._page_mb, 1)))
+
+    @staticmethod
+    def _children():
+        """pid padre -> [pids hijos], a partir de /proc"""
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", "rb") as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            # El nombre va entre paréntesis y puede contener espacios
+            ppid = int(stat[stat.rindex(b")") + 2:].split()[1])
+            children.setdefault(ppid, []).append(int(entry))
+        return children
+
+    @staticmethod
+    def _tree(pid, children):
+        pids = [pid]
+        for current in pids:
+            pids.extend(children.get(current, ()))
+        return pids
+
+    @staticmethod
+    def _usage(pid):
+        """(ticks de CPU usuario+sistema, páginas residentes) o None si ya no existe"""
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                fields = f.read().rsplit(b")", 1)[1].split()
+            with open(f"/proc/{pid}/statm", "rb") as f:
+                rss = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            return None
+        return int(fields[11]) + int(fields[12]), rss
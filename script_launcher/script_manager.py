@@ -1,72 +1,188 @@
-import subprocess
 import os
-import json
+from log_store import LogStore
+from process_supervisor import ProcessSupervisor
 
-running_processes = {}
 LOG_DIR = os.path.join(os.path.dirname(__file__), "logs")
 os.makedirs(LOG_DIR, exist_ok=True)
 
-STATUS_FILE = os.path.join(os.path.dirname(__file__), "current_script.json")
-
-def save_current_script(script_name):
-    with open(STATUS_FILE, "w") as f:
-        json.dump({"script": script_name}, f)
-
-def get_current_script():
-    if os.path.exists(STATUS_FILE):
-        with open(STATUS_FILE, "r") as f:
-            data = json.load(f)
-            script_name = data.get("script")
-            # Si el proceso ya no existe, borra el archivo
-            if not is_running(script_name):
-                clear_current_script()
-                return None
-            return script_name
-    return None
+# Un log por ejecución (logs/<script>/<ejecución>/), rotado y comprimido; lo
+# más antiguo se borra para no llenar la tarjeta SD
+LOG_SEGMENT_BYTES = 1024 * 1024
+LOG_SEGMENT_SECONDS = 3600
+LOG_MAX_RUNS = 20  # por script
+LOG_MAX_TOTAL_BYTES = 200 * 1024 * 1024
+log_store = LogStore(LOG_DIR, segment_bytes=LOG_SEGMENT_BYTES, segment_seconds=LOG_SEGMENT_SECONDS,
+                     max_runs=LOG_MAX_RUNS, max_total_bytes=LOG_MAX_TOTAL_BYTES)
 
-def clear_current_script():
-    if os.path.exists(STATUS_FILE):
-        os.remove(STATUS_FILE)
+# Bytes máximos que se leen del log en cada petición (página, tail o SSE)
+MAX_LOG_CHUNK = 64 * 1024
 
-def start_script(script_path):
-    ext = os.path.splitext(script_path)[1]
-    script_name = os.path.basename(script_path)
+# Estado de los procesos: en memoria, con una copia en disco por si el lanzador muere
+STATE_FILE = os.path.join(os.path.dirname(__file__), "supervisor_state.json")
+STOP_TIMEOUT = 5  # segundos entre SIGTERM y SIGKILL
+
+# Fork server (LAUNCHER_FORK_SERVER=1): un Python del venv con cv2, numpy,
+# aiortc, flask y pygame ya importados; los scripts de FORK_SCRIPTS se lanzan
+# como fork suyo en vez de arrancar un intérprete de cero. Si no está listo
+# (precargando o caído) se lanza el .sh como siempre
+USE_FORK_SERVER = os.environ.get("LAUNCHER_FORK_SERVER", "0") == "1"
+FORK_SERVER_NAME = "forkserver"
+FORK_SOCKET = os.path.join(os.path.dirname(__file__), "fork_server.sock")
+PROJECT_DIR = "/home/zt01/unitree_zt01"  # donde hacen cd los .sh
+# Script del lanzador -> script de Python que ejecuta dentro del venv
+FORK_SCRIPTS = {
+    "camera.sh": "camera.py",
+    "move.sh": "move.py",
+    "move2.sh": "move2.py",
+    "move3.sh": "move3.py",
+}
+
+supervisor = ProcessSupervisor(log_store, STATE_FILE, stop_timeout=STOP_TIMEOUT,
+                               fork_socket=FORK_SOCKET if USE_FORK_SERVER else None)
+
+# Scripts del mismo grupo no pueden ejecutarse a la vez (los que mueven el
+# robot); los que no aparecen pueden ir en paralelo con cualquiera
+SCRIPT_GROUPS = {
+    "move.sh": "robot",
+    "move2.sh": "robot",
+    "move3.sh": "robot",
+}
+# Política de reinicio: "never" (por defecto), "on-failure" o "always"
+SCRIPT_POLICIES = {
+    "camera.sh": "on-failure",
+}
+DAEMON_NAME = "daemon"
 
-    log_path = os.path.join(LOG_DIR, f"{script_name}.log")
-    log_file = open(log_path, "w")
+def start_supervisor():
+    """Arranca el supervisor y recupera el estado de la ejecución anterior del lanzador"""
+    supervisor.start()
 
+def script_command(script_path):
+    ext = os.path.splitext(script_path)[1]
     if ext == '.sh':
-        proc = subprocess.Popen(['bash', script_path], stdout=log_file, stderr=subprocess.STDOUT)
-    elif ext == '.py':
-        proc = subprocess.Popen(['python3', script_path], stdout=log_file, stderr=subprocess.STDOUT)
-    else:
-        return None
+        return ['bash', script_path]
+    if ext == '.py':
+        return ['python3', script_path]
+    return None
 
-    running_processes[script_name] = proc
-    save_current_script(script_name)
-    return proc.pid
+def start_script(script_path):
+    """Lanza el script sin esperar; False si no se puede (ya en marcha o en conflicto)"""
+    script_name = os.path.basename(script_path)
+    command = script_command(script_path)
+    if command is None:
+        return False
+    fork = None
+    if USE_FORK_SERVER and script_name in FORK_SCRIPTS:
+        fork = {"script": FORK_SCRIPTS[script_name], "cwd": PROJECT_DIR}
+    return supervisor.run(script_name, command, policy=SCRIPT_POLICIES.get(script_name, "never"),
+                          group=SCRIPT_GROUPS.get(script_name), fork=fork)
 
 def stop_script(script_name):
-    proc = running_processes.get(script_name)
-    if proc:
-        proc.terminate()
-        proc.wait()
-        del running_processes[script_name]
-        clear_current_script()
-        return True
-    return False
+    """Pide parar el script (SIGTERM y, si no sale, SIGKILL) sin bloquear"""
+    return supervisor.stop(script_name)
 
 def is_running(script_name):
-    proc = running_processes.get(script_name)
-    return proc and proc.poll() is None
+    return supervisor.is_running(script_name)
 
 def get_pid(script_name):
-    proc = running_processes.get(script_name)
-    return proc.pid if proc else None
+    info = supervisor.info(script_name)
+    return info["pid"] if info else None
+
+def running_scripts():
+    return [name for name in supervisor.processes
+            if name not in (DAEMON_NAME, FORK_SERVER_NAME) and is_running(name)]
+
+def conflicting_script(script_name):
+    """Script en marcha que impide lanzar `script_name`, o None"""
+    return supervisor.conflict(script_name, SCRIPT_GROUPS.get(script_name))
+
+def script_info(script_name):
+    """Estado, pid, CPU/memoria e historial de salidas del script (None si nunca se lanzó)"""
+    return supervisor.info(script_name)
+
+def script_samples(script_name):
+    return supervisor.samples(script_name)
+
+def latest_run(script_name):
+    return log_store.latest_run(script_name)
+
+def read_log(script_name, offset=None, max_bytes=MAX_LOG_CHUNK, run=None):
+    """Lee el log de una ejecución (la última por defecto) a partir del byte `offset`.
+
+    Sin `offset` devuelve el final del log (como mucho `max_bytes`). Solo se
+    devuelven líneas completas, salvo que una sola línea ocupe más de
+    `max_bytes`. Devuelve (texto, offset siguiente, reiniciado): `reiniciado`
+    es True si el log es más corto que `offset` (no es la ejecución que se
+    estaba leyendo), y entonces se lee desde el principio.
+    """
+    run = run or latest_run(script_name)
+    if run is None:
+        return "", 0, bool(offset)
+    reset = False
+    size = log_store.size(script_name, run)
+    tail = offset is None
+    if tail:
+        offset = max(0, size - max_bytes)
+    elif offset > size:
+        offset = 0
+        reset = True
+    offset, data = log_store.read(script_name, run, offset, min(max_bytes, size - offset))
+    offset -= len(data)
+
+    if tail and offset > 0:
+        # Empezar en la primera línea completa
+        start = data.find(b"\n") + 1
+        offset += start
+        data = data[start:]
+    end = data.rfind(b"\n")
+    if end >= 0:
+        data = data[:end + 1]
+    elif len(data) < max_bytes:
+        data = b""  # línea a medio escribir: se leerá entera la próxima vez
+    return data.decode("utf-8", errors="replace"), offset + len(data), reset
+
+def log_size(script_name, run=None):
+    """Bytes escritos en la ejecución (de memoria si sigue en marcha)"""
+    run = run or latest_run(script_name)
+    return log_store.size(script_name, run) if run else 0
+
+def log_exists(script_name, run):
+    """True si `run` es una de las ejecuciones guardadas del script"""
+    return run in log_store.runs(script_name)
+
+def log_runs(script_name):
+    """Ejecuciones guardadas del script, la más reciente primero"""
+    return [log_store.info(script_name, run) for run in reversed(log_store.runs(script_name))]
+
+def tail_lines(script_name, lines, run=None):
+    """Últimas `lines` líneas de una ejecución, sin leer el log entero"""
+    run = run or latest_run(script_name)
+    return log_store.tail(script_name, run, lines) if run else []
+
+def log_range(script_name, since=None, until=None, run=None, max_bytes=MAX_LOG_CHUNK):
+    """Salida escrita entre `since` y `until` (time.time()), con la resolución del índice.
+
+    Devuelve (texto, offset siguiente); si se corta en `max_bytes`, el resto
+    se obtiene con read_log() desde ese offset.
+    """
+    run = run or latest_run(script_name)
+    if run is None:
+        return "", 0
+    start, end = log_store.time_range(script_name, run, since, until)
+    offset, data = log_store.read(script_name, run, start, max(0, min(max_bytes, end - start)))
+    return data.decode("utf-8", errors="replace"), offset
 
 def get_log(script_name):
-    log_path = os.path.join(LOG_DIR, f"{script_name}.log")
-    if os.path.exists(log_path):
-        with open(log_path, "r") as f:
-            return f.read()
-    return "No log available yet."
+    """Final del log (como mucho MAX_LOG_CHUNK bytes)"""
+    if latest_run(script_name) is None:
+        return "No log available yet."
+    return read_log(script_name)[0]
+
+def start_daemon(script_path):
+    """Arranca el demonio de conexión con el robot (fuera de la lista de scripts); se relanza si se cae"""
+    supervisor.run(DAEMON_NAME, ['bash', script_path], policy="always")
+
+def start_fork_server(script_path):
+    """Arranca el fork server si está activado; se relanza si se cae"""
+    if USE_FORK_SERVER:
+        supervisor.run(FORK_SERVER_NAME, ['bash', script_path, FORK_SOCKET], policy="always")
@@ -1,42 +1,44 @@
-import pygame
-from gpiozero import Servo
-from time import sleep
+import asyncio
+import logging
+from joystick_input import JoystickInput, BUTTON
+from servo_controller import ServoButton, ServoController, make_servo
 
-# Inicializa el servo (ajusta el pin según tu conexión)
-servo = Servo(18)  # GPIO18 (PIN12 físico)
+logging.basicConfig(level=logging.INFO)
 
-# Inicializa pygame y el joystick
-pygame.init()
-pygame.joystick.init()
-
-joystick = pygame.joystick.Joystick(0)
-joystick.init()
-
-print("Joystick:", joystick.get_name())
+# Servo del gatillo (ajusta el pin según tu conexión). Por defecto se usa el
+# PWM hardware si el pin está asignado a él (dtoverlay=pwm) o pigpio si está
+# disponible, que no tiemblan con la cámara en marcha; SERVO_BACKEND fuerza uno ("mock" permite probar sin la Raspberry,
+# p. ej. con GO2_JOYSTICK_TRACE para reproducir una grabación del mando)
+SERVO_PIN = 18  # GPIO18 (PIN12 físico), PWM0 en el backend sysfs
 
 # El índice del botón RB suele ser 5, pero puedes verificar con esto
 BUTTON_RB = 7
-NUM_BUTTONS = joystick.get_numbuttons()
+PRESSED = 0.0
+RELEASED = 1.0
+RAMP_SPEED = 8.0  # unidades/s: de suelto a pulsado en 0,125 s sin golpe (None = salto directo)
+DETACH_AFTER = None  # s tras llegar para dejar de mandar pulsos (útil con el PWM por software)
+
+async def main():
+    joystick = JoystickInput.open()
+    print("Joystick:", joystick.name)
+
+    servo = make_servo(pin=SERVO_PIN)
+    controller = ServoController(servo, ramp_speed=RAMP_SPEED, detach_after=DETACH_AFTER,
+                                 initial=RELEASED).start()
+    trigger = ServoButton(controller, BUTTON_RB, pressed=PRESSED, released=RELEASED)
+    try:
+        # Solo se actúa en los flancos del botón; el servo se escribe desde la
+        # tarea del controlador y solo cuando cambia su posición
+        async for event in joystick.events():
+            if not trigger.handle(event) and event.kind == BUTTON and event.value:
+                logging.debug(f"Botón {event.index} presionado")
+    finally:
+        await controller.stop()
+        logging.info(f"📊 Servo: {controller.stats()}")
+        servo.close()
+        joystick.close()
 
 try:
-    while True:
-        pygame.event.pump()
-
-        # Mostrar botones presionados
-        for i in range(NUM_BUTTONS):
-            if joystick.get_button(i):
-                print(f"Botón {i} PRESIONADO")
-
-        # Control del servo con RB
-        if joystick.get_button(BUTTON_RB):
-            servo.value = 0
-        else:
-            servo.value = 1
-
-        sleep(0.1)
-
+    asyncio.run(main())
 except KeyboardInterrupt:
     print("Programa terminado")
-
-finally:
-    pygame.quit()
@@ -0,0 +1,285 @@
+import asyncio
+import glob
+import logging
+import os
+import time
+
+from joystick_input import BUTTON
+from latency import LatencyHistogram
+
+# Backends del servo (variable de entorno SERVO_BACKEND; sin ella se usa
+# "sysfs" si el pin está asignado al PWM, si no "pigpio" si está disponible, y
+# en último caso "gpiozero" con un aviso):
+# - "gpiozero": la fábrica de pines por defecto de gpiozero (PWM por software,
+#   tiembla cuando la CPU va cargada, p. ej. con la cámara en marcha)
+# - "pigpio": PWM temporizado por DMA con el demonio pigpiod, estable aunque la CPU vaya cargada
+# - "sysfs": el PWM hardware del SoC (/sys/class/pwm, dtoverlay=pwm en
+#   config.txt; GPIO18 es PWM0), sin gpiozero
+# - "mock": MockFactory de gpiozero con pines PWM simulados, para probar sin la Raspberry
+SERVO_BACKENDS = ("gpiozero", "pigpio", "sysfs", "mock")
+# GPIO -> canal del PWM hardware (dtoverlay=pwm / pwm-2chan)
+HARDWARE_PWM_CHANNELS = {12: 0, 18: 0, 13: 1, 19: 1}
+# Dónde mirar si el pin está asignado al PWM: el estado real del pinmux
+# (debugfs, solo root) o, si no se puede leer, los overlays de config.txt
+PINMUX_GLOB = "/sys/kernel/debug/pinctrl/*/pinmux-pins"
+BOOT_CONFIGS = ("/boot/firmware/config.txt", "/boot/config.txt")
+
+def make_servo(backend=None, pin=18, min_pulse_width=1e-3, max_pulse_width=2e-3, frame_width=20e-3,
+               pwm_chip=0, pwm_channel=None):
+    """Servo con la interfaz de gpiozero.Servo (`value` de -1 a 1, None = sin pulsos, close())"""
+    backend = backend or os.environ.get("SERVO_BACKEND")
+    if pwm_channel is None:
+        pwm_channel = HARDWARE_PWM_CHANNELS.get(pin, 0)
+    if backend is None:
+        return _auto_servo(pin, min_pulse_width, max_pulse_width, frame_width, pwm_chip, pwm_channel)
+    if backend not in SERVO_BACKENDS:
+        raise ValueError(f"Backend de servo desconocido: {backend} (opciones: {', '.join(SERVO_BACKENDS)})")
+    if backend == "sysfs":
+        return SysfsPWMServo(pwm_chip, pwm_channel, min_pulse_width, max_pulse_width, frame_width)
+
+    from gpiozero import Servo
+    pin_factory = None
+    if backend == "pigpio":
+        from gpiozero.pins.pigpio import PiGPIOFactory
+        pin_factory = PiGPIOFactory()
+    elif backend == "mock":
+        from gpiozero.pins.mock import MockFactory, MockPWMPin
+        pin_factory = MockFactory(pin_class=MockPWMPin)
+    return Servo(pin, min_pulse_width=min_pulse_width, max_pulse_width=max_pulse_width,
+                 frame_width=frame_width, pin_factory=pin_factory)
+
+def _auto_servo(pin, min_pulse_width, max_pulse_width, frame_width, pwm_chip, pwm_channel):
+    """PWM hardware si el pin está asignado al PWM, si no pigpio, y en último caso gpiozero.
+
+    Que exista pwmchip no basta: sin el overlay el canal se exporta y se
+    activa sin errores, pero el pin no saca nada y el servo se queda muerto.
+    """
+    if (pin in HARDWARE_PWM_CHANNELS and os.path.isdir(f"/sys/class/pwm/pwmchip{pwm_chip}")
+            and _pin_muxed_to_pwm(pin)):
+        try:
+            servo = SysfsPWMServo(pwm_chip, pwm_channel, min_pulse_width, max_pulse_width, frame_width)
+            logging.info(f"Servo en PWM hardware (pwmchip{pwm_chip}/pwm{pwm_channel})")
+            return servo
+        except OSError as e:
+            logging.info(f"PWM hardware no disponible: {e}")
+    try:
+        servo = make_servo("pigpio", pin, min_pulse_width, max_pulse_width, frame_width)
+        logging.info("Servo con pigpio (PWM temporizado por DMA)")
+        return servo
+    except Exception as e:  # sin pigpio instalado o sin el demonio pigpiod
+        logging.info(f"pigpio no disponible: {e}")
+    logging.warning("⚠️ Servo con el PWM por software de gpiozero: tiembla con la CPU cargada. "
+                    "Activa dtoverlay=pwm o arranca pigpiod")
+    return make_servo("gpiozero", pin, min_pulse_width, max_pulse_width, frame_width)
+
+def _pin_muxed_to_pwm(pin):
+    """True solo si consta que el GPIO `pin` está asignado al PWM hardware"""
+    for path in glob.glob(PINMUX_GLOB):
+        try:
+            with open(path) as f:
+                for line in f:
+                    # "pin 18 (gpio18): fe20c000.pwm (GPIO UNCLAIMED) function pwm0 group gpio18"
+                    if line.startswith(f"pin {pin} "):
+                        return "pwm" in line.split(":", 1)[1].lower()
+        except OSError:
+            continue
+    for path in BOOT_CONFIGS:
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            # dtoverlay=pwm[,pin=18,func=2] o dtoverlay=pwm-2chan[,pin=18,pin2=19]
+            line = line.split("#", 1)[0].replace(" ", "")
+            if not line.startswith("dtoverlay="):
+                continue
+            name, *params = line[len("dtoverlay="):].split(",")
+            if name not in ("pwm", "pwm-2chan"):
+                continue
+            options = dict(param.partition("=")[::2] for param in params)
+            pins = {options.get("pin", "18")}
+            if name == "pwm-2chan":
+                pins.add(options.get("pin2", "19"))
+            if str(pin) in pins:
+                return True
+        return False
+    return False
+
+
+    """Servo en un canal de PWM hardware a través de /sys/class/pwm.
+
+    El periférico genera los pulsos por su cuenta: no hay jitter por carga
+    de CPU y escribir una posición son dos write() a sysfs.
+    """
+
+    def __init__(self, chip=0, channel=0, min_pulse_width=1e-3, max_pulse_width=2e-3, frame_width=20e-3):
+        self.min_pulse_width = min_pulse_width
+        self.max_pulse_width = max_pulse_width
+        chip_path = f"/sys/class/pwm/pwmchip{chip}"
+        self.path = f"{chip_path}/pwm{channel}"
+        if not os.path.isdir(self.path):
+            with open(f"{chip_path}/export", "w") as f:
+                f.write(str(channel))
+        # udev tarda un poco en dar permisos a los archivos recién exportados
+        for _ in range(50):
+            if os.access(f"{self.path}/period", os.W_OK):
+                break
+            time.sleep(0.02)
+        self._write("enable", 0)
+        self._write("period", round(frame_width * 1e9))
+        self._value = None
+
+    def _write(self, name, value):
+        with open(f"{self.path}/{name}", "w") as f:
+            f.write(str(value))
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        if value is None:
+            self._write("enable", 0)
+        else:
+            value = max(-1.0, min(1.0, value))
+            pulse = self.min_pulse_width + (value + 1) / 2 * (self.max_pulse_width - self.min_pulse_width)
+            self._write("duty_cycle", round(pulse * 1e9))
+            if self._value is None:
+                self._write("enable", 1)
+        self._value = value
+
+    def close(self):
+        self.value = None
+
+
+class ServoController:
+    """Posición de un servo controlada desde el bucle asyncio de los scripts.
+
+    set() solo guarda el destino y despierta la tarea del controlador, así
+    que se puede llamar desde el bucle de eventos del mando sin bloquearlo
+    (también dentro de los scripts de teleoperación). La tarea lleva el servo
+    al destino con una rampa de `ramp_speed` unidades/s (None = salto directo)
+    a `update_hz`, y solo escribe cuando la posición cambia. Con
+    `detach_after` deja de mandar pulsos ese tiempo después de llegar, para
+    que el servo no tiemble mientras espera.
+
+    Se mide la latencia comando -> escritura (de set() a la primera escritura
+    del movimiento) y lo que tarda cada escritura; stats() las resume.
+    """
+
+    def __init__(self, servo, ramp_speed=None, update_hz=50, detach_after=None, initial=None):
+        self.servo = servo
+        self.ramp_speed = ramp_speed
+        self.period = 1.0 / update_hz
+        self.detach_after = detach_after
+        self.initial = initial
+        self.position = None  # última posición escrita (None = sin pulsos)
+        self._parked = None  # dónde se quedó al dejar de mandar pulsos
+        self.target = initial
+        self.writes = 0
+        self.ignored = 0  # set() con el mismo destino que ya tenía
+        self.command_latency = LatencyHistogram(window=256)
+        self.write_latency = LatencyHistogram(window=256)
+        self._commanded_at = None
+        self._changed = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            if self.initial is not None:
+                self._write(self.initial)
+            self._task = asyncio.create_task(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def set(self, value):
+        """Nuevo destino (-1 a 1); no bloquea"""
+        if value == self.target:
+            self.ignored += 1
+            return
+        self.target = value
+        self._commanded_at = time.perf_counter()
+        self._changed.set()
+
+    def stats(self):
+        return {"writes": self.writes, "ignored": self.ignored,
+                "command_to_write": self.command_latency.percentiles(), "write": self.write_latency.percentiles()}
+
+    def _write(self, value):
+        start = time.perf_counter()
+        self.servo.value = value
+        end = time.perf_counter()
+        self.write_latency.observe(end - start)
+        if self._commanded_at is not None:
+            self.command_latency.observe(end - self._commanded_at)
+            self._commanded_at = None
+        if value is None:
+            self._parked = self.position
+        self.position = value
+        self.writes += 1
+
+    def _next_position(self):
+        target = self.target
+        current = self.position if self.position is not None else self._parked
+        if self.ramp_speed is None or current is None:
+            return target
+        step = self.ramp_speed * self.period
+        return round(current + max(-step, min(step, target - current)), 4)
+
+    async def _run(self):
+        while True:
+            if self.detach_after is not None and self.position is not None:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), self.detach_after)
+                except asyncio.TimeoutError:
+                    self._write(None)
+                    continue
+            else:
+                await self._changed.wait()
+            self._changed.clear()
+            if self.target is None and self.position is not None:
+                self._write(None)
+            # Rampa hasta el destino; si llega otro set() entre pasos se sigue hacia el nuevo
+            while self.target is not None:
+                position = self._next_position()
+                if position != self.position:
+                    self._write(position)
+                if position == self.target:
+                    break
+                await asyncio.sleep(self.period)
+                self._changed.clear()
+
+
+class ServoButton:
+    """Mueve el servo a `pressed` al pulsar `button` y a `released` al soltarlo.
+
+    handle() recibe cualquier JoystickEvent y devuelve True si era del botón;
+    solo actúa en los flancos, no en cada evento repetido.
+    """
+
+    def __init__(self, controller, button, pressed=0.0, released=1.0):
+        self.controller = controller
+        self.button = button
+        self.pressed = pressed
+        self.released = released
+        self._state = None
+
+    def handle(self, event):
+        if event.kind != BUTTON or event.index != self.button:
+            return False
+        state = bool(event.value)
+        if state != self._state:
+            self._state = state
+            self.controller.set(self.pressed if state else self.released)
+            logging.debug(f"Servo -> {'pulsado' if state else 'suelto'}")
+        return True
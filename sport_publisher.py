@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from go2_webrtc_driver.constants import RTC_TOPIC
+
+class SportPublisher:
+    """Publicación de comandos SPORT_MOD por el datachannel.
+
+    - publish_nowait(): para comandos de flujo continuo (Move). Envía sin
+      esperar la respuesta; como mucho `window` peticiones quedan en vuelo y,
+      si la ventana está llena, la más antigua se abandona. Las respuestas que
+      llegan después de `timeout` (o de ser abandonadas) se descartan.
+    - request(): para comandos puntuales (Hello, Sit, StandUp, consultas de
+      MOTION_SWITCHER...), que siguen siendo petición/respuesta.
+
+    En ambos casos se mide la latencia de cada petición. Mientras la conexión
+    está caída (ConnectionSupervisor reconectando) publish_nowait() no envía
+    nada y lo cuenta en `offline`.
+    """
+
+    def __init__(self, conn, window=4, timeout=1.0):
+        self.conn = conn
+        self.window = window
+        self.timeout = timeout
+        # Identificadores propios para poder abandonar peticiones en el resolver
+        self._ids = itertools.count(int(time.time() * 1000) % 2**31)
+        self._in_flight = {}  # id -> tarea
+        self._latencies = deque(maxlen=200)
+        self.sent = 0
+        self.acked = 0
+        self.late = 0
+        self.evicted = 0
+        self.offline = 0
+
+    @property
+    def pub_sub(self):
+        # Tras una reconexión el driver crea un datachannel nuevo
+        return self.conn.datachannel.pub_sub
+
+    def publish_nowait(self, api_id, parameter=None, topic=RTC_TOPIC["SPORT_MOD"]):
+        """Envía sin bloquear y devuelve el id de la petición (None si no hay conexión)"""
+        if not self.conn.isConnected:
+            self.offline += 1
+            return None
+        if len(self._in_flight) >= self.window:
+            oldest = next(iter(self._in_flight))
+            self._abandon(oldest)
+            self.evicted += 1
+
+        req_id = next(self._ids)
+        task = asyncio.create_task(self.pub_sub.publish_request_new(topic, self._options(req_id, api_id, parameter)))
+        self._in_flight[req_id] = task
+        self.sent += 1
+        sent_at = time.monotonic()
+        task.add_done_callback(lambda t: self._on_done(req_id, t, sent_at))
+        asyncio.get_running_loop().call_later(self.timeout, self._expire, req_id)
+        return req_id
+
+    async def request(self, api_id, parameter=None, topic=RTC_TOPIC["SPORT_MOD"], timeout=None):
+        """Envía y espera la respuesta (asyncio.TimeoutError si pasa `timeout`)"""
+        req_id = next(self._ids)
+        sent_at = time.monotonic()
+        self.sent += 1
+        task = asyncio.ensure_future(self.pub_sub.publish_request_new(topic, self._options(req_id, api_id, parameter)))
+        try:
+            response = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            self._forget(req_id, task)
+            self.late += 1
+            raise
+        self.acked += 1
+        self._latencies.append(time.monotonic() - sent_at)
+        return response
+
+    def _options(self, req_id, api_id, parameter):
+        options = {"api_id": api_id, "id": req_id}
+        if parameter is not None:
+            options["parameter"] = parameter
+        return options
+
+    def _on_done(self, req_id, task, sent_at):
+        if self._in_flight.pop(req_id, None) is None or task.cancelled():
+            return
+        if task.exception() is not None:
+            logging.error(f"❌ Error en petición {req_id}: {task.exception()}")
+            return
+        self.acked += 1
+        self._latencies.append(time.monotonic() - sent_at)
+
+    def _expire(self, req_id):
+        if req_id in self._in_flight:
+            self._abandon(req_id)
+            self.late += 1
+
+    def _abandon(self, req_id):
+        self._forget(req_id, self._in_flight.pop(req_id))
+
+    def _forget(self, req_id, task):
+        # Quitar el futuro del resolver: si la respuesta llega tarde se ignora
+        self.pub_sub.future_resolver.pending_callbacks.pop(req_id, None)
+        task.cancel()
+
+    def stats(self):
+        latencies = sorted(self._latencies)
+        def percentile(p):
+            return round(latencies[int(p * (len(latencies) - 1))] * 1000, 1) if latencies else None
+        return {
+            "sent": self.sent,
+            "acked": self.acked,
+            "late": self.late,
+            "evicted": self.evicted,
+            "offline": self.offline,
+            "in_flight": len(self._in_flight),
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+        }
@@ -0,0 +1,219 @@
+"""Robot state telemetry: ring buffers in memory and a compressed log on disk.
+
+Each ``Channel`` subscribes to one RTC_TOPIC stream and decodes the fields it
+cares about straight into a preallocated NumPy structured array used as a ring
+buffer, so memory stays fixed however long the robot runs and a message costs
+a handful of scalar writes (the driver's parsed dict is not kept).
+
+``window()`` returns the last N seconds bucket-averaged down to a number of
+points for plotting; ``Telemetry.route`` serves it as JSON on ``/telemetry``.
+
+Every ``flush_interval`` seconds the rows received since the last flush are
+zlib-compressed and appended to ``<directory>/<channel>-YYYYMMDD.tlog``, one
+file per channel and day. A record is a ``<4sIdI`` header (magic, rows, first
+timestamp, compressed size) followed by the compressed rows; the dtype is
+stored next to it in ``<channel>.dtype.json``. ``read_log()`` reads it back.
+"""
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+from go2_webrtc_driver.constants import RTC_TOPIC
+
+_RECORD = struct.Struct("<4sIdI")
+_MAGIC = b"TLOG"
+
+
+class Channel:
+    """One topic decoded into a ring of ``capacity`` structured rows.
+
+    ``fields`` is a list of ``(name, dtype, shape, path)``; ``path`` is the
+    key path inside the message's ``data``, with ``'*'`` meaning "each item
+    of this list" (e.g. ``('motor_state', '*', 'temperature')``).
+    """
+
+    def __init__(self, name, topic, fields, capacity):
+        self.name = name
+        self.topic = topic
+        self.dtype = np.dtype([('t', 'f8')] + [(field, dtype, shape) for field, dtype, shape, _ in fields])
+        self._paths = [(field, path, '*' in path) for field, _, _, path in fields]
+        self._rows = np.zeros(capacity, dtype=self.dtype)
+        self._columns = {field: self._rows[field] for field in self.dtype.names}
+        self.capacity = capacity
+        self.received = 0  # rows written since start
+        self.decode_errors = 0
+        self.flushed = 0  # rows already written to the log
+
+    def on_message(self, message):
+        i = self.received % self.capacity
+        try:
+            data = message['data']
+            for field, path, each in self._paths:
+                if each:
+                    self._fill_each(self._columns[field][i], data, path)
+                else:
+                    value = data
+                    for key in path:
+                        value = value[key]
+                    self._columns[field][i] = value
+        except (KeyError, IndexError, TypeError, ValueError):
+            self.decode_errors += 1
+            return
+        self._columns['t'][i] = time.time()
+        self.received += 1
+
+    @staticmethod
+    def _fill_each(out, data, path):
+        star = path.index('*')
+        items = data
+        for key in path[:star]:
+            items = items[key]
+        rest = path[star + 1:]
+        for j in range(len(out)):
+            value = items[j]
+            for key in rest:
+                value = value[key]
+            out[j] = value
+
+    def rows(self, start, end):
+        """Copy of rows ``start``..``end`` (counts since start), oldest first."""
+        start = max(start, end - self.capacity)
+        indices = np.arange(start, end) % self.capacity
+        return self._rows[indices]
+
+    def window(self, seconds, points):
+        """Last ``seconds`` of data averaged into at most ``points`` buckets."""
+        rows = self.rows(0, self.received)
+        rows = rows[rows['t'] >= time.time() - seconds]
+        bucket = max(1, -(-len(rows) // points))
+        usable = len(rows) - len(rows) % bucket
+        result = {'channel': self.name, 'topic': self.topic, 'bucket_rows': bucket}
+        for field in self.dtype.names:
+            column = rows[field][:usable].astype('f8')
+            column = column.reshape((-1, bucket) + column.shape[1:]).mean(axis=1)
+            result[field] = np.round(column, 4).tolist()
+        return result
+
+    def stats(self):
+        return {'topic': self.topic, 'received': self.received,
+                'decode_errors': self.decode_errors, 'capacity': self.capacity}
+
+
+def default_channels(seconds=120):
+    """Sport mode state, low state (motors, battery) for the last ``seconds``."""
+    return [
+        Channel('sport', RTC_TOPIC['LF_SPORT_MOD_STATE'], [
+            ('mode', 'u1', (), ('mode',)),
+            ('gait_type', 'u1', (), ('gait_type',)),
+            ('body_height', 'f4', (), ('body_height',)),
+            ('position', 'f4', (3,), ('position',)),
+            ('velocity', 'f4', (3,), ('velocity',)),
+            ('yaw_speed', 'f4', (), ('yaw_speed',)),
+            ('rpy', 'f4', (3,), ('imu_state', 'rpy')),
+            ('foot_force', 'i2', (4,), ('foot_force',)),
+        ], capacity=seconds * 50),
+        Channel('low', RTC_TOPIC['LOW_STATE'], [
+            ('power_v', 'f4', (), ('power_v',)),
+            ('soc', 'u1', (), ('bms_state', 'soc')),
+            ('bms_current', 'i4', (), ('bms_state', 'current')),
+            ('motor_temperature', 'i1', (12,), ('motor_state', '*', 'temperature')),
+            ('motor_q', 'f4', (12,), ('motor_state', '*', 'q')),
+            ('foot_force', 'i2', (4,), ('foot_force',)),
+        ], capacity=seconds * 50),
+    ]
+
+
+class Telemetry:
+    """Subscribes the channels on every connection and logs them to disk."""
+
+    def __init__(self, directory, channels=None, flush_interval=1.0):
+        self.directory = directory
+        self.channels = {channel.name: channel for channel in (channels or default_channels())}
+        self.flush_interval = flush_interval
+        os.makedirs(directory, exist_ok=True)
+        for channel in self.channels.values():
+            with open(os.path.join(directory, f'{channel.name}.dtype.json'), 'w') as f:
+                json.dump(channel.dtype.descr, f)
+        self._task = None
+
+    async def on_connect(self, conn):
+        """Hook for ``ConnectionSupervisor.on_connect()``."""
+        for channel in self.channels.values():
+            conn.datachannel.pub_sub.subscribe(channel.topic, channel.on_message)
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            for channel in self.channels.values():
+                end = channel.received
+                if end == channel.flushed:
+                    continue
+                # Copy on the loop (cheap), compress and write in a worker thread
+                rows = channel.rows(channel.flushed, end)
+                channel.flushed = end
+                try:
+                    await loop.run_in_executor(None, self._append, channel.name, rows)
+                except OSError as e:
+                    logging.error(f"Error writing telemetry log: {e}")
+
+    def _append(self, name, rows):
+        path = os.path.join(self.directory, f"{name}-{datetime.now():%Y%m%d}.tlog")
+        payload = zlib.compress(rows.tobytes(), 6)
+        with open(path, 'ab') as f:
+            f.write(_RECORD.pack(_MAGIC, len(rows), float(rows['t'][0]), len(payload)) + payload)
+
+    def stats(self):
+        return {name: channel.stats() for name, channel in self.channels.items()}
+
+    def window_response(self, query):
+        """``(status, content_type, body)`` for ``/telemetry``.
+
+        Without ``channel`` lists the channels; otherwise returns the window
+        given by ``seconds`` (default 60) and ``points`` (default 300).
+        """
+        name = query.get('channel')
+        if name is None:
+            return '200 OK', 'application/json', json.dumps(self.stats()).encode()
+        channel = self.channels.get(name)
+        if channel is None:
+            return '404 Not Found', 'text/plain', f'Unknown channel {name}'.encode()
+        try:
+            seconds = float(query.get('seconds', 60))
+            points = max(1, int(query.get('points', 300)))
+        except ValueError:
+            return '400 Bad Request', 'text/plain', b'Invalid seconds or points'
+        return '200 OK', 'application/json', json.dumps(channel.window(seconds, points)).encode()
+
+    async def route(self, query, body):
+        """Handler for ``AsyncVideoServer.add_route()``."""
+        return self.window_response(query)
+
+
+def read_log(path, dtype_path=None):
+    """Yield the structured arrays stored in a ``.tlog`` file."""
+    if dtype_path is None:
+        name = os.path.basename(path).rsplit('-', 1)[0]
+        dtype_path = os.path.join(os.path.dirname(path), f'{name}.dtype.json')
+    with open(dtype_path) as f:
+        dtype = np.dtype([(field[0], field[1], tuple(field[2])) if len(field) == 3 else tuple(field)
+                          for field in json.load(f)])
+    with open(path, 'rb') as f:
+        while header := f.read(_RECORD.size):
+            if len(header) < _RECORD.size:
+                break  # truncated by a crash
+            magic, count, _, size = _RECORD.unpack(header)
+            if magic != _MAGIC:
+                raise ValueError(f"{path} is not a telemetry log")
+            payload = f.read(size)
+            if len(payload) < size:
+                break
+            yield np.frombuffer(zlib.decompress(payload), dtype=dtype, count=count)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules are flat scripts: the repo root and script_launcher/ go on the path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "script_launcher")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
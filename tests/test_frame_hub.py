@@ -0,0 +1,112 @@
+import threading
+
+import cv2
+import numpy as np
+
+from frame_hub import FrameHub, FrameRing
+
+
+def frame(value, shape=(4, 6, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def write(ring, img):
+    seq, slot = ring.begin_write(img)
+    np.copyto(slot, img)
+    ring.end_write(seq)
+    return seq
+
+
+def test_ring_reads_back_written_frames():
+    ring = FrameRing(capacity=3)
+    assert ring.read(1) is None
+    assert len(ring) == 0
+    for value in (10, 20):
+        write(ring, frame(value))
+    assert ring.write_seq == 2
+    assert len(ring) == 2
+    assert ring.read(1)[0, 0, 0] == 10
+    assert ring.read(2)[0, 0, 0] == 20
+
+
+def test_ring_drops_oldest_when_full():
+    ring = FrameRing(capacity=2)
+    for value in (1, 2, 3):
+        write(ring, frame(value))
+    assert len(ring) == 2
+    assert ring.oldest_seq() == 2
+    assert ring.read(1) is None
+    assert not ring.valid(1)
+    assert ring.read(3)[0, 0, 0] == 3
+
+
+def test_ring_slot_is_invalid_while_overwritten():
+    ring = FrameRing(capacity=2)
+    write(ring, frame(1))
+    view = ring.read(1)
+    write(ring, frame(2))
+    # The next write reuses frame 1's slot: a reader holding a view can tell
+    seq, slot = ring.begin_write(frame(3))
+    assert seq == 3
+    assert not ring.valid(1)
+    assert ring.read(1) is None
+    np.copyto(slot, frame(3))
+    ring.end_write(seq)
+    assert view[0, 0, 0] == 3
+    assert ring.valid(3)
+
+
+def test_ring_reallocates_on_shape_change():
+    ring = FrameRing(capacity=2)
+    write(ring, frame(1))
+    seq = write(ring, frame(2, shape=(8, 8, 3)))
+    assert ring.read(seq).shape == (8, 8, 3)
+    # Slots of the old shape are gone
+    assert ring.read(1) is None
+
+
+def test_hub_latest_frame_and_wait_next_counts_drops():
+    hub = FrameHub(capacity=2)
+    assert hub.latest_frame() == (0, None)
+    for value in (1, 2, 3, 4):
+        hub.publish(frame(value))
+    seq, img = hub.latest_frame()
+    assert seq == 4 and img[0, 0, 0] == 4
+    # Frames 1 and 2 were overwritten: wait_next resumes at the oldest kept
+    seq, img = hub.wait_next(0, timeout=0)
+    assert seq == 3 and img[0, 0, 0] == 3
+    assert hub.dropped_frames == 2
+    assert hub.wait_next(4, timeout=0.01) == (4, None)
+
+
+def test_hub_wait_frame_wakes_on_publish():
+    hub = FrameHub()
+    threading.Timer(0.05, hub.publish, args=(frame(7),)).start()
+    seq, img = hub.wait_frame(0, timeout=2.0)
+    assert seq == 1 and img[0, 0, 0] == 7
+    # Timeout: the same sequence number comes back
+    assert hub.wait_frame(1, timeout=0.01)[0] == 1
+
+
+def test_hub_encodes_jpeg_and_variants():
+    hub = FrameHub(quality=90)
+    hub.publish(frame(200, shape=(32, 48, 3)))
+    hub.encode(1)
+    seq, jpeg = hub.latest_jpeg()
+    assert seq == 1
+    decoded = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (32, 48, 3)
+    seq, small = hub.encode_variant(1, 50, 0.5)
+    assert seq == 1
+    assert cv2.imdecode(np.frombuffer(small, np.uint8), cv2.IMREAD_COLOR).shape == (16, 24, 3)
+    # Each tier is encoded once per frame
+    assert hub.encode_variant(1, 50, 0.5)[1] is small
+
+
+def test_hub_consumers():
+    hub = FrameHub()
+    assert not hub.wait_consumers(timeout=0.01)
+    with hub.consumer():
+        assert hub.consumers == 1
+        assert hub.wait_consumers(timeout=0)
+    assert hub.consumers == 0
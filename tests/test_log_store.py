@@ -0,0 +1,102 @@
+import glob
+import os
+import time
+
+import pytest
+
+import log_store
+from log_store import LogStore
+
+LINES = [f"linea {i}\n".encode() for i in range(10)]  # 8 bytes cada una
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(log_store.time, "time", clock)
+    return clock
+
+
+def write_run(store, clock, lines=LINES):
+    """Una línea por segundo; con segment_bytes=20 se rota cada tres líneas"""
+    writer = store.start_run("demo")
+    for line in lines:
+        writer.write(line)
+        clock.now += 1.0
+    writer.close(exit_code=0)
+    return writer.run_id
+
+
+def wait_compressed(run_path, timeout=2.0):
+    # La compresión de los segmentos cerrados va en hilos aparte
+    deadline = time.monotonic() + timeout
+    while glob.glob(os.path.join(run_path, "*.log")) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LogStore(str(tmp_path), segment_bytes=20, index_interval=0.5)
+
+
+def test_read_across_rotated_segments(store, clock):
+    run = write_run(store, clock)
+    wait_compressed(store.run_path("demo", run))
+    assert len(glob.glob(os.path.join(store.run_path("demo", run), "*.log.gz"))) == 4
+    everything = b"".join(LINES)
+    assert store.size("demo", run) == len(everything)
+    assert store.read("demo", run, 0, 1000) == (len(everything), everything)
+    # Desde la mitad de un segmento, cruzando dos límites
+    offset, data = store.read("demo", run, 12, 30)
+    assert data == everything[12:42]
+    assert offset == 42
+
+
+def test_read_while_running(store, clock):
+    writer = store.start_run("demo")
+    for line in LINES[:5]:
+        writer.write(line)
+    assert store.info("demo", writer.run_id)["running"]
+    assert store.read("demo", writer.run_id, 0, 1000)[1] == b"".join(LINES[:5])
+    assert store.tail("demo", writer.run_id, 2) == ["linea 3", "linea 4"]
+    writer.close()
+
+
+def test_tail_across_segments(store, clock):
+    run = write_run(store, clock)
+    wait_compressed(store.run_path("demo", run))
+    assert store.tail("demo", run, 5) == [f"linea {i}" for i in range(5, 10)]
+    assert store.tail("demo", run, 50) == [line.decode().strip() for line in LINES]
+    assert store.tail("demo", run, 0) == []
+
+
+def test_time_range_across_segments(store, clock):
+    run = write_run(store, clock)
+    # La línea i se escribió en el instante 1000 + i
+    start, end = store.time_range("demo", run, since=1003.5, until=1006.5)
+    assert store.read("demo", run, start, end - start)[1] == b"".join(LINES[3:7])
+    assert store.time_range("demo", run) == (0, store.size("demo", run))
+    assert store.time_range("demo", run, since=2000.0)[0] == 9 * 8
+    assert store.time_range("demo", run, until=999.0)[1] == 0
+
+
+def test_runs_and_names(store, clock):
+    first = write_run(store, clock, LINES[:1])
+    second = write_run(store, clock, LINES[:2])
+    assert store.runs("demo") == [first, second]
+    assert store.latest_run("demo") == second
+    assert store.runs("otro") == []
+    # Solo un componente de ruta
+    for name in ("..", "a/b", "", "../demo"):
+        with pytest.raises(ValueError):
+            store.runs(name)
+        with pytest.raises(ValueError):
+            store.read("demo", name, 0, 10)
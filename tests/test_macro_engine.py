@@ -0,0 +1,59 @@
+import math
+
+import pytest
+
+from macro_engine import DEFAULT_COMMAND_DURATION, Step, compile_macro
+
+
+def test_walk_turn_and_wait():
+    macro = compile_macro("paseo", [
+        {"walk": 2.0, "speed": 0.5},
+        {"turn": -90, "rate": 45},
+        {"wait": 1.0},
+    ])
+    assert macro.steps == [
+        Step(0.0, "velocity", (0.5, 0.0, 0.0)),
+        Step(4.0, "velocity", (0.0, 0.0, -math.radians(45))),
+        Step(6.0, "velocity", (0.0, 0.0, 0.0)),
+    ]
+    assert macro.duration == 7.0
+
+
+def test_negative_distance_walks_backwards():
+    macro = compile_macro("atras", [{"strafe": -1.0, "speed": 0.25}])
+    assert macro.steps == [
+        Step(0.0, "velocity", (0.0, -0.25, 0.0)),
+        Step(4.0, "velocity", (0.0, 0.0, 0.0)),
+    ]
+
+
+def test_command_stops_movement_first():
+    macro = compile_macro("saludo", [
+        {"move": [0.3, 0.0, 0.0], "duration": 1.5},
+        {"cmd": "Hello"},
+    ])
+    assert macro.steps == [
+        Step(0.0, "velocity", (0.3, 0.0, 0.0)),
+        Step(1.5, "velocity", (0.0, 0.0, 0.0)),
+        Step(1.5, "command", "Hello"),
+    ]
+    assert macro.duration == 1.5 + DEFAULT_COMMAND_DURATION
+
+
+def test_leading_wait_sends_nothing():
+    macro = compile_macro("espera", [{"wait": 2.0}, {"cmd": "Sit", "duration": 0.5}])
+    assert macro.steps == [Step(2.0, "command", "Sit")]
+    assert macro.duration == 2.5
+
+
+@pytest.mark.parametrize("action, message", [
+    ({"cmd": "Volar"}, "comando desconocido"),
+    ({"move": [1.0, 0.0]}, "move necesita"),
+    ({"move": [1.0, 0.0, 0.0]}, "duration"),
+    ({"walk": 1.0, "speed": 0}, "division"),
+    ({"saltar": 1}, "acción desconocida"),
+])
+def test_invalid_actions_name_the_action(action, message):
+    with pytest.raises(ValueError, match="mala, acción 2") as excinfo:
+        compile_macro("mala", [{"wait": 1.0}, action])
+    assert message in str(excinfo.value)
@@ -0,0 +1,53 @@
+import math
+
+import pytest
+
+from velocity_filter import VelocityFilter
+
+DT = 0.05
+
+
+def test_acceleration_is_limited():
+    f = VelocityFilter(cutoff_hz=(100.0, 100.0, 100.0), max_accel=(2.0, 2.0, 6.0))
+    x, y, z = f.step((1.0, -1.0, 3.0), DT)
+    # Con un corte tan alto manda el límite de aceleración
+    assert x == pytest.approx(2.0 * DT)
+    assert y == pytest.approx(-2.0 * DT)
+    assert z == pytest.approx(6.0 * DT)
+
+
+def test_low_pass_step():
+    f = VelocityFilter(cutoff_hz=(1.0, 1.0, 1.0), max_accel=(100.0, 100.0, 100.0))
+    x, _, _ = f.step((1.0, 0.0, 0.0), DT)
+    assert x == pytest.approx(1.0 - math.exp(-2 * math.pi * DT), abs=1e-3)
+
+
+def test_converges_to_target():
+    f = VelocityFilter()
+    for _ in range(100):
+        velocity = f.step((0.5, -0.3, 1.0), DT)
+    assert velocity == pytest.approx((0.5, -0.3, 1.0), abs=1e-3)
+
+
+def test_release_settles_to_exact_zero():
+    f = VelocityFilter()
+    for _ in range(100):
+        f.step((0.5, 0.0, 1.0), DT)
+    for _ in range(100):
+        velocity = f.step((0.0, 0.0, 0.0), DT)
+    assert velocity == (0.0, 0.0, 0.0)
+
+
+def test_reset():
+    f = VelocityFilter()
+    f.step((1.0, 1.0, 1.0), DT)
+    f.reset()
+    assert f.step((0.0, 0.0, 0.0), DT) == (0.0, 0.0, 0.0)
+
+
+def test_significant_uses_per_axis_threshold():
+    f = VelocityFilter(threshold=(0.02, 0.02, 0.05))
+    assert not f.significant((0.51, 0.0, 0.0), (0.5, 0.0, 0.0))
+    assert f.significant((0.52, 0.0, 0.0), (0.5, 0.0, 0.0))
+    assert not f.significant((0.0, 0.0, 0.04), (0.0, 0.0, 0.0))
+    assert f.significant((0.0, 0.0, -0.05), (0.0, 0.0, 0.0))
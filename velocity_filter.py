@@ -0,0 +1,43 @@
+import math
+import numpy as np
+
+class VelocityFilter:
+    """Suavizado de la velocidad (x, y, z) entre el joystick y el planificador.
+
+    Los tres ejes se procesan a la vez como vectores NumPy:
+    - paso bajo de primer orden con frecuencia de corte `cutoff_hz` por eje,
+    - límite de aceleración `max_accel` por eje (unidades/s², z en rad/s²),
+    - umbral `threshold` por eje: un cambio menor no justifica un Move nuevo.
+
+    step() avanza el filtro `dt` segundos hacia la velocidad deseada; cuando
+    el destino es cero y la salida queda por debajo del umbral se pone a cero
+    exacto para que el robot reciba la parada.
+    """
+
+    def __init__(self, cutoff_hz=(4.0, 4.0, 4.0), max_accel=(2.0, 2.0, 6.0),
+                 threshold=(0.02, 0.02, 0.05)):
+        self.omega = 2 * math.pi * np.asarray(cutoff_hz, dtype=float)
+        self.max_accel = np.asarray(max_accel, dtype=float)
+        self.threshold = np.asarray(threshold, dtype=float)
+        self.state = np.zeros(3)
+        self._target = np.zeros(3)
+
+    def reset(self):
+        self.state[:] = 0.0
+
+    def step(self, target, dt):
+        """Devuelve la velocidad filtrada como tupla (x, y, z)"""
+        self._target[:] = target
+        alpha = 1.0 - np.exp(-self.omega * dt)
+        change = alpha * (self._target - self.state)
+        limit = self.max_accel * dt
+        np.clip(change, -limit, limit, out=change)
+        self.state += change
+        # Llegar a cero exacto al soltar el stick
+        settle = (self._target == 0.0) & (np.abs(self.state) < self.threshold)
+        self.state[settle] = 0.0
+        return tuple(round(v, 3) for v in self.state.tolist())
+
+    def significant(self, velocity, sent):
+        """True si `velocity` difiere de lo último enviado más que el umbral en algún eje"""
+        return bool(np.any(np.abs(np.subtract(velocity, sent)) >= self.threshold))
@@ -0,0 +1,155 @@
+"""WebRTC re-broadcast of the Go2 video track to browser viewers.
+
+Instead of converting every frame to BGR and JPEG-encoding it per viewer, the
+robot's ``MediaStreamTrack`` is shared through aiortc's ``MediaRelay`` and sent
+to each browser as a WebRTC video track. The local pipeline (``/status``,
+recorder, shared-memory bus...) subscribes to the same relay and, when nobody
+needs every frame, only converts frames to pixels at a reduced rate.
+
+aiortc always depacketizes and decodes incoming RTP before handing frames to
+tracks, and each outgoing peer connection encodes what it sends, so this is not
+a pure packet forwarder; what it removes is the BGR conversion, the JPEG encode
+and the multipart HTTP stream per viewer.
+"""
+import asyncio
+import json
+import logging
+
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.contrib.media import MediaRelay
+
+VIEWER_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Go2 WebRTC Relay</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 0; padding: 20px;
+               background-color: #f0f0f0; text-align: center; }
+        video { max-width: 100%; border: 2px solid #333; border-radius: 5px; }
+    </style>
+</head>
+<body>
+    <h1>Go2 WebRTC Relay</h1>
+    <video id="video" autoplay playsinline muted></video>
+    <p id="state">Connecting...</p>
+    <script>
+        // The server closes the peer when the robot's track changes (reconnect):
+        // start over with a new offer
+        function retry(pc) {
+            if (pc.retrying) return;
+            pc.retrying = true;
+            pc.close();
+            setTimeout(start, 2000);
+        }
+
+        async function start() {
+            const pc = new RTCPeerConnection();
+            pc.addTransceiver('video', {direction: 'recvonly'});
+            pc.ontrack = (event) => {
+                document.getElementById('video').srcObject = new MediaStream([event.track]);
+            };
+            pc.onconnectionstatechange = () => {
+                document.getElementById('state').textContent = pc.connectionState;
+                if (pc.connectionState === 'failed' || pc.connectionState === 'closed') retry(pc);
+            };
+            await pc.setLocalDescription(await pc.createOffer());
+            // Wait for ICE gathering so the offer carries all candidates
+            await new Promise((resolve) => {
+                if (pc.iceGatheringState === 'complete') return resolve();
+                pc.onicegatheringstatechange = () => {
+                    if (pc.iceGatheringState === 'complete') resolve();
+                };
+            });
+            try {
+                const response = await fetch('/offer', {
+                    method: 'POST',
+                    headers: {'Content-Type': 'application/json'},
+                    body: JSON.stringify({sdp: pc.localDescription.sdp, type: pc.localDescription.type}),
+                });
+                if (!response.ok) {
+                    document.getElementById('state').textContent = await response.text();
+                    retry(pc);
+                    return;
+                }
+                await pc.setRemoteDescription(await response.json());
+            } catch (error) {
+                document.getElementById('state').textContent = error;
+                retry(pc);
+            }
+        }
+        start();
+    </script>
+</body>
+</html>
+"""
+
+
+class WebRTCRelay:
+    """Shares one incoming video track with any number of browser peers."""
+
+    def __init__(self):
+        self._relay = MediaRelay()
+        self._source = None
+        self._pcs = set()
+        self._tasks = set()
+
+    @property
+    def viewers(self):
+        return len(self._pcs)
+
+    def set_source(self, track):
+        """Use ``track`` (the robot's video track) as the relayed source.
+
+        After a reconnect the previous track has ended, and aiortc stops a
+        sender for good once its track ends, so ``replaceTrack`` can't revive
+        it: peers fed from the old track are closed instead and the viewer
+        page renegotiates against the new one.
+        """
+        if self._source is not None and track is not self._source and self._pcs:
+            stale = list(self._pcs)
+            self._pcs.clear()
+            task = asyncio.ensure_future(asyncio.gather(*(pc.close() for pc in stale)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self._source = track
+
+    def subscribe(self):
+        """Return a new track fed from the source, for a local consumer or peer."""
+        # Unbuffered: a slow consumer gets the newest frame instead of a backlog
+        return self._relay.subscribe(self._source, buffered=False)
+
+    async def handle_offer(self, offer):
+        """Answer a browser's SDP offer with a peer connection carrying the relay."""
+        pc = RTCPeerConnection()
+        self._pcs.add(pc)
+
+        @pc.on("connectionstatechange")
+        async def on_connection_state_change():
+            if pc.connectionState in ("failed", "closed"):
+                await pc.close()
+                self._pcs.discard(pc)
+
+        pc.addTrack(self.subscribe())
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=offer["sdp"], type=offer["type"]))
+        await pc.setLocalDescription(await pc.createAnswer())
+        return {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+
+    async def close(self):
+        await asyncio.gather(*(pc.close() for pc in self._pcs))
+        self._pcs.clear()
+
+    # Routes for AsyncVideoServer.add_route()
+
+    async def viewer_route(self, query, body):
+        return '200 OK', 'text/html; charset=utf-8', VIEWER_HTML.encode()
+
+    async def offer_route(self, query, body):
+        if self._source is None:
+            return '503 Service Unavailable', 'text/plain', b'No video track from the robot yet'
+        try:
+            answer = await self.handle_offer(json.loads(body))
+        except Exception as e:
+            logging.error(f"Error answering WebRTC offer: {e}")
+            return '400 Bad Request', 'text/plain', str(e).encode()
+        return '200 OK', 'application/json', json.dumps(answer).encode()